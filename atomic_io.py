@@ -0,0 +1,66 @@
+import contextlib
+import gzip
+import io
+import json
+import os
+import tempfile
+
+
+@contextlib.contextmanager
+def atomic_open(path, compress=False, binary=False):
+    """쓰기용 파일. 블록이 정상적으로 끝나면 fsync 후 path로 rename하고, 예외가 나면 임시 파일을 지움
+
+    compress가 True이면 gzip으로 압축해서 씀. 내용을 한 번에 만들지 않고 조금씩 써도 된다.
+    binary가 True이면 텍스트 대신 바이트를 쓰는 파일 객체를 반환한다.
+    """
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(prefix=os.path.basename(path) + '.', suffix='.tmp', dir=directory)
+    try:
+        with os.fdopen(fd, 'wb') as raw:
+            stream = gzip.GzipFile(fileobj=raw, mode='wb') if compress else raw
+            if binary:
+                yield stream
+            else:
+                f = io.TextIOWrapper(stream, encoding='utf-8')
+                yield f
+                f.flush()
+                f.detach()
+            if compress:
+                stream.close()  # gzip 끝부분을 씀 (raw는 닫지 않음)
+            raw.flush()
+            os.fsync(raw.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+    # rename 자체도 디스크에 반영되도록 디렉터리 fsync (지원하지 않는 OS는 무시)
+    try:
+        dir_fd = os.open(directory, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(dir_fd)
+    except OSError:
+        pass
+    finally:
+        os.close(dir_fd)
+
+
+def atomic_write_json(path, data, indent=None):
+    """임시 파일에 쓰고 fsync 후 rename. 쓰는 도중 종료되어도 기존 파일이 그대로 남음"""
+    with atomic_open(path) as f:
+        json.dump(data, f, indent=indent)
+
+
+def read_json(path, default=None):
+    """JSON 파일을 읽음. 없거나 손상되었으면 default 반환"""
+    try:
+        with open(path, 'r') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return default
+    except json.JSONDecodeError:
+        print(f"Error reading {path}, ignoring it")
+        return default
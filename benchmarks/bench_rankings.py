@@ -0,0 +1,64 @@
+"""트랜잭션 단위 순위 계산: tx_flows 루프와 numpy 벡터 경로 비교 벤치마크
+
+사용법: python -m benchmarks.bench_rankings [전송 수]
+"""
+import sys
+import time
+
+from benchmarks.synthetic import generate_table
+from ranking_batch import compute_rankings
+from tx_flows import reconstruct
+
+
+def loop_rankings(table, swap_addresses):
+    """RankingEngine과 같은 트랜잭션 단위 집계를 parent hash별로 묶어 한 건씩 계산"""
+    groups = {}
+    for tx_data in table:
+        groups.setdefault(tx_data['parent_hash'], []).append(tx_data)
+
+    wallet_stats = {}
+    for rows in groups.values():
+        trades, _ = reconstruct(rows, swap_addresses)
+        for wallet, side, amount, _ in trades:
+            stats = wallet_stats.setdefault(wallet, {'buy': 0, 'sell': 0, 'order': rows[0]['seq']})
+            stats[side] += amount
+
+    rankings = []
+    for address, stats in sorted(
+            wallet_stats.items(), key=lambda item: (-(item[1]['buy'] - item[1]['sell']), item[1]['order'], item[0])):
+        rankings.append({
+            'address': address,
+            'net_purchase': stats['buy'] - stats['sell'],
+            'buy': stats['buy'],
+            'sell': stats['sell']
+        })
+    return rankings
+
+
+def main():
+    n_transfers = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    table, swap_addresses = generate_table(n_transfers)
+    swap_addresses = frozenset(swap_addresses)
+
+    started = time.perf_counter()
+    expected = loop_rankings(table, swap_addresses)
+    loop_time = time.perf_counter() - started
+
+    started = time.perf_counter()
+    actual = compute_rankings(table, swap_addresses)
+    numpy_time = time.perf_counter() - started
+
+    started = time.perf_counter()
+    top = compute_rankings(table, swap_addresses, top_n=10)
+    top_time = time.perf_counter() - started
+
+    assert actual == expected, "numpy rankings differ from the loop"
+    assert top == expected[:10], "numpy top-10 differs from the loop"
+    print(f"transfers: {n_transfers:,}  wallets: {len(expected):,}")
+    print(f"loop:        {loop_time:8.3f}s")
+    print(f"numpy full:  {numpy_time:8.3f}s  ({loop_time / numpy_time:5.1f}x)")
+    print(f"numpy top10: {top_time:8.3f}s  ({loop_time / top_time:5.1f}x)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,165 @@
+"""로컬 stub API를 상대로 백필, 증분 갱신, 순위 계산을 측정하는 벤치마크
+
+사용법:
+    python -m benchmarks.run                          # 10k / 100k / 1M
+    python -m benchmarks.run --sizes 10000,100000 --json result.json
+    python -m benchmarks.run --baseline result.json   # 기준보다 느려지면 종료 코드 1
+
+각 크기는 peak RSS를 따로 재기 위해 별도 프로세스에서 실행한다.
+"""
+import argparse
+import asyncio
+import json
+import os
+import resource
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from benchmarks.stub_server import StubServer
+from benchmarks.synthetic import SyntheticTransfers, TOKEN_ADDRESS, START_BLOCK
+from fetcher import PageFetcher
+from http_client import HttpClient
+from ingestion import sync_transfers
+from price_service import PriceService
+from ranking_engine import RankingEngine
+from transfer_store import TransferStore
+
+DEFAULT_SIZES = (10_000, 100_000, 1_000_000)
+
+# 값이 클수록 나쁜 지표 (기준 비교에 사용)
+LOWER_IS_BETTER = ('backfill_seconds', 'refresh_ms', 'peak_rss_mb', 'price_ms')
+HIGHER_IS_BETTER = ('bulk_rankings_per_second', 'incremental_rankings_per_second')
+
+
+async def run_size(size, page_size, concurrency, refresh_rounds, new_per_refresh):
+    synthetic = SyntheticTransfers(size)
+    server = await StubServer(synthetic, page_size=page_size).start()
+    http = HttpClient(limit_per_host=concurrency * 2)
+
+    async def fetch_page(page):
+        url = f"{server.base_url}/v2/tokens/{TOKEN_ADDRESS}/transfers?page={page}"
+        status, data = await http.get_json(url)
+        return status, (data or {}).get('result', [])
+
+    result = {'transfers': size}
+    with tempfile.TemporaryDirectory() as directory:
+        store = TransferStore(os.path.join(directory, 'bench.db'))
+        fetcher = PageFetcher(fetch_page, concurrency=concurrency, rate=10_000)
+        try:
+            # 빈 스토어에서 START_BLOCK까지 전체 백필
+            started = time.perf_counter()
+            await sync_transfers(fetcher, store, START_BLOCK)
+            result['backfill_seconds'] = time.perf_counter() - started
+            result['pages'] = server.requests
+
+            # 전체 이력을 한 번에 집계 (numpy) / 트랜잭션씩 집계
+            routers = synthetic.shape['routers']
+            engine = RankingEngine(routers, START_BLOCK)
+            started = time.perf_counter()
+            engine.apply_bulk(store.iter_new_transfers(0))
+            result['bulk_rankings_per_second'] = size / (time.perf_counter() - started)
+
+            row_engine = RankingEngine(routers, START_BLOCK)
+            started = time.perf_counter()
+            row_engine.apply(store.iter_new_transfers(0))
+            result['incremental_rankings_per_second'] = size / (time.perf_counter() - started)
+
+            # 새 전송이 조금씩 추가될 때 수집 + 순위 갱신 지연 시간
+            latencies = []
+            for _ in range(refresh_rounds):
+                synthetic.advance(new_per_refresh)
+                started = time.perf_counter()
+                await sync_transfers(fetcher, store, START_BLOCK)
+                engine.apply(store.iter_new_transfers(engine.last_seq))
+                engine.top(10)
+                latencies.append((time.perf_counter() - started) * 1000)
+            result['refresh_ms'] = statistics.median(latencies)
+
+            # 캐시를 거치지 않는 가격 요청 지연 시간
+            prices = PriceService(http, f"{server.base_url}/v1/tokens/prices", ttl=0, stale_ttl=0)
+            started = time.perf_counter()
+            await prices.get_prices()
+            result['price_ms'] = (time.perf_counter() - started) * 1000
+        finally:
+            store.close()
+            await http.close()
+            await server.stop()
+
+    # 리눅스의 ru_maxrss 단위는 KB
+    result['peak_rss_mb'] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    return result
+
+
+def compare(results, baseline, tolerance):
+    """기준 결과보다 tolerance 이상 나빠진 지표 목록"""
+    regressions = []
+    previous = {entry['transfers']: entry for entry in baseline}
+    for entry in results:
+        base = previous.get(entry['transfers'])
+        if base is None:
+            continue
+        for metric in LOWER_IS_BETTER:
+            if entry[metric] > base[metric] * (1 + tolerance):
+                regressions.append((entry['transfers'], metric, base[metric], entry[metric]))
+        for metric in HIGHER_IS_BETTER:
+            if entry[metric] < base[metric] * (1 - tolerance):
+                regressions.append((entry['transfers'], metric, base[metric], entry[metric]))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--sizes', default=','.join(str(size) for size in DEFAULT_SIZES))
+    parser.add_argument('--page-size', type=int, default=100)
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--refresh-rounds', type=int, default=5)
+    parser.add_argument('--new-per-refresh', type=int, default=50)
+    parser.add_argument('--json', help='결과를 저장할 파일')
+    parser.add_argument('--baseline', help='비교할 이전 결과 파일')
+    parser.add_argument('--tolerance', type=float, default=0.2)
+    parser.add_argument('--single', type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.single:
+        result = asyncio.run(run_size(
+            args.single, args.page_size, args.concurrency, args.refresh_rounds, args.new_per_refresh
+        ))
+        print(json.dumps(result))
+        return
+
+    results = []
+    for size in (int(size) for size in args.sizes.split(',')):
+        output = subprocess.run(
+            [sys.executable, '-m', 'benchmarks.run', '--single', str(size),
+             '--page-size', str(args.page_size), '--concurrency', str(args.concurrency),
+             '--refresh-rounds', str(args.refresh_rounds), '--new-per-refresh', str(args.new_per_refresh)],
+            check=True, capture_output=True, text=True
+        ).stdout
+        result = json.loads(output.strip().splitlines()[-1])
+        results.append(result)
+        print(f"{result['transfers']:>9,} transfers  "
+              f"backfill {result['backfill_seconds']:7.2f}s ({result['pages']} pages)  "
+              f"refresh {result['refresh_ms']:7.1f}ms  "
+              f"bulk {result['bulk_rankings_per_second']:>11,.0f}/s  "
+              f"incremental {result['incremental_rankings_per_second']:>9,.0f}/s  "
+              f"price {result['price_ms']:5.1f}ms  "
+              f"peak RSS {result['peak_rss_mb']:7.1f}MB")
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline, 'r') as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        for size, metric, before, after in regressions:
+            print(f"REGRESSION {size:,} transfers {metric}: {before:.3f} -> {after:.3f}")
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,68 @@
+"""klaytnscope 전송 API와 swapscanner 가격 API를 흉내 내는 로컬 aiohttp 서버"""
+import asyncio
+
+from aiohttp import web
+
+from benchmarks.synthetic import TOKEN_ADDRESS
+
+
+class StubServer:
+    """SyntheticTransfers를 페이지 단위로 제공. rate_limit(초당 요청 수)을 넘으면 429 응답"""
+
+    def __init__(self, synthetic, page_size=25, rate_limit=None, host='127.0.0.1', port=0):
+        self.synthetic = synthetic
+        self.page_size = page_size
+        self.rate_limit = rate_limit
+        self.host = host
+        self.port = port
+        self.requests = 0
+        self.rejected = 0
+        self._window_start = None
+        self._window_count = 0
+        self._runner = None
+
+    @property
+    def base_url(self):
+        return f"http://{self.host}:{self.port}"
+
+    def _allow(self):
+        if self.rate_limit is None:
+            return True
+        now = asyncio.get_running_loop().time()
+        if self._window_start is None or now - self._window_start >= 1.0:
+            self._window_start = now
+            self._window_count = 0
+        self._window_count += 1
+        return self._window_count <= self.rate_limit
+
+    async def transfers(self, request):
+        self.requests += 1
+        if not self._allow():
+            self.rejected += 1
+            return web.json_response({'error': 'rate limited'}, status=429)
+        page = int(request.query.get('page', 1))
+        return web.json_response({'result': self.synthetic.page(page, self.page_size)})
+
+    async def prices(self, request):
+        self.requests += 1
+        return web.json_response({
+            TOKEN_ADDRESS: '0.00012345',
+            '0x0000000000000000000000000000000000000000': '0.1234'
+        })
+
+    async def start(self):
+        app = web.Application()
+        app.router.add_get('/v2/tokens/{address}/transfers', self.transfers)
+        app.router.add_get('/v1/tokens/prices', self.prices)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, self.host, self.port)
+        await site.start()
+        # port=0이면 OS가 고른 포트를 사용
+        self.port = site._server.sockets[0].getsockname()[1]
+        return self
+
+    async def stop(self):
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
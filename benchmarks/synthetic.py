@@ -0,0 +1,115 @@
+"""moodeng_transfers_1.json과 비슷한 분포의 결정적(deterministic) 합성 전송 데이터"""
+import json
+import os
+import random
+
+from transfer_table import TransferTable
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SAMPLE_JSON = os.path.join(ROOT, 'moodeng_transfers_1.json')
+ROUTERS_JSON = os.path.join(ROOT, 'swap_routers.json')
+TOKEN_ADDRESS = "0xedcad4bd04f59e8fcc7c5fc7547e5112ae9923df"
+START_BLOCK = 167429702
+DECIMALS = 18
+
+
+def load_shape(sample_path=SAMPLE_JSON, routers_path=ROUTERS_JSON):
+    """샘플 파일에서 라우터 목록, 거래 유형 비율, 금액 분포, 블록당 전송 수를 읽음"""
+    with open(routers_path, 'r') as f:
+        routers = sorted(json.load(f))
+    shape = {
+        'routers': routers,
+        'weights': {'buy': 0.4, 'sell': 0.35, 'skip': 0.15, 'unknown': 0.1},
+        'amounts': [1000.0, 50_000.0, 1_000_000.0],
+        'transfers_per_block': 3
+    }
+    if not os.path.exists(sample_path):
+        return shape
+
+    with open(sample_path, 'r') as f:
+        sample = list(json.load(f).values())
+    counts = {'buy': 0, 'sell': 0, 'skip': 0, 'unknown': 0}
+    router_set = set(routers)
+    for tx_data in sample:
+        from_router = tx_data['from_address'] in router_set
+        to_router = tx_data['to_address'] in router_set
+        if from_router and to_router:
+            counts['skip'] += 1
+        elif from_router:
+            counts['buy'] += 1
+        elif to_router:
+            counts['sell'] += 1
+        else:
+            counts['unknown'] += 1
+    blocks = len({tx_data['block_number'] for tx_data in sample})
+    shape['weights'] = {tx_type: count / len(sample) for tx_type, count in counts.items()}
+    shape['amounts'] = sorted(tx_data['amount'] for tx_data in sample)
+    shape['transfers_per_block'] = max(1, round(len(sample) / max(1, blocks)))
+    return shape
+
+
+class SyntheticTransfers:
+    """가장 오래된 전송부터 0, 1, 2... 번호가 붙은 합성 이력. 각 전송은 번호만으로 다시 만들 수 있음
+
+    page()는 klaytnscope API처럼 최신 전송부터 내림차순으로 잘라서 반환한다.
+    """
+
+    def __init__(self, total, seed=0, n_wallets=None, shape=None, start_block=START_BLOCK):
+        self.total = total
+        self.seed = seed
+        self.shape = shape or load_shape()
+        self.start_block = start_block
+        rng = random.Random(seed)
+        n_wallets = n_wallets or max(10, total // 20)
+        self.wallets = [f"0x{rng.getrandbits(160):040x}" for _ in range(n_wallets)]
+        self._types = list(self.shape['weights'])
+        self._weights = [self.shape['weights'][tx_type] for tx_type in self._types]
+
+    def advance(self, n):
+        """새 전송 n건이 체인에 추가된 것처럼 이력을 늘림"""
+        self.total += n
+
+    def transfer(self, index):
+        """index번째 전송 (API 응답 형식)"""
+        rng = random.Random(self.seed * 1_000_003 + index)
+        routers = self.shape['routers']
+        tx_type = rng.choices(self._types, self._weights)[0]
+        if tx_type == 'buy':
+            from_address, to_address = rng.choice(routers), rng.choice(self.wallets)
+        elif tx_type == 'sell':
+            from_address, to_address = rng.choice(self.wallets), rng.choice(routers)
+        elif tx_type == 'skip':
+            from_address, to_address = rng.choice(routers), rng.choice(routers)
+        else:
+            from_address, to_address = rng.choice(self.wallets), rng.choice(self.wallets)
+        amount = rng.choice(self.shape['amounts'])
+        return {
+            'blockNumber': self.start_block + 1 + index // self.shape['transfers_per_block'],
+            'parentHash': f"0x{rng.getrandbits(256):064x}",
+            'fromAddress': from_address,
+            'toAddress': to_address,
+            'amount': str(int(amount * 10**6) * 10**(DECIMALS - 6)),
+            'decimals': DECIMALS
+        }
+
+    def page(self, page, size):
+        """page번째 페이지 (1부터, 최신순)"""
+        newest = self.total - 1 - (page - 1) * size
+        return [self.transfer(index) for index in range(newest, max(-1, newest - size), -1)]
+
+
+def generate_table(n_transfers, seed=0, shape=None):
+    """합성 전송 데이터를 바로 TransferTable로 만듦 (HTTP 없이 순위 계산만 측정할 때)"""
+    synthetic = SyntheticTransfers(n_transfers, seed=seed, shape=shape)
+    table = TransferTable()
+    for index in range(n_transfers):
+        transfer = synthetic.transfer(index)
+        table.append({
+            'seq': index + 1,
+            'parent_hash': transfer['parentHash'],
+            'from_address': transfer['fromAddress'].lower(),
+            'to_address': transfer['toAddress'].lower(),
+            'amount': int(transfer['amount']) / 10**DECIMALS,
+            'block_number': transfer['blockNumber']
+        })
+    return table, synthetic.shape['routers']
@@ -0,0 +1,205 @@
+import sys
+from array import array
+from bisect import bisect_left, bisect_right
+from datetime import datetime, timezone
+import metrics
+from atomic_io import atomic_open
+
+BLOCK_CLOCK_ANCHORS = metrics.gauge('block_clock_anchors', 'Block timestamp anchors held by the index')
+BLOCK_CLOCK_FETCHES = metrics.counter('block_clock_fetches_total', 'Block timestamps fetched over RPC')
+
+
+class RpcError(Exception):
+    """블록 정보 RPC 요청 실패"""
+
+
+class KaiaRpc:
+    """Kaia 노드 JSON-RPC로 블록 넘버와 블록 시각을 조회"""
+
+    def __init__(self, http, url):
+        self.http = http
+        self.url = url
+
+    async def call(self, method, *params):
+        payload = {'jsonrpc': '2.0', 'id': 1, 'method': method, 'params': list(params)}
+        status, data = await self.http.post_json(self.url, payload)
+        if status != 200 or not isinstance(data, dict) or data.get('result') is None:
+            error = data.get('error') if isinstance(data, dict) else None
+            raise RpcError(f"{method} failed: {error or status}")
+        return data['result']
+
+    async def block_number(self):
+        return int(await self.call('eth_blockNumber'), 16)
+
+    async def block_timestamp(self, block):
+        block_data = await self.call('eth_getBlockByNumber', hex(block), False)
+        return int(block_data['timestamp'], 16)
+
+
+def parse_time(value):
+    """ISO 8601 문자열(예: 2024-10-20T21:00:00+09:00)을 유닉스 초로 변환. 시간대가 없으면 UTC"""
+    parsed = datetime.fromisoformat(value)
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return int(parsed.timestamp())
+
+
+class BlockClock:
+    """블록 넘버 <-> 시각(유닉스 초) 색인
+
+    띄엄띄엄 조회한 기준점(블록, 시각)을 블록 순으로 정렬된 배열 두 개에 보관하고,
+    조회는 이분 탐색으로 양옆 기준점을 찾아 그 사이를 선형 보간한다.
+    기준점 범위 밖은 가장 가까운 기준점에서 평균 블록 시간(block_time)으로 추정한다.
+
+    파일 형식: (블록, 시각) 쌍을 차례로 담은 int64 배열 (기준점 하나에 16바이트)
+    """
+
+    def __init__(self, path=None, block_time=1.0, spacing=3600):
+        self.path = path
+        self.block_time = block_time
+        # 최신 블록 기준점을 남기는 최소 간격 (블록). 그보다 가까우면 이전 최신 기준점을 바꿔치기
+        self.spacing = spacing
+        self.blocks = array('q')
+        self.times = array('q')
+        self._dirty = False
+        if path:
+            self.load()
+
+    def __len__(self):
+        return len(self.blocks)
+
+    def load(self):
+        pairs = array('q')
+        try:
+            with open(self.path, 'rb') as f:
+                pairs.frombytes(f.read())
+        except FileNotFoundError:
+            return
+        except ValueError:
+            print(f"Error reading {self.path}, starting with empty block index")
+            return
+        self.blocks = pairs[0::2]
+        self.times = pairs[1::2]
+        BLOCK_CLOCK_ANCHORS.set(len(self.blocks))
+
+    def save(self):
+        """바뀐 기준점이 있으면 파일에 원자적으로 저장"""
+        if not self.path or not self._dirty:
+            return
+        pairs = array('q', bytes(16 * len(self.blocks)))
+        pairs[0::2] = self.blocks
+        pairs[1::2] = self.times
+        with atomic_open(self.path, binary=True) as f:
+            f.write(pairs.tobytes())
+        self._dirty = False
+
+    def add(self, block, timestamp):
+        """기준점 추가 (이미 있는 블록이면 무시)"""
+        i = bisect_left(self.blocks, block)
+        if i < len(self.blocks) and self.blocks[i] == block:
+            return
+        self.blocks.insert(i, block)
+        self.times.insert(i, timestamp)
+        self._dirty = True
+        BLOCK_CLOCK_ANCHORS.set(len(self.blocks))
+
+    def _interpolate(self, keys, values, key, scale):
+        """keys(오름차순)에서 key 양옆 기준점 사이를 보간한 values 값. scale은 범위 밖 추정에 쓰는 기울기"""
+        n = len(keys)
+        i = bisect_right(keys, key)
+        if i == 0:
+            return values[0] + (key - keys[0]) * scale
+        if i == n:
+            return values[-1] + (key - keys[-1]) * scale
+        k0, k1 = keys[i - 1], keys[i]
+        v0, v1 = values[i - 1], values[i]
+        if k1 == k0:
+            return v0
+        return v0 + (key - k0) * (v1 - v0) / (k1 - k0)
+
+    def timestamp(self, block):
+        """블록의 (추정) 시각. 기준점이 없으면 None"""
+        if not self.blocks:
+            return None
+        return self._interpolate(self.blocks, self.times, block, self.block_time)
+
+    def block_at(self, timestamp):
+        """timestamp 이전(같은 시각 포함)의 마지막 (추정) 블록. 기준점이 없으면 None"""
+        if not self.blocks:
+            return None
+        return int(self._interpolate(self.times, self.blocks, timestamp, 1 / self.block_time) // 1)
+
+    async def _fetch(self, rpc, block):
+        timestamp = await rpc.block_timestamp(block)
+        BLOCK_CLOCK_FETCHES.inc()
+        self.add(block, timestamp)
+        return timestamp
+
+    async def update_head(self, rpc):
+        """체인의 최신 블록을 기준점으로 추가하고 그 블록 넘버를 반환
+
+        최신 기준점은 spacing 블록마다 하나만 남기고, 그 사이에서는 마지막 기준점을 새 값으로 바꾼다.
+        """
+        block = await rpc.block_number()
+        if len(self.blocks) >= 2 and self.blocks[-1] < block and block - self.blocks[-2] < self.spacing:
+            self.blocks.pop()
+            self.times.pop()
+        await self._fetch(rpc, block)
+        return block
+
+    async def resolve(self, rpc, timestamp):
+        """timestamp 이전(같은 시각 포함)의 마지막 블록을 RPC로 확인해 정확하게 찾음
+
+        보간으로 추정한 블록부터 조회하고, 조회한 블록도 기준점으로 추가해 다음 추정에 쓴다.
+        블록 시간이 일정하면 두세 번의 조회로 끝난다. 아직 오지 않은 시각이면 None.
+        """
+        head = await self.update_head(rpc)
+        if timestamp >= self.timestamp(head):
+            return None
+        low, high = None, head  # 시각이 timestamp 이하인 블록 / 초과인 블록
+        block = min(max(self.block_at(timestamp), 0), head - 1)
+        steps = 0
+        while True:
+            if await self._fetch(rpc, block) <= timestamp:
+                low = block
+            elif block == 0:
+                return None
+            else:
+                high = block
+            if low is not None and high - low <= 1:
+                return low
+            steps += 1
+            if steps < 8:
+                guess = self.block_at(timestamp)
+            else:
+                guess = ((low or 0) + high) // 2  # 보간이 잘 맞지 않으면 이분 탐색
+            block = min(max(guess, 0 if low is None else low + 1), high - 1)
+
+    async def ensure(self, rpc, from_block, to_block, spacing=None):
+        """from_block~to_block에 spacing 블록마다 기준점이 있도록 비어 있는 곳만 조회"""
+        spacing = spacing or self.spacing
+        fetched = 0
+        for block in list(range(from_block, to_block, spacing)) + [to_block]:
+            i = bisect_left(self.blocks, block)
+            nearest = min(
+                (abs(self.blocks[j] - block) for j in (i - 1, i) if 0 <= j < len(self.blocks)),
+                default=None
+            )
+            if nearest is None or nearest > spacing // 2:
+                await self._fetch(rpc, block)
+                fetched += 1
+        return fetched
+
+
+if __name__ == '__main__':
+    # 사용법: python block_clock.py <색인 파일> <블록 넘버 또는 ISO 8601 시각>...
+    if len(sys.argv) < 3:
+        print("usage: python block_clock.py INDEX_FILE BLOCK_OR_TIME [BLOCK_OR_TIME ...]")
+        sys.exit(1)
+    clock = BlockClock(sys.argv[1])
+    for arg in sys.argv[2:]:
+        if arg.isdigit():
+            timestamp = clock.timestamp(int(arg))
+            print(arg, None if timestamp is None else datetime.fromtimestamp(timestamp, timezone.utc).isoformat())
+        else:
+            print(arg, clock.block_at(parse_time(arg)))
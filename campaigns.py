@@ -0,0 +1,274 @@
+import asyncio
+import json
+import os
+import time
+from datetime import datetime, timedelta
+
+import metrics
+from atomic_io import atomic_write_json
+from block_clock import KaiaRpc, RpcError, parse_time
+from fetcher import PageFetcher
+from page_locator import PageLocator
+from ingestion import IngestionWorker, sync_transfers
+from ranking_engine import RankingEngine
+from router_registry import RouterRegistry
+from transfer_store import TransferStore, open_store, STORE_IO_SECONDS
+
+KLAYTNSCOPE_API = "https://api-cypress.klaytnscope.com"
+
+TRANSFER_PAGE_SECONDS = metrics.histogram(
+    'get_transfers_seconds', 'Latency of one klaytnscope transfers page', ('campaign',)
+)
+UPDATE_RANKINGS_SECONDS = metrics.histogram(
+    'update_rankings_seconds', 'update_rankings() duration', ('campaign',)
+)
+TRANSFERS_PROCESSED = metrics.counter(
+    'transfers_processed_total', 'Transfers folded into the ranking engine', ('campaign',)
+)
+
+# 새 전송 데이터를 순위 엔진에 이 건수씩 나눠 반영하고, 그 사이에 이벤트 루프에 양보 (명령어 응답이 밀리지 않게)
+APPLY_CHUNK = 5000
+
+
+class Campaign:
+    """토큰 하나의 이벤트(블록 구간, 스왑 라우터, 저장 파일)와 그 수집/순위 상태
+
+    storage는 파일 이름 형식이며 {}에 transfers/rankings/ranking_state가 들어간다.
+    예) "moodeng_{}_1" -> moodeng_transfers_1.db, moodeng_rankings_1.json
+
+    end_time(유닉스 초)이 있고 end_block이 없으면, 그 시각이 지난 뒤 블록 시각 색인(clock)으로
+    end_block을 찾고 그 뒤에 저장된 전송 데이터는 지운다.
+
+    순위 엔진은 첫 update_rankings()에서 작업 스레드로 복원(스냅샷 + 전체 이력)한 뒤 교체하므로,
+    그동안 이벤트 루프는 명령어를 계속 처리한다.
+    """
+
+    def __init__(self, name, token_address, start_block, storage, http, end_block=None,
+                 routers='swap_routers.json', title=None, buy_url=None, bucket=None,
+                 concurrency=4, rate=2.0, interval=30, fresh_for=60, snapshot_interval=300,
+                 end_time=None, clock=None, rpc=None):
+        self.name = name
+        self.title = title or name.upper()
+        self.token_address = token_address.lower()
+        self.start_block = start_block
+        self.end_block = end_block
+        self.end_time = end_time
+        self.clock = clock
+        self.rpc = rpc
+        self.buy_url = buy_url
+        self.http = http
+        self.snapshot_interval = snapshot_interval
+        self.last_snapshot_time = None
+
+        self.transfers_db = storage.format('transfers') + '.db'
+        self.transfers_json = storage.format('transfers') + '.json'
+        self.rankings_json = storage.format('rankings') + '.json'
+        self.ranking_state_json = storage.format('ranking_state') + '.json'
+
+        # 전송 데이터 스토어 (DB가 비어있으면 기존 JSON 파일을 가져옴)
+        self.store = open_store(self.transfers_db, self.transfers_json)
+
+        # 스왑 주소 목록
+        self.router_registry = RouterRegistry(routers)
+
+        # 지갑별 누적 순위. 복원이 끝날 때까지는 빈 엔진 (update_rankings()에서 교체)
+        self.engine = RankingEngine(self.router_registry.addresses, start_block)
+        self.engine_ready = False
+        self._update_lock = asyncio.Lock()
+
+        # 페이지 동시 요청 및 속도 제한 (bucket을 공유하면 모든 캠페인이 같은 한도를 나눠 씀)
+        self.fetcher = PageFetcher(self.get_transfers, concurrency=concurrency, rate=rate, bucket=bucket)
+
+        # 과거 구간(end_block)이 있는 캠페인은 구간이 시작되는 페이지를 탐색으로 찾음
+        self.locator = PageLocator(self.fetcher)
+
+        # 새 전송 데이터 수집과 순위 갱신
+        self.worker = IngestionWorker(
+            self.save_transfers, self.update_rankings,
+            interval=interval, fresh_for=fresh_for, version=lambda: self.engine.version
+        )
+
+    async def get_transfers(self, page):
+        """전송 데이터 한 페이지를 요청. (HTTP 상태 코드, 전송 목록)을 반환하며 네트워크 오류는 상태 None"""
+        url = f"{KLAYTNSCOPE_API}/v2/tokens/{self.token_address}/transfers?page={page}"
+        with TRANSFER_PAGE_SECONDS.time(campaign=self.name):
+            status, data = await self.http.get_json(url)
+        if status == 200:
+            return status, data.get('result', [])
+        else:
+            print(f"Error fetching transfers ({self.name}): {status}")
+            return status, []
+
+    async def resolve_end_block(self):
+        """end_time이 지났으면 end_block을 정하고, 그 뒤 블록의 전송 데이터를 스토어에서 지움 (순위 엔진은 다음 갱신 때 되돌림)"""
+        if self.end_block is not None or self.end_time is None or self.clock is None or time.time() < self.end_time:
+            return
+        try:
+            end_block = await self.clock.resolve(self.rpc, self.end_time)
+        except RpcError as e:
+            print(f"Error resolving end block ({self.name}): {e}")
+            return
+        if end_block is None:
+            return
+        self.clock.save()
+        self.end_block = end_block
+        late = [row['seq'] for row in self.store.window_transfers(end_block)]
+        if late:
+            self.store.remove_transfers(late)
+        print(f"{self.name} ended at block {end_block}")
+
+    async def save_transfers(self):
+        """새 전송 데이터만 수집하여 SQLite 스토어에 upsert. 동일한 parent hash의 다른 거래도 저장"""
+        try:
+            await self.resolve_end_block()
+            return await sync_transfers(
+                self.fetcher, self.store, self.start_block, self.end_block, locator=self.locator
+            )
+        except Exception as e:
+            print(f"Error saving transfers ({self.name}): {e}")
+            return None
+
+    def save_ranking_files(self, force=False):
+        """순위 파일과 엔진 스냅샷을 원자적으로 저장. snapshot_interval마다 한 번만 저장"""
+        now = datetime.now()
+        if (not force and self.last_snapshot_time
+                and now - self.last_snapshot_time < timedelta(seconds=self.snapshot_interval)):
+            return
+        self.last_snapshot_time = now
+
+        with STORE_IO_SECONDS.time(operation='rankings_json'):
+            ranking_data = {
+                'last_updated': now.isoformat(),
+                'start_block': self.start_block,
+                'rankings': self.engine.rankings()
+            }
+            if self.end_block is not None:
+                ranking_data['end_block'] = self.end_block
+            atomic_write_json(self.rankings_json, ranking_data, indent=2)
+        with STORE_IO_SECONDS.time(operation='ranking_snapshot'):
+            self.engine.save(self.ranking_state_json)
+
+    def _build_engine(self):
+        """스냅샷을 복원하고 전체 이력을 적재한 새 엔진을 만듦 (작업 스레드에서 실행)
+
+        반환: (엔진, 스냅샷에 이미 반영되어 있던 행 수, 거래 유형이 바뀐 행 목록).
+        SQLite 연결은 만든 스레드에서만 쓸 수 있으므로 읽기용 연결을 따로 연다.
+        """
+        store = TransferStore(self.transfers_db)
+        try:
+            engine = RankingEngine.load(
+                self.ranking_state_json, self.router_registry.addresses, self.start_block,
+                max_seq=store.last_seq(), last_removal=store.last_removal()
+            )
+            # 스냅샷에 반영된 이력은 테이블에만 넣고, 그 이후(처음이면 전체 이력)는 집계
+            engine.load_history(store.iter_new_transfers(0))
+            restored = len(engine.table)
+            new_transfers = store.iter_new_transfers(engine.last_seq)
+            if engine.last_seq == 0:
+                changed_types = engine.apply_bulk(new_transfers)
+            else:
+                changed_types = engine.apply(new_transfers)
+            return engine, restored, changed_types
+        finally:
+            store.close()
+
+    async def update_rankings(self):
+        """새로 저장된 전송 데이터만 순위 엔진에 반영하고 순위 업데이트"""
+        try:
+            async with self._update_lock:
+                return await self._update_rankings()
+        except Exception as e:
+            print(f"Error updating rankings ({self.name}): {e}")
+            return None
+
+    async def _update_rankings(self):
+        started = time.perf_counter()
+        version = self.engine.version
+        applied = len(self.engine.table)
+
+        # 처음에는 스냅샷 복원과 전체 이력 집계를 작업 스레드에서 하고 끝나면 엔진을 교체
+        changed_types = []
+        if not self.engine_ready:
+            self.engine, applied, changed_types = await asyncio.to_thread(self._build_engine)
+            self.engine_ready = True
+
+        # 스왑 주소 설정이 바뀌었으면 영향을 받는 지갑만 다시 집계
+        if self.router_registry.reload_if_changed():
+            changed_types += self.engine.set_swap_addresses(self.router_registry.addresses)
+
+        # 업스트림에서 바뀌어 스토어에서 삭제된 전송 데이터는 먼저 되돌림
+        removed = self.store.removed_since(self.engine.last_removal)
+        if removed:
+            changed_types += self.engine.revert(removed)
+
+        # 엔진의 high-water mark 이후 전송 데이터만 APPLY_CHUNK건씩 트랜잭션별로 묶어 집계
+        while True:
+            new_transfers = list(self.store.iter_new_transfers(self.engine.last_seq, limit=APPLY_CHUNK))
+            if not new_transfers:
+                break
+            changed_types += self.engine.apply(new_transfers)
+            await asyncio.sleep(0)
+        if changed_types:
+            self.store.set_transaction_types(changed_types)
+        TRANSFERS_PROCESSED.inc(len(self.engine.table) - applied, campaign=self.name)
+
+        # 순위가 바뀌었으면 주기적으로 순위 파일과 엔진 스냅샷 저장
+        if self.engine.version != version or not os.path.exists(self.rankings_json):
+            self.save_ranking_files()
+
+        rankings = self.engine.top(10)  # 상위 10개만 반환
+        UPDATE_RANKINGS_SECONDS.observe(time.perf_counter() - started, campaign=self.name)
+        return rankings
+
+    def close(self):
+        # 복원되기 전의 빈 엔진으로 기존 스냅샷을 덮어쓰지 않음
+        if self.engine_ready:
+            self.save_ranking_files(force=True)
+        self.store.close()
+
+
+async def resolve_campaign_times(entries, clock, rpc):
+    """start_time/end_time(ISO 8601)으로 설정된 캠페인 구간을 블록 넘버로 바꿈
+
+    블록 시각 색인으로 추정한 뒤 RPC로 정확한 블록을 찾고, 조회한 기준점은 색인 파일에 저장해
+    다음 실행부터는 조회하지 않는다. 아직 오지 않은 end_time은 Campaign이 그 시각이 지난 뒤 정한다.
+    """
+    pending = [entry for entry in entries
+               if entry.get('start_time') and entry.get('start_block') is None]
+    for entry in pending:
+        start_time = parse_time(entry['start_time'])
+        # start_time 직전의 마지막 블록 다음 블록이 시작 블록
+        before_start = await clock.resolve(rpc, start_time - 1)
+        if before_start is None:
+            # 아직 시작하지 않은 캠페인은 평균 블록 시간으로 추정한 블록부터 수집
+            before_start = clock.block_at(start_time - 1)
+            print(f"{entry['name']} has not started yet, estimated start block {before_start + 1}")
+        entry['start_block'] = before_start + 1
+    if pending:
+        clock.save()
+    for entry in entries:
+        start_time = entry.pop('start_time', None)
+        end_time = entry.get('end_time')
+        if isinstance(end_time, str):
+            entry['end_time'] = parse_time(end_time)
+        if start_time and entry.get('start_block') is None:
+            raise ValueError(f"cannot resolve start_time of campaign {entry['name']}")
+
+
+async def load_campaigns(path, http, bucket=None, clock=None, rpc_url=None, **defaults):
+    """캠페인 설정 파일을 읽어 {이름: Campaign} 반환 (파일 순서 유지, 첫 번째가 기본 캠페인)
+
+    clock과 rpc_url이 있으면 구간을 블록 대신 시각(start_time/end_time)으로 설정할 수 있다.
+    순위 엔진은 각 캠페인의 첫 update_rankings()에서 복원된다.
+    """
+    with open(path, 'r') as f:
+        entries = json.load(f)
+    rpc = None
+    if clock is not None and rpc_url:
+        rpc = KaiaRpc(http, rpc_url)
+        await resolve_campaign_times(entries, clock, rpc)
+    campaigns = {}
+    for entry in entries:
+        options = {**defaults, **entry}
+        campaigns[entry['name']] = Campaign(http=http, bucket=bucket, clock=clock, rpc=rpc, **options)
+    return campaigns
@@ -0,0 +1,173 @@
+import heapq
+import json
+import sqlite3
+import time
+import metrics
+
+COOLDOWN_ENTRIES = metrics.gauge('cooldown_entries', 'Live cooldown entries held by the store')
+
+SCOPES = ('user', 'chat', 'user_chat', 'global')
+MODES = ('sliding', 'bucket')
+
+
+class Policy:
+    """명령어 사용 한도: window초 동안 limit번
+
+    per: 한도를 세는 단위 (user, chat, user_chat, global)
+    mode: sliding은 최근 window초 안의 사용 횟수, bucket은 window초마다 limit개가 차는 토큰 버킷
+    """
+
+    def __init__(self, limit=1, window=60, per='user', mode='sliding'):
+        if per not in SCOPES:
+            raise ValueError(f"unknown cooldown scope: {per}")
+        if mode not in MODES:
+            raise ValueError(f"unknown cooldown mode: {mode}")
+        self.limit = limit
+        self.window = window
+        self.per = per
+        self.mode = mode
+
+    def key(self, command, user_id, chat_id):
+        if self.per == 'user':
+            scope = user_id
+        elif self.per == 'chat':
+            scope = chat_id
+        elif self.per == 'user_chat':
+            scope = f"{chat_id}/{user_id}"
+        else:
+            scope = '*'
+        return f"{command}:{self.per}:{self.mode}:{scope}"
+
+    def peek(self, state, now):
+        """(기다려야 하는 초, 사용했을 때의 새 상태, 새 상태가 만료되는 시각). 기다릴 필요가 없으면 0"""
+        if self.mode == 'sliding':
+            used = [t for t in (state or []) if t > now - self.window]
+            if len(used) >= self.limit:
+                return used[len(used) - self.limit] + self.window - now, None, None
+            used.append(now)
+            return 0, used, now + self.window
+
+        rate = self.limit / self.window
+        tokens, updated = state or (self.limit, now)
+        tokens = min(self.limit, tokens + (now - updated) * rate)
+        if tokens < 1:
+            return (1 - tokens) / rate, None, None
+        tokens -= 1
+        return 0, [tokens, now], now + (self.limit - tokens) / rate
+
+
+class MemoryStore:
+    """프로세스 메모리에 보관하는 상태. 만료 시각 힙으로 지난 항목을 지워 메모리가 계속 늘지 않음"""
+
+    def __init__(self):
+        self._entries = {}  # 키 -> (상태, 만료 시각)
+        self._expiry = []  # (만료 시각, 키). 같은 키의 오래된 항목은 꺼낼 때 무시
+
+    def get(self, key, now):
+        entry = self._entries.get(key)
+        if entry is None or entry[1] <= now:
+            return None
+        return entry[0]
+
+    def set(self, key, state, expires_at):
+        self._entries[key] = (state, expires_at)
+        heapq.heappush(self._expiry, (expires_at, key))
+        # 오래된 힙 항목이 너무 많이 쌓이면 다시 만듦
+        if len(self._expiry) > 2 * len(self._entries) + 1024:
+            self._expiry = [(expires, key) for key, (_, expires) in self._entries.items()]
+            heapq.heapify(self._expiry)
+
+    def evict(self, now):
+        while self._expiry and self._expiry[0][0] <= now:
+            expires_at, key = heapq.heappop(self._expiry)
+            entry = self._entries.get(key)
+            if entry is not None and entry[1] == expires_at:
+                del self._entries[key]
+        COOLDOWN_ENTRIES.set(len(self._entries))
+
+    def __len__(self):
+        return len(self._entries)
+
+    def close(self):
+        pass
+
+
+class SqliteStore:
+    """재시작 후에도 유지되는 SQLite 상태 저장소 (만료 시각 인덱스로 지난 항목을 지움)"""
+
+    SCHEMA = """
+    CREATE TABLE IF NOT EXISTS cooldowns (
+        key TEXT PRIMARY KEY,
+        state TEXT NOT NULL,
+        expires_at REAL NOT NULL
+    );
+    CREATE INDEX IF NOT EXISTS idx_cooldowns_expires ON cooldowns (expires_at);
+    """
+
+    def __init__(self, path, evict_every=256):
+        self.conn = sqlite3.connect(path)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(self.SCHEMA)
+        self.evict_every = evict_every
+        self._writes = 0
+
+    def get(self, key, now):
+        row = self.conn.execute(
+            "SELECT state FROM cooldowns WHERE key = ? AND expires_at > ?", (key, now)
+        ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def set(self, key, state, expires_at):
+        with self.conn:
+            self.conn.execute(
+                "INSERT INTO cooldowns (key, state, expires_at) VALUES (?, ?, ?) "
+                "ON CONFLICT (key) DO UPDATE SET state = excluded.state, expires_at = excluded.expires_at",
+                (key, json.dumps(state), expires_at)
+            )
+        self._writes += 1
+
+    def evict(self, now):
+        if self._writes < self.evict_every:
+            return
+        self._writes = 0
+        with self.conn:
+            self.conn.execute("DELETE FROM cooldowns WHERE expires_at <= ?", (now,))
+        COOLDOWN_ENTRIES.set(len(self))
+
+    def __len__(self):
+        return self.conn.execute("SELECT COUNT(*) FROM cooldowns").fetchone()[0]
+
+    def close(self):
+        self.conn.close()
+
+
+class Cooldowns:
+    """명령어별 사용 한도 검사. 명령어마다 여러 정책을 둘 수 있고 모두 통과해야 사용으로 기록"""
+
+    def __init__(self, policies=None, default=None, store=None):
+        self.policies = policies or {}
+        self.default = [Policy()] if default is None else default
+        self.store = MemoryStore() if store is None else store
+
+    def check(self, command, user_id, chat_id, now=None):
+        """사용할 수 있으면 기록하고 0, 아니면 기다려야 하는 초를 반환"""
+        now = time.time() if now is None else now
+        self.store.evict(now)
+
+        updates = []
+        wait = 0
+        for policy in self.policies.get(command, self.default):
+            key = policy.key(command, user_id, chat_id)
+            policy_wait, state, expires_at = policy.peek(self.store.get(key, now), now)
+            wait = max(wait, policy_wait)
+            updates.append((key, state, expires_at))
+        if wait > 0:
+            return wait
+
+        for key, state, expires_at in updates:
+            self.store.set(key, state, expires_at)
+        return 0
+
+    def close(self):
+        self.store.close()
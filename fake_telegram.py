@@ -0,0 +1,122 @@
+"""네트워크 없이 봇을 실행하기 위한 가짜 텔레그램 Bot API
+
+FakeTelegram은 python-telegram-bot의 요청 객체 자리에 들어가 getMe, sendMessage,
+setWebhook 같은 요청에 로컬에서 응답하고, 보낸 메시지를 sent에 기록한다.
+실제 서버처럼 전체 초당 30개, 그룹별 분당 20개를 넘으면 429(retry_after)를 돌려준다.
+
+    FAKE_TELEGRAM=1 WEBHOOK_URL=http://127.0.0.1:8443/telegram WEBHOOK_SECRET=test python main_ver_3.py
+    python fake_telegram.py http://127.0.0.1:8443/telegram test /rankings   # 업데이트 하나를 웹훅으로 보냄
+"""
+import asyncio
+import itertools
+import json
+import sys
+import time
+import aiohttp
+from telegram.request import BaseRequest
+
+BOT_USER = {'id': 1, 'is_bot': True, 'first_name': 'Fake Bot', 'username': 'fake_bot'}
+
+
+class FakeTelegram(BaseRequest):
+    def __init__(self, global_rate=30, group_per_minute=20, latency=0.0):
+        self.global_rate = global_rate
+        self.group_per_minute = group_per_minute
+        self.latency = latency
+        self.sent = []
+        self.webhook = None
+        self.floods = 0
+        self._message_ids = itertools.count(1)
+
+    @property
+    def read_timeout(self):
+        return None
+
+    async def initialize(self):
+        pass
+
+    async def shutdown(self):
+        pass
+
+    def _flood_wait(self, chat_id, now):
+        """텔레그램 한도를 넘으면 기다려야 하는 초, 아니면 0"""
+        recent = [sent_at for sent_at, _, _ in self.sent if now - sent_at < 1]
+        if len(recent) >= self.global_rate:
+            return 1
+        if isinstance(chat_id, int) and chat_id < 0:
+            in_chat = [sent_at for sent_at, sent_chat, _ in self.sent if sent_chat == chat_id and now - sent_at < 60]
+            if len(in_chat) >= self.group_per_minute:
+                return int(60 - (now - in_chat[0])) + 1
+        return 0
+
+    def _send_message(self, params):
+        chat_id = int(params['chat_id'])
+        now = time.monotonic()
+        wait = self._flood_wait(chat_id, now)
+        if wait:
+            self.floods += 1
+            return 429, {'ok': False, 'error_code': 429, 'description': 'Too Many Requests',
+                         'parameters': {'retry_after': wait}}
+        self.sent.append((now, chat_id, params['text']))
+        return 200, {'ok': True, 'result': {
+            'message_id': next(self._message_ids),
+            'date': int(time.time()),
+            'chat': {'id': chat_id, 'type': 'group' if chat_id < 0 else 'private'},
+            'from': BOT_USER,
+            'text': params['text']
+        }}
+
+    async def do_request(self, url, method, request_data=None, read_timeout=None,
+                         write_timeout=None, connect_timeout=None, pool_timeout=None):
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        endpoint = url.rsplit('/', 1)[-1]
+        params = request_data.parameters if request_data is not None else {}
+        if endpoint == 'getMe':
+            status, body = 200, {'ok': True, 'result': BOT_USER}
+        elif endpoint == 'sendMessage':
+            status, body = self._send_message(params)
+        elif endpoint == 'setWebhook':
+            self.webhook = params
+            status, body = 200, {'ok': True, 'result': True}
+        elif endpoint == 'deleteWebhook':
+            self.webhook = None
+            status, body = 200, {'ok': True, 'result': True}
+        elif endpoint == 'getUpdates':
+            await asyncio.sleep(1)  # 업데이트가 없는 long polling
+            status, body = 200, {'ok': True, 'result': []}
+        else:
+            status, body = 200, {'ok': True, 'result': True}
+        return status, json.dumps(body).encode()
+
+
+def command_update(update_id, text, chat_id=-100, user_id=1000):
+    """명령어 메시지 하나가 담긴 업데이트 (웹훅 요청 본문)"""
+    command = text.split()[0]
+    return {
+        'update_id': update_id,
+        'message': {
+            'message_id': update_id,
+            'date': int(time.time()),
+            'chat': {'id': chat_id, 'type': 'group' if chat_id < 0 else 'private', 'title': 'Fake Group'},
+            'from': {'id': user_id, 'is_bot': False, 'first_name': f'user{user_id}'},
+            'text': text,
+            'entities': [{'type': 'bot_command', 'offset': 0, 'length': len(command)}]
+        }
+    }
+
+
+async def post_update(url, secret_token, update):
+    """웹훅 서버에 업데이트 하나를 보내고 HTTP 상태 코드를 반환"""
+    async with aiohttp.ClientSession() as session:
+        async with session.post(url, json=update, headers={'X-Telegram-Bot-Api-Secret-Token': secret_token}) as response:
+            return response.status
+
+
+if __name__ == '__main__':
+    # 사용법: python fake_telegram.py WEBHOOK_URL SECRET "/command args"
+    if len(sys.argv) < 4:
+        print("usage: python fake_telegram.py WEBHOOK_URL SECRET COMMAND")
+        sys.exit(1)
+    status = asyncio.run(post_update(sys.argv[1], sys.argv[2], command_update(int(time.time()), sys.argv[3])))
+    print(status)
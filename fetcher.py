@@ -0,0 +1,144 @@
+import asyncio
+import random
+import time
+
+
+class FetchError(Exception):
+    """재시도 후에도 페이지를 가져오지 못한 경우"""
+
+
+class TokenBucket:
+    """초당 rate개의 토큰을 채우는 토큰 버킷. 요청 전에 acquire()로 토큰을 하나 소비"""
+
+    def __init__(self, rate, capacity=None):
+        self.rate = rate
+        self.max_rate = rate
+        self.capacity = capacity or max(1, int(rate))
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def acquire(self):
+        async with self._lock:
+            while True:
+                self._refill()
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+    def try_acquire(self):
+        """토큰이 있으면 하나 소비하고 True, 없으면 기다리지 않고 False"""
+        self._refill()
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return True
+        return False
+
+    def wait_time(self):
+        """다음 토큰이 생길 때까지 남은 시간(초)"""
+        self._refill()
+        return 0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+
+    def slow_down(self, factor=0.5, min_rate=0.1):
+        """429 응답을 받으면 요청 속도를 줄임"""
+        self._refill()
+        self.rate = max(min_rate, self.rate * factor)
+
+    def speed_up(self, step=0.1):
+        """성공 응답마다 원래 속도까지 조금씩 회복"""
+        if self.rate < self.max_rate:
+            self._refill()
+            self.rate = min(self.max_rate, self.rate + step)
+
+
+class PageFetcher:
+    """여러 페이지를 동시에 요청하되 토큰 버킷으로 속도를 제한하고, 결과는 페이지 순서대로 돌려줌
+
+    fetch_page(page)는 (HTTP 상태 코드, 전송 목록)을 반환하는 코루틴.
+    page_size는 지금까지 받은 가장 긴 페이지의 길이로, 이보다 짧은 페이지는 이력의 마지막 페이지다.
+    여러 PageFetcher가 같은 API 요청 한도를 나눠 쓰려면 같은 bucket을 넘긴다.
+    cache에 이미 받아둔 페이지가 있으면 요청하지 않고 꺼내 쓴다 (PageLocator가 탐색 중 채움).
+    """
+
+    def __init__(self, fetch_page, concurrency=4, rate=2.0, burst=None,
+                 max_retries=5, base_backoff=1.0, max_backoff=60.0, bucket=None):
+        self.fetch_page = fetch_page
+        self.concurrency = concurrency
+        self.bucket = bucket or TokenBucket(rate, burst or concurrency)
+        self.max_retries = max_retries
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+        self.cache = {}
+        self.page_size = 0
+
+    async def fetch(self, page):
+        """페이지 하나를 재시도 포함해서 요청 (캐시는 사용하지 않음). 4xx로 거절된 페이지는 None"""
+        for attempt in range(self.max_retries + 1):
+            await self.bucket.acquire()
+            status, transfers = await self.fetch_page(page)
+            if status == 200:
+                self.bucket.speed_up()
+                self.page_size = max(self.page_size, len(transfers))
+                return transfers
+
+            # 429/5xx/네트워크 오류(None)는 지수 백오프 후 재시도, 그 외 응답은 재시도하지 않음
+            if status is not None and status != 429 and status < 500:
+                return None
+            if status == 429:
+                self.bucket.slow_down()
+            delay = min(self.max_backoff, self.base_backoff * 2 ** attempt)
+            await asyncio.sleep(delay * random.uniform(0.5, 1.0))
+        raise FetchError(f"page {page}: giving up after {self.max_retries} retries")
+
+    async def _fetch_cached(self, page):
+        if page in self.cache:
+            return self.cache.pop(page)
+        return await self.fetch(page)
+
+    async def fetch_pages(self, stop_block, first_page=1):
+        """first_page부터 페이지를 순서대로 반환. stop_block 이하 블록이 포함된 페이지까지만 요청
+
+        이력의 끝(page_size보다 짧은 페이지나 빈 페이지)에서 멈추며, 빈 페이지도 반환해 끝까지 읽었음을 알 수 있게 한다.
+        4xx로 거절된 페이지에서는 그 페이지를 반환하지 않고 멈춘다.
+        """
+        in_flight = {}
+        next_page = first_page
+        last_page = None  # stop_block을 넘어선 페이지 (이후 페이지는 요청하지 않음)
+        current = first_page
+
+        def crosses(transfers):
+            return (not transfers or len(transfers) < self.page_size
+                    or int(transfers[-1]['blockNumber']) <= stop_block)
+
+        def on_done(page, task):
+            nonlocal last_page
+            if task.cancelled() or task.exception() is not None:
+                return
+            if crosses(task.result()) and (last_page is None or page < last_page):
+                last_page = page
+
+        try:
+            while last_page is None or current <= last_page:
+                # 동시 요청 창을 채움
+                while len(in_flight) < self.concurrency and (last_page is None or next_page <= last_page):
+                    task = asyncio.ensure_future(self._fetch_cached(next_page))
+                    task.add_done_callback(lambda t, page=next_page: on_done(page, t))
+                    in_flight[next_page] = task
+                    next_page += 1
+
+                transfers = await in_flight.pop(current)
+                if transfers is None:
+                    return
+                yield current, transfers
+                if crosses(transfers):
+                    return
+                current += 1
+        finally:
+            for task in in_flight.values():
+                task.cancel()
@@ -0,0 +1,72 @@
+import asyncio
+import time
+from urllib.parse import urlsplit
+import aiohttp
+import metrics
+
+UPSTREAM_RESPONSES = metrics.counter(
+    'upstream_http_responses_total', 'Upstream HTTP responses by host and status code', ('host', 'status')
+)
+UPSTREAM_SECONDS = metrics.histogram(
+    'upstream_http_request_seconds', 'Upstream HTTP request latency', ('host',)
+)
+
+
+class HttpClient:
+    """애플리케이션 전체에서 공유하는 aiohttp 세션 (keep-alive 연결 풀, DNS 캐시)"""
+
+    def __init__(self, limit=100, limit_per_host=10, dns_ttl=300, keepalive_timeout=30,
+                 total_timeout=30, connect_timeout=10):
+        self.limit = limit
+        self.limit_per_host = limit_per_host
+        self.dns_ttl = dns_ttl
+        self.keepalive_timeout = keepalive_timeout
+        self.timeout = aiohttp.ClientTimeout(total=total_timeout, connect=connect_timeout)
+        self.session = None
+
+    async def start(self):
+        if self.session is None or self.session.closed:
+            connector = aiohttp.TCPConnector(
+                limit=self.limit,
+                limit_per_host=self.limit_per_host,
+                ttl_dns_cache=self.dns_ttl,
+                keepalive_timeout=self.keepalive_timeout
+            )
+            self.session = aiohttp.ClientSession(connector=connector, timeout=self.timeout)
+
+    async def close(self):
+        if self.session is not None and not self.session.closed:
+            await self.session.close()
+        self.session = None
+
+    async def get_json(self, url, **kwargs):
+        """GET 요청 후 (HTTP 상태 코드, JSON 데이터)를 반환. 네트워크 오류나 JSON이 아닌 응답은 (None, None)"""
+        return await self._request_json('GET', url, **kwargs)
+
+    async def post_json(self, url, payload, **kwargs):
+        """JSON 본문으로 POST 요청 후 (HTTP 상태 코드, JSON 데이터)를 반환. 네트워크 오류나 JSON이 아닌 응답은 (None, None)"""
+        return await self._request_json('POST', url, json=payload, **kwargs)
+
+    async def _request_json(self, method, url, **kwargs):
+        await self.start()
+        host = urlsplit(url).hostname
+        started = time.perf_counter()
+        status = 'error'
+        try:
+            async with self.session.request(method, url, **kwargs) as response:
+                status = response.status
+                if response.status != 200:
+                    return response.status, None
+                try:
+                    return response.status, await response.json(content_type=None)
+                except ValueError as e:
+                    # 점검 페이지 등 JSON이 아닌 200 응답은 네트워크 오류처럼 재시도/오류 처리 경로로 보냄
+                    status = 'invalid_json'
+                    print(f"Invalid JSON from {url}: {e}")
+                    return None, None
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            print(f"HTTP error for {url}: {e}")
+            return None, None
+        finally:
+            UPSTREAM_SECONDS.observe(time.perf_counter() - started, host=host)
+            UPSTREAM_RESPONSES.inc(host=host, status=status)
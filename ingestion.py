@@ -0,0 +1,368 @@
+import asyncio
+from contextlib import aclosing
+from datetime import datetime
+from singleflight import SingleFlight
+from transfer_store import transfer_from_api
+import metrics
+
+REFRESH_PAGES = metrics.histogram(
+    'refresh_pages', 'Transfer pages fetched per refresh', buckets=(1, 2, 5, 10, 25, 50, 100, 500, 1000)
+)
+SYNC_REVERTED = metrics.counter(
+    'sync_reverted_transfers_total', 'Stored transfers removed or replaced because upstream changed them'
+)
+SYNC_UNSTABLE = metrics.counter(
+    'sync_unstable_passes_total', 'Sync passes during which pages shifted under the reader'
+)
+SYNC_INCOMPLETE = metrics.counter(
+    'sync_incomplete_passes_total', 'Sync passes that stopped before reaching the start of their window'
+)
+
+# 최근 몇 블록은 확정되지 않은 것으로 보고 매번 다시 읽어 업스트림과 맞춤
+CONFIRMATIONS = 3
+
+
+def _transfer_key(transfer):
+    return (transfer['parent_hash'], transfer['from_address'], transfer['to_address'], transfer['log_index'])
+
+
+def _reached(pages, stop_block, page_size):
+    """읽은 페이지가 stop_block까지 내려갔는지 (중간에 4xx로 멈추지 않았는지)
+
+    마지막 페이지가 stop_block 이하 블록을 포함하거나, API 페이지 크기(page_size)보다 짧거나,
+    앞 페이지 다음의 빈 페이지이면 이력의 끝까지 읽은 것으로 본다.
+    첫 페이지부터 비어 있으면 일시적인 빈 응답일 수 있으므로 끝까지 읽은 것으로 보지 않는다.
+    """
+    if not pages or not pages[0][1]:
+        return False
+    last = pages[-1][1]
+    return not last or len(last) < page_size or int(last[-1]['blockNumber']) <= stop_block
+
+
+def _drop_shifted(previous, transfers):
+    """앞 페이지 끝과 겹치는 행을 제외 (읽는 사이 새 전송이 생겨 행이 뒤 페이지로 밀린 경우)"""
+    for overlap in range(min(len(previous), len(transfers)), 0, -1):
+        if transfers[:overlap] == previous[-overlap:]:
+            return transfers[overlap:]
+    return transfers
+
+
+class _LogIndexer:
+    """응답에 logIndex가 없으면 같은 거래 안에서 (from, to)가 같은 전송의 순번을 log_index로 사용
+
+    한 거래의 전송은 모두 같은 블록에 있으므로 블록이 바뀌면 순번을 초기화한다.
+    """
+
+    def __init__(self):
+        self.block = None
+        self.counts = {}
+
+    def assign(self, transfer):
+        if transfer['log_index'] is not None:
+            return transfer
+        if transfer['block_number'] != self.block:
+            self.block = transfer['block_number']
+            self.counts = {}
+        key = (transfer['parent_hash'], transfer['from_address'], transfer['to_address'])
+        transfer['log_index'] = self.counts.get(key, 0)
+        self.counts[key] = transfer['log_index'] + 1
+        return transfer
+
+
+async def sync_transfers(page_fetcher, store, start_block, end_block=None, locator=None,
+                         confirmations=CONFIRMATIONS, batch_size=5000):
+    """스토어를 업스트림의 최신 전송 데이터와 맞춤. 새로 추가된 행 수를 반환
+
+    동기화 위치(sync_cursor)는 마지막으로 반영한 전송의 (블록, parent hash, log_index)이다.
+    커서가 없으면 start_block까지 전체를 백필하고, 커서가 있으면 커서 블록에서 confirmations만큼
+    앞선 블록부터 다시 읽어(겹치는 구간) 페이지 밀림으로 놓친 행을 채우고, 업스트림에서 사라지거나
+    바뀐 행은 삭제 기록을 남기고 지워서 순위 엔진이 되돌린 뒤 다시 반영하게 한다.
+
+    end_block이 있으면 그보다 새로운 블록의 전송은 저장하지 않고, locator가 있으면
+    end_block 이후 페이지들을 건너뛰고 end_block이 있는 페이지부터 수집한다.
+    """
+    cursor = store.get_meta('sync_cursor')
+    if cursor is not None and cursor.get('final'):
+        return 0  # 확정까지 끝난 이벤트 구간은 다시 요청하지 않음
+
+    first_page = 1
+    if end_block is not None and locator is not None:
+        first_page = await locator.find_page(end_block)
+
+    try:
+        if cursor is None:
+            return await _backfill(page_fetcher, store, start_block, end_block, first_page, batch_size)
+        return await _sync_window(
+            page_fetcher, store, start_block, end_block, locator, first_page, cursor, confirmations
+        )
+    finally:
+        if locator is not None:
+            locator.clear_pages()
+
+
+async def _read_pages(page_fetcher, stop_block, first_page):
+    """first_page부터 stop_block 이하 블록이 나오는 페이지까지 (페이지, 원본 전송 목록)을 모음"""
+    pages = []
+    async with aclosing(page_fetcher.fetch_pages(stop_block=stop_block, first_page=first_page)) as fetched:
+        async for page, transfers in fetched:
+            pages.append((page, transfers))
+    REFRESH_PAGES.observe(len(pages))
+    return pages
+
+
+async def _backfill(page_fetcher, store, start_block, end_block, first_page, batch_size):
+    """빈 스토어를 start_block까지 채움. 긴 백필에서도 메모리에 쌓아두지 않도록 중간중간 저장
+
+    저장할 때마다 첫 페이지를 다시 받아, 그 사이 첫 페이지가 바뀌었을 때만 페이지 경계의 중복을 제외한다.
+    """
+    new_count = 0
+    pages_fetched = 0
+    ends = []  # 끝까지 읽었는지 판단할 (첫 페이지, 마지막 페이지)
+    newest = None
+    indexer = _LogIndexer()
+    head = None
+    previous = []
+    pending = []
+
+    async def flush():
+        nonlocal head, previous, newest
+        latest = await page_fetcher.fetch(first_page) or []
+        stable = head is not None and latest[:1] == head[:1]
+        if not stable and head is not None:
+            SYNC_UNSTABLE.inc()
+        head = latest
+        batch = []
+        for transfers in pending:
+            if not stable:
+                transfers, previous = _drop_shifted(previous, transfers), transfers
+            else:
+                previous = transfers
+            for transfer in transfers:
+                transfer = transfer_from_api(transfer)
+                # start_block보다 작거나 같은 블록의 전송은 저장하지 않음
+                if transfer['block_number'] <= start_block:
+                    continue
+                if end_block is not None and transfer['block_number'] > end_block:
+                    continue
+                batch.append(indexer.assign(transfer))
+                if newest is None or transfer['block_number'] > newest['block_number']:
+                    newest = transfer
+        pending.clear()
+        return store.upsert_transfers(batch)
+
+    async with aclosing(page_fetcher.fetch_pages(stop_block=start_block, first_page=first_page)) as pages:
+        async for page, transfers in pages:
+            if head is None:
+                head = transfers
+            pages_fetched += 1
+            if ends:
+                ends[1:] = [(page, transfers)]
+            else:
+                ends.append((page, transfers))
+            pending.append(transfers)
+            if sum(len(transfers) for transfers in pending) >= batch_size:
+                new_count += await flush()
+
+    REFRESH_PAGES.observe(pages_fetched)
+    if pending:
+        new_count += await flush()
+    if ends and not ends[0][1]:
+        return new_count  # 아직 전송이 없음 (백필할 것이 없으므로 커서도 만들지 않음)
+    if not _reached(ends, start_block, page_fetcher.page_size):
+        # 중간에 멈춘 백필은 커서를 남기지 않아 다음 수집에서 처음부터 다시 채움 (저장된 행은 upsert로 중복 없음)
+        SYNC_INCOMPLETE.inc()
+        print(f"Backfill stopped before block {start_block}, retrying on the next sync")
+        return new_count
+    if newest is None:
+        # start_block 이후 전송이 아직 없어도 끝까지 읽었으므로 다음부터는 구간만 확인
+        store.set_meta('sync_cursor', {'block': start_block})
+    else:
+        store.set_meta('sync_cursor', {
+            'block': newest['block_number'],
+            'parent_hash': newest['parent_hash'],
+            'log_index': newest['log_index']
+        })
+    return new_count
+
+
+async def _sync_window(page_fetcher, store, start_block, end_block, locator, first_page, cursor, confirmations):
+    """커서 블록 - confirmations 이후의 구간을 다시 읽어 스토어와 비교한 뒤 차이만 반영"""
+    window_start = max(start_block, cursor['block'] - confirmations)
+    if end_block is not None and window_start >= end_block:
+        window_start = max(start_block, end_block - confirmations)
+    pages = await _read_pages(page_fetcher, window_start, first_page)
+
+    # 여러 페이지를 읽는 동안 첫 페이지가 바뀌었으면 행이 밀려 중복되거나 빠졌을 수 있음
+    stable = True
+    if len(pages) > 1:
+        latest = await page_fetcher.fetch(first_page) or []
+        stable = latest[:1] == pages[0][1][:1]
+        if not stable:
+            SYNC_UNSTABLE.inc()
+
+    # 4xx나 빈 첫 페이지로 window_start에 닿기 전에 멈췄으면 읽지 못한 행을 삭제로 보지 않고 커서도 그대로 둠
+    complete = _reached(pages, window_start, page_fetcher.page_size)
+    if not complete:
+        SYNC_INCOMPLETE.inc()
+        print(f"Sync stopped before block {window_start}, keeping the cursor for the next sync")
+
+    # 구간 안의 전송만 모음. 밀린 페이지에서만 앞 페이지와 겹치는 행을 중복으로 보고 제외
+    head_block = None
+    if first_page > 1 and locator is not None and locator.ranges.get(first_page - 1):
+        head_block = locator.ranges[first_page - 1][1]
+    indexer = _LogIndexer()
+    fetched = {}
+    previous = []
+    for page, transfers in pages:
+        if not stable:
+            transfers, previous = _drop_shifted(previous, transfers), transfers
+        for transfer in transfers:
+            transfer = transfer_from_api(transfer)
+            block_number = transfer['block_number']
+            if head_block is None or block_number > head_block:
+                head_block = block_number
+            if block_number <= window_start:
+                continue
+            if end_block is not None and block_number > end_block:
+                continue
+            fetched[_transfer_key(indexer.assign(transfer))] = transfer
+
+    # 스토어의 같은 구간과 비교: 바뀐 행은 지우고 다시 추가, 사라진 행은 구간을 끝까지 읽었고 첫 페이지가 그대로일 때만 삭제
+    removed = []
+    for stored in store.window_transfers(window_start, end_block):
+        transfer = fetched.get(_transfer_key(stored))
+        if transfer is None:
+            if stable and complete:
+                removed.append(stored['seq'])
+        elif (transfer['amount'], transfer['block_number']) != (stored['amount'], stored['block_number']):
+            removed.append(stored['seq'])
+        else:
+            del fetched[_transfer_key(stored)]
+    if removed:
+        SYNC_REVERTED.inc(store.remove_transfers(removed))
+        print(f"Upstream changed {len(removed)} transfers after block {window_start}, reverting them")
+
+    new_count = store.upsert_transfers(sorted(fetched.values(), key=lambda t: t['block_number']))
+
+    # 밀린 페이지를 읽었거나 구간을 끝까지 읽지 못했으면 커서를 옮기지 않고 다음 수집에서 같은 구간을 다시 확인
+    if stable and complete:
+        newest = max(store.window_transfers(window_start, end_block),
+                     key=lambda t: (t['block_number'], t['seq']), default=None)
+        if newest is not None:
+            cursor = {
+                'block': newest['block_number'],
+                'parent_hash': newest['parent_hash'],
+                'log_index': newest['log_index']
+            }
+        if end_block is not None and head_block is not None and head_block >= end_block + confirmations:
+            cursor['final'] = True  # 체인이 end_block보다 충분히 지나 구간이 확정됨
+        store.set_meta('sync_cursor', cursor)
+    return new_count
+
+
+def _log_refresh_error(task):
+    if not task.cancelled() and task.exception() is not None:
+        print(f"Error in background refresh: {task.exception()}")
+
+
+class IngestionWorker:
+    """주기적으로 새 전송 데이터를 수집하고 순위를 갱신하는 백그라운드 작업
+
+    명령어 핸들러는 수집을 기다리지 않고 마지막으로 만들어진 snapshot만 읽는다.
+    snapshot이 오래되었으면 갱신을 백그라운드에서 시작(또는 진행 중인 갱신에 합류)만 하고 바로 반환한다.
+    version()이 있으면 snapshot에 순위 버전을 함께 기록해 메시지 캐시 키로 쓸 수 있게 한다.
+    """
+
+    def __init__(self, save_transfers, update_rankings, interval=30, fresh_for=None, version=None):
+        self.save_transfers = save_transfers
+        self.update_rankings = update_rankings
+        self.version = version
+        self.interval = interval
+        # 동시에 들어온 갱신 요청은 하나로 합치고, fresh_for초 이내의 결과는 재사용
+        self.flight = SingleFlight(fresh_for=interval if fresh_for is None else fresh_for)
+        self.snapshot = None
+        self._background = None
+
+    async def refresh_once(self, fresh_for=None):
+        """새 전송 데이터를 저장하고 순위를 갱신한 뒤 snapshot 교체. 실패하면 None
+
+        이미 진행 중인 갱신이 있으면 새로 시작하지 않고 그 결과를 함께 기다린다.
+        """
+        return await self.flight.do('refresh', self._refresh, fresh_for=fresh_for)
+
+    async def get_snapshot(self):
+        """현재 snapshot을 바로 반환. 오래되었으면 갱신을 백그라운드에서 시작하고, snapshot이 아직 없을 때만 기다림"""
+        if self.snapshot is None:
+            return await self.refresh_once()
+        age = (datetime.now() - self.snapshot['last_updated']).total_seconds()
+        if age >= self.flight.fresh_for and (self._background is None or self._background.done()):
+            self._background = asyncio.ensure_future(self.refresh_once())
+            self._background.add_done_callback(_log_refresh_error)
+        return self.snapshot
+
+    async def _refresh(self):
+        new_transfers = await self.save_transfers()
+        if new_transfers is None:
+            return None
+
+        return self._publish(await self.update_rankings(), new_transfers)
+
+    def _publish(self, rankings, new_transfers):
+        if rankings is None:
+            return None
+        self.snapshot = {
+            'rankings': rankings,
+            'version': self.version() if self.version else None,
+            'new_transfers': new_transfers,
+            'last_updated': datetime.now()
+        }
+        return self.snapshot
+
+    async def prime(self):
+        """첫 수집을 기다리지 않도록 이미 저장된 데이터로 먼저 순위를 만들어 둠"""
+        return self._publish(await self.update_rankings(), 0)
+
+
+class IngestionScheduler:
+    """여러 IngestionWorker(캠페인)를 하나의 백그라운드 작업에서 주기적으로 갱신
+
+    각 캠페인의 요청은 PageFetcher가 공유하는 토큰 버킷으로 전체 API 한도 안에서 처리된다.
+    """
+
+    def __init__(self, workers, interval=30):
+        self.workers = list(workers)
+        self.interval = interval
+        self._task = None
+
+    async def _run_each(self, method, **kwargs):
+        results = await asyncio.gather(
+            *(getattr(worker, method)(**kwargs) for worker in self.workers),
+            return_exceptions=True
+        )
+        for result in results:
+            if isinstance(result, Exception):
+                print(f"Error in ingestion worker: {result}")
+
+    async def run(self):
+        await self._run_each('prime')
+        while True:
+            # 주기 갱신은 최근 결과가 있어도 항상 새로 수집
+            await self._run_each('refresh_once', fresh_for=0)
+            await asyncio.sleep(self.interval)
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self.run())
+        return self._task
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        for worker in self.workers:
+            if worker._background is not None:
+                worker._background.cancel()
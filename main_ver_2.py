@@ -24,15 +24,15 @@ chat_id = os.environ.get('chat_id')
 START_BLOCK = 167429702
 END_BLOCK = 168034504
 
-# 스왑 주소 설정 (업데이트됨)
-SWAP_ADDRESSES = [
+# 스왑 주소 설정 (업데이트됨, 거래마다 여러 번 조회하므로 frozenset 사용)
+SWAP_ADDRESSES = frozenset([
     "0xf50782a24afcb26acb85d086cf892bfffb5731b5",  # 스왑 스캐너
     "0x8d1179873ff63da28642b333569b993ef7796abd",  # 드래곤 스왑
     "0xd9ffa5dd8b595b904f76e3e7d71e4f85c3afa9ae",  # 드래곤 스왑
     "0xedcad4bd04f59e8fcc7c5fc7547e5112ae9923df",  # Moodeng Contract
     "0xea9cb97ed3d711afd07f1ba91b568627d12b6f9f",  # 드래곤 스왑
     "0x4e7bbe1279c8ca0098698ee1f47d0b1ad246d44a"   # KLAY SWAP 
-]
+])
 
 MOODENG_ADDRESS = "0xedcad4bd04f59e8fcc7c5fc7547e5112ae9923df"
 
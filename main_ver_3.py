@@ -1,14 +1,29 @@
 import telegram
 from telegram.ext import ApplicationBuilder, CommandHandler
-import requests
 from dotenv import load_dotenv
 import os
-import json
 import asyncio
-import aiohttp
-from datetime import datetime, timedelta
+import math
+import signal
+import time
+from datetime import datetime, timezone
+from urllib.parse import urlsplit
 from telegram import Update
 from telegram.ext import ContextTypes
+from fetcher import TokenBucket
+from http_client import HttpClient
+from price_service import PriceService, PriceError
+from ingestion import IngestionScheduler
+from campaigns import load_campaigns
+from block_clock import BlockClock, KaiaRpc, RpcError
+from singleflight import SingleFlight
+from render_cache import RenderCache
+from send_queue import SendQueue, BROADCAST
+from cooldowns import Cooldowns, Policy, SqliteStore
+from webhook_server import WebhookServer
+from fake_telegram import FakeTelegram
+import metrics
+from metrics import MetricsServer
 
 # .env 파일 로드
 load_dotenv()
@@ -16,301 +31,494 @@ load_dotenv()
 token = os.environ.get('TELEGRAM_BOT_TOKEN')
 chat_id = os.environ.get('chat_id')
 
-# 이벤트 시작 블록 넘버 설정
-START_BLOCK = 167429702
-
-# JSON 파일 경로
-TRANSFERS_JSON = 'moodeng_transfers_1.json'
-RANKINGS_JSON = 'moodeng_rankings_1.json'
-
-# 스왑 주소 설정
-SWAP_ADDRESSES = [
-    "0xf50782a24afcb26acb85d086cf892bfffb5731b5",  # 스왑 스캐너
-    "0x8d1179873ff63da28642b333569b993ef7796abd",  # 드래곤 스왑
-    "0xd9ffa5dd8b595b904f76e3e7d71e4f85c3afa9ae",  # 새로 추가된 주소
-    "0xedcad4bd04f59e8fcc7c5fc7547e5112ae9923df",  # 드래곤 스왑
-    "0xea9cb97ed3d711afd07f1ba91b568627d12b6f9f",  # 드래곤 스왑
-    "0x4e7bbe1279c8ca0098698ee1f47d0b1ad246d44a",   # KLAY SWAP 
-    "0xe60145b2b9c94186f16072db6d327e91ce18b96a",
-    "0xc2c007352c00fefa1a4752a28658705168abd873",
-    "0xc87a687c63842c3a86f7bca3fe6fb0564feb58b5"
-]
+# 캠페인(토큰별 이벤트) 설정 파일. 첫 번째 캠페인이 /rankings의 기본값
+CAMPAIGNS_JSON = 'campaigns.json'
+
+# 모든 캠페인이 나눠 쓰는 전송 API 초당 요청 수와 캠페인별 동시 요청 수
+FETCH_CONCURRENCY = 4
+FETCH_RATE = 2.0
+
+# 새 전송 데이터 수집 주기 (초)
+INGESTION_INTERVAL = 30
+
+# 이 시간(초) 이내에 갱신된 순위는 /rankings에서 그대로 재사용
+RANKINGS_FRESHNESS = 60
+
+# 순위 파일과 엔진 스냅샷 저장 주기 (초). 그 사이의 변경은 재시작 시 스토어에서 다시 반영됨
+SNAPSHOT_INTERVAL = 300
 
 MOODENG_ADDRESS = "0xedcad4bd04f59e8fcc7c5fc7547e5112ae9923df"
 
+# /rankings N 으로 한 번에 보여줄 수 있는 최대 순위 수 (텔레그램 메시지 길이 제한)
+MAX_RANKINGS_PAGE = 50
+
+# 캠페인마다 캐시해 두는 최대 메시지 수 (/rank 주소, /volume 기간 등 키가 계속 늘어나므로 제한)
+RENDER_CACHE_ENTRIES = 256
+
+# 블록 시각 조회에 쓰는 Kaia 노드 JSON-RPC 주소와 블록 넘버 <-> 시각 색인 파일
+KAIA_RPC_URL = "https://public-en.node.kaia.io"
+BLOCK_TIMES_FILE = 'block_times.bin'
+
+# 블록 시각 색인의 기준점이 없는 구간에서 쓰는 평균 블록 시간 (초)
+BLOCK_TIME = 1.0
+PERIOD_UNITS = {'m': 60, 'h': 3600, 'd': 86400}
+DEFAULT_PERIOD = '24h'
+MAX_PERIOD = 30 * 86400
+
+# 명령어별 사용 한도. 모든 정책을 통과해야 명령어가 실행됨 (목록에 없는 명령어는 사용자별 60초에 한 번)
+COOLDOWN_POLICIES = {
+    'rankings': [Policy(1, 60, per='user'), Policy(6, 60, per='chat')],
+    'rank': [Policy(3, 60, per='user', mode='bucket')],
+    'price': [Policy(1, 30, per='user'), Policy(4, 60, per='chat', mode='bucket')],
+    'volume': [Policy(1, 30, per='user'), Policy(6, 60, per='chat')],
+    'flows': [Policy(1, 30, per='user'), Policy(6, 60, per='chat')],
+}
+# 사용 한도 상태를 저장할 SQLite 파일 (None이면 메모리에만 보관해 재시작하면 초기화)
+COOLDOWN_DB = None
+
+# 웹훅 모드 (WEBHOOK_URL이 있으면 long polling 대신 내장 서버로 업데이트를 받음)
+WEBHOOK_URL = os.environ.get('WEBHOOK_URL')
+WEBHOOK_SECRET = os.environ.get('WEBHOOK_SECRET')
+WEBHOOK_HOST = os.environ.get('WEBHOOK_HOST', '0.0.0.0')
+WEBHOOK_PORT = int(os.environ.get('WEBHOOK_PORT', '8443'))
+WEBHOOK_MAX_CONNECTIONS = int(os.environ.get('WEBHOOK_MAX_CONNECTIONS', '40'))
+
+# 1이면 텔레그램 서버 대신 로컬 가짜 Bot API를 사용 (오프라인 테스트)
+FAKE_TELEGRAM = os.environ.get('FAKE_TELEGRAM') == '1'
+
+# 로컬 /metrics 엔드포인트 포트
+METRICS_PORT = 9100
+
+BOT_COMMANDS = metrics.counter('bot_commands_total', 'Bot command invocations', ('command', 'outcome'))
+
+# 모든 외부 API 요청이 공유하는 HTTP 클라이언트 (봇 수명 주기와 함께 열고 닫음)
+http_client = HttpClient(limit_per_host=FETCH_CONCURRENCY * 2)
+
+# 가격 API 캐시 (동시 /price 요청은 업스트림 요청 하나로 합쳐짐)
+PRICES_URL = "https://api.swapscanner.io/v1/tokens/prices"
+price_service = PriceService(http_client, PRICES_URL, ttl=10, stale_ttl=60)
+
+PRICE_STATS = metrics.gauge('price_service', 'Price cache statistics', ('stat',))
+
+def collect_price_stats():
+    for stat, value in price_service.metrics().items():
+        PRICE_STATS.set(value, stat=stat)
+
+metrics.REGISTRY.add_collector(collect_price_stats)
+
+# 텔레그램 발신 큐 (전체 초당 30개, 그룹별 분당 20개 한도 안에서 명령어 응답을 먼저 보냄)
+outbox = SendQueue()
+
+# 완성된 /rankings, /price 메시지 캐시. 순위 버전이나 가격 데이터가 바뀔 때만 다시 만듦
+render_cache = RenderCache(max_entries=RENDER_CACHE_ENTRIES)
+
+# 블록 넘버 <-> 시각 색인. 최신 블록은 60초에 한 번만 조회 (동시 요청은 하나로 합침)
+block_clock = BlockClock(BLOCK_TIMES_FILE, block_time=BLOCK_TIME)
+kaia_rpc = KaiaRpc(http_client, KAIA_RPC_URL)
+chain_head = SingleFlight(fresh_for=60)
+
+# 캠페인별 스토어/순위 엔진 (main()에서 설정 파일을 읽어 채움, 첫 번째가 기본 캠페인)
+# 전송 API 요청 한도는 하나의 토큰 버킷으로 모든 캠페인이 공유
+api_bucket = TokenBucket(FETCH_RATE, FETCH_CONCURRENCY)
+campaigns = {}
+
 class TelegramBot:
-    def __init__(self, name, token, chat_id):
+    def __init__(self, name, token, chat_id, http=None, outbox=None, request=None):
         self.core = telegram.Bot(token)
-        self.application = ApplicationBuilder().token(token).build()
+        builder = ApplicationBuilder().token(token)
+        if request is not None:
+            # 가짜 Bot API 등 다른 요청 객체로 텔레그램 서버와 통신
+            builder = builder.request(request).get_updates_request(request)
+        self.application = builder.build()
+        # 웹훅 모드에서 사용하는 내장 서버 (None이면 long polling)
+        self.webhook = None
         self.id = chat_id
         self.name = name
-        self.last_command_time = {}
+        self.cooldowns = Cooldowns(
+            COOLDOWN_POLICIES, store=SqliteStore(COOLDOWN_DB) if COOLDOWN_DB else None
+        )
+        # 봇이 시작/종료될 때 함께 열고 닫는 공유 HTTP 클라이언트
+        self.http = http or HttpClient()
+        # 모든 발신 메시지는 속도 제한 큐를 거침
+        self.outbox = outbox or SendQueue()
 
     async def send_message(self, text, parse_mode=None):
         if self.id:
-            await self.core.send_message(chat_id=self.id, text=text, parse_mode=parse_mode)
+            await self.outbox.send(self.id, text, parse_mode=parse_mode, lane=BROADCAST, batch=True)
         else:
             print("Chat ID not set")
 
     def add_handler(self, cmd, func):
-        self.application.add_handler(CommandHandler(cmd, self.cooldown_wrapper(func)))
+        self.application.add_handler(CommandHandler(cmd, self.cooldown_wrapper(func, cmd)))
 
-    def cooldown_wrapper(self, func):
+    def cooldown_wrapper(self, func, cmd=None):
+        cmd = cmd or func.__name__
         async def wrapper(update: Update, context: ContextTypes.DEFAULT_TYPE):
-            user_id = update.effective_user.id
-            current_time = datetime.now()
-            if user_id in self.last_command_time:
-                last_time = self.last_command_time[user_id]
-                if current_time - last_time < timedelta(seconds=60):
-                    await context.bot.send_message(
-                        chat_id=update.effective_chat.id,
-                        text="Please wait 60 seconds before using this command again.",
-                        parse_mode='Markdown'
-                    )
-                    return
-            self.last_command_time[user_id] = current_time
-            await func(update, context)
+            wait = self.cooldowns.check(cmd, update.effective_user.id, update.effective_chat.id)
+            if wait > 0:
+                self.outbox.submit(
+                    update.effective_chat.id,
+                    f"Please wait {math.ceil(wait)} seconds before using this command again.",
+                    parse_mode='Markdown'
+                )
+                BOT_COMMANDS.inc(command=cmd, outcome='cooldown')
+                return
+            try:
+                await func(update, context)
+            except Exception:
+                BOT_COMMANDS.inc(command=cmd, outcome='error')
+                raise
+            BOT_COMMANDS.inc(command=cmd, outcome='ok')
         return wrapper
 
+    def use_webhook(self, url, secret_token=None, host='0.0.0.0', port=8443, max_connections=40):
+        """long polling 대신 웹훅으로 업데이트를 받음 (start() 전에 호출)"""
+        self.webhook = WebhookServer(
+            self.application, url, host=host, port=port, path=urlsplit(url).path or None,
+            secret_token=secret_token, max_connections=max_connections
+        )
+
     async def start(self):
+        await self.http.start()
         await self.application.initialize()
         await self.application.start()
-        await self.application.updater.start_polling()
-
-async def get_transfers(page):
-    url = f"https://api-cypress.klaytnscope.com/v2/tokens/{MOODENG_ADDRESS}/transfers?page={page}"
-    async with aiohttp.ClientSession() as session:
-        async with session.get(url) as response:
-            if response.status == 200:
-                data = await response.json()
-                return data.get('result', [])
-            else:
-                print(f"Error fetching transfers: {response.status}")
-                return []
-
-
-async def save_transfers():
-    """전송 데이터를 수집하고 JSON 파일로 저장. 동일한 parent hash의 다른 거래도 저장"""
-    try:
-        # 기존 데이터 로드 또는 새로운 딕셔너리 생성
-        transfers_data = {}
-        if os.path.exists(TRANSFERS_JSON):
-            try:
-                with open(TRANSFERS_JSON, 'r') as f:
-                    transfers_data = json.load(f)
-            except json.JSONDecodeError:
-                print(f"Error reading {TRANSFERS_JSON}, starting with empty data")
-                transfers_data = {}
+        self.outbox.start(self.application.bot.send_message)
+        if self.webhook is not None:
+            await self.webhook.start()
+        else:
+            await self.application.updater.start_polling()
+
+    async def stop(self):
+        # 새 업데이트를 먼저 막고, 보내던 메시지를 마저 보낸 뒤 종료
+        if self.webhook is not None:
+            await self.webhook.stop()
+        if self.application.updater.running:
+            await self.application.updater.stop()
+        await self.outbox.stop()
+        await self.application.stop()
+        await self.application.shutdown()
+        await self.http.close()
+        self.cooldowns.close()
+
+def split_args(args):
+    """명령어 인자를 (캠페인 이름, 숫자 목록, 주소 목록)으로 나눔"""
+    name = None
+    numbers = []
+    addresses = []
+    for arg in args:
+        if arg.isdigit():
+            numbers.append(int(arg))
+        elif arg.lower().startswith('0x'):
+            addresses.append(arg.lower())
         else:
-            # 파일이 없으면 빈 JSON 파일 생성
-            with open(TRANSFERS_JSON, 'w') as f:
-                json.dump({}, f)
+            name = arg.lower()
+    return name, numbers, addresses
 
-        # 기존 데이터의 block number 집합 생성
-        existing_blocks = set(int(tx['block_number']) for tx in transfers_data.values())
-        
-        page = 1
-        new_data_found = False
-        
-        while True:
-            transfers = await get_transfers(page)
-            if not transfers:
-                break
-
-            found_old_block = False
-            for transfer in transfers:
-                block_number = int(transfer['blockNumber'])
-                
-                # START_BLOCK보다 작거나 같은 블록을 만나면 종료
-                if block_number <= START_BLOCK:
-                    found_old_block = True
-                    break
-
-                # 고유 식별자로 parent hash와 from/to 주소 조합 사용
-                tx_id = f"{transfer['parentHash']}_{transfer['fromAddress']}_{transfer['toAddress']}"
-                
-                # 새로운 데이터 추가
-                if tx_id not in transfers_data:
-                    transfers_data[tx_id] = {
-                        'from_address': transfer['fromAddress'].lower(),
-                        'to_address': transfer['toAddress'].lower(),
-                        'amount': int(transfer['amount']) / 10**int(transfer['decimals']),
-                        'block_number': block_number,
-                        'parent_hash': transfer['parentHash']  # parent hash도 저장
-                    }
-                    new_data_found = True
-
-            # START_BLOCK 이하의 블록을 만났다면 종료
-            if found_old_block:
-                break
-
-            page += 1
-            await asyncio.sleep(2.5)
-
-        # 새로운 데이터가 있을 때만 파일 저장
-        if new_data_found:
-            with open(TRANSFERS_JSON, 'w') as f:
-                json.dump(transfers_data, f, indent=2)
-
-        return transfers_data
-    except Exception as e:
-        print(f"Error saving transfers: {e}")
+def parse_period(arg):
+    """'30m', '24h', '7d' 같은 기간을 초로 변환. 형식이 다르면 None"""
+    unit = PERIOD_UNITS.get(arg[-1:].lower())
+    if unit is None or not arg[:-1].isdigit() or int(arg[:-1]) == 0:
         return None
-    
-async def update_rankings():
-    """전송 데이터를 분석하여 거래 유형을 추가하고 순위 업데이트"""
+    return min(int(arg[:-1]) * unit, MAX_PERIOD)
+
+def split_period(args):
+    """명령어 인자에서 기간을 꺼냄. (기간 라벨, 초, 나머지 인자)"""
+    label, rest = DEFAULT_PERIOD, []
+    for arg in args:
+        if parse_period(arg):
+            label = arg.lower()
+        else:
+            rest.append(arg)
+    return label, parse_period(label), rest
+
+async def period_blocks(campaign, seconds):
+    """최근 seconds초에 해당하는 (시작 블록, 끝 블록)
+
+    체인의 최신 블록부터 블록 시각 색인으로 환산하고, RPC를 쓸 수 없으면 마지막으로 수집된 블록에서 추정한다.
+    """
     try:
-        # 전송 데이터 파일이 없으면 빈 파일 생성
-        if not os.path.exists(TRANSFERS_JSON):
-            with open(TRANSFERS_JSON, 'w') as f:
-                json.dump({}, f)
-
-        # 순위 데이터 파일이 없으면 빈 파일 생성
-        if not os.path.exists(RANKINGS_JSON):
-            with open(RANKINGS_JSON, 'w') as f:
-                json.dump({
-                    'last_updated': datetime.now().isoformat(),
-                    'start_block': START_BLOCK,
-                    'rankings': []
-                }, f, indent=2)
-
-        # 전송 데이터 로드
-        with open(TRANSFERS_JSON, 'r') as f:
-            transfers_data = json.load(f)
-
-        # 지갑별 거래량 계산 및 거래 유형 추가
-        wallet_stats = {}
-        updated_transfers = {}
-        
-        for tx_hash, tx_data in transfers_data.items():
-            from_address = tx_data['from_address']
-            to_address = tx_data['to_address']
-            amount = tx_data['amount']
-            
-            # 거래 유형 분류 및 데이터 업데이트
-            tx_type = 'unknown'
-            if from_address in SWAP_ADDRESSES and to_address in SWAP_ADDRESSES:
-                tx_type = 'skip'
-            elif from_address in SWAP_ADDRESSES:
-                tx_type = 'buy'
-                if to_address not in wallet_stats:
-                    wallet_stats[to_address] = {'buy': 0, 'sell': 0}
-                wallet_stats[to_address]['buy'] += amount
-            elif to_address in SWAP_ADDRESSES:
-                tx_type = 'sell'
-                if from_address not in wallet_stats:
-                    wallet_stats[from_address] = {'buy': 0, 'sell': 0}
-                wallet_stats[from_address]['sell'] += amount
-
-            # 기존 데이터에 거래 유형 추가
-            updated_transfers[tx_hash] = {
-                **tx_data,  # 기존 데이터 유지
-                'transaction_type': tx_type  # 거래 유형 추가
-            }
-
-        # 업데이트된 전송 데이터 저장
-        with open(TRANSFERS_JSON, 'w') as f:
-            json.dump(updated_transfers, f, indent=2)
-
-        # 순매수량 계산 및 정렬
-        rankings = []
-        for address, stats in wallet_stats.items():
-            net_purchase = stats['buy'] - stats['sell']
-            rankings.append({
-                'address': address,
-                'net_purchase': net_purchase,
-                'buy': stats['buy'],
-                'sell': stats['sell']
-            })
-
-        rankings.sort(key=lambda x: x['net_purchase'], reverse=True)
-
-        # 순위 데이터 저장
-        ranking_data = {
-            'last_updated': datetime.now().isoformat(),
-            'start_block': START_BLOCK,
-            'rankings': rankings
-        }
-
-        with open(RANKINGS_JSON, 'w') as f:
-            json.dump(ranking_data, f, indent=2)
-
-        return rankings[:10]  # 상위 10개만 반환
-    except Exception as e:
-        print(f"Error updating rankings: {e}")
-        return None    
+        to_block = await chain_head.do('head', lambda: block_clock.update_head(kaia_rpc))
+        now = block_clock.timestamp(to_block)
+    except RpcError as e:
+        print(f"Error fetching chain head: {e}")
+        to_block = campaign.engine.last_block or campaign.start_block
+        now = block_clock.timestamp(to_block) if len(block_clock) else time.time()
+    if campaign.end_block is not None and campaign.end_block < to_block:
+        to_block = campaign.end_block
+        now = block_clock.timestamp(to_block) if len(block_clock) else now
+    from_block = block_clock.block_at(now - seconds) + 1 if len(block_clock) else to_block - int(seconds / BLOCK_TIME) + 1
+    return max(from_block, campaign.start_block), to_block
+
+def describe_blocks(from_block, to_block):
+    """블록 구간 설명. 블록 시각 색인이 있으면 UTC 시각도 함께 보여줌"""
+    if not len(block_clock):
+        return f"Blocks {from_block}-{to_block} (~{BLOCK_TIME:g}s per block)"
+    start, end = (datetime.fromtimestamp(block_clock.timestamp(block), timezone.utc)
+                  for block in (from_block, to_block))
+    return f"Blocks {from_block}-{to_block} ({start:%m-%d %H:%M} ~ {end:%m-%d %H:%M} UTC)"
+
+async def get_campaign(update, context, name):
+    """이름으로 캠페인을 찾음 (없으면 기본 캠페인). 모르는 이름이면 안내 메시지를 보내고 None"""
+    if name is None:
+        return next(iter(campaigns.values()))
+    campaign = campaigns.get(name)
+    if campaign is None:
+        outbox.submit(
+            update.effective_chat.id,
+            f"Unknown campaign. Available: {', '.join(campaigns)}",
+            parse_mode=None
+        )
+    return campaign
+
+async def wait_for_rankings(update, context, campaign):
+    """백그라운드 수집 작업이 만든 순위가 준비되었는지 확인. 아직이면 안내 메시지를 보내고 False
+
+    오래된 순위는 그대로 쓰고 갱신은 백그라운드에서 진행한다. 순위가 한 번도 만들어지지 않았을 때만 기다린다.
+    """
+    snapshot = await campaign.worker.get_snapshot()
+    if snapshot is None:
+        outbox.submit(
+            update.effective_chat.id,
+            "데이터를 수집하고 있습니다. 잠시 후 다시 시도해주세요...",
+            parse_mode='Markdown'
+        )
+        return False
+    return True
 
 async def rankings_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     try:
         chat_id = update.effective_chat.id
-        
-        # 먼저 전송 데이터 수집
-        await context.bot.send_message(
-            chat_id=chat_id,
-            text="데이터를 수집하고 있습니다. 잠시만 기다려주세요...",
+
+        # /rankings [캠페인 이름] [N] [페이지] (기본: 기본 캠페인 상위 10개)
+        name, numbers, _ = split_args(context.args or [])
+        campaign = await get_campaign(update, context, name)
+        if campaign is None:
+            return
+        limit = min(max(numbers[0], 1), MAX_RANKINGS_PAGE) if numbers else 10
+        page = max(numbers[1], 1) if len(numbers) > 1 else 1
+
+        if not await wait_for_rankings(update, context, campaign):
+            return
+
+        # 같은 순위 버전의 메시지는 한 번만 만들어 재사용. 순위표에서 필요한 구간만 잘라냄
+        start = (page - 1) * limit
+        message = render_cache.get(
+            campaign.name, campaign.engine.version, (limit, page),
+            lambda: render_rankings(campaign, campaign.engine.page(start, limit), start + 1, limit)
+        )
+
+        outbox.submit(
+            chat_id,
+            message,
+            parse_mode='Markdown'
+        )
+    except Exception as e:
+        print(f"Error in rankings_command: {e}")
+        outbox.submit(
+            chat_id,
+            "순위 정보를 가져오는 중 오류가 발생했습니다.",
             parse_mode='Markdown'
         )
         
-        transfers_data = await save_transfers()
-        if transfers_data is None:
-            await context.bot.send_message(
-                chat_id=chat_id,
-                text="데이터 수집 중 오류가 발생했습니다.",
-                parse_mode='Markdown'
+async def rank_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    try:
+        chat_id = update.effective_chat.id
+
+        # /rank <지갑 주소> [캠페인 이름]
+        name, _, addresses = split_args(context.args or [])
+        if not addresses or len(addresses[0]) != 42:
+            outbox.submit(
+                chat_id,
+                "Usage: /rank <wallet address> [campaign]",
+                parse_mode=None
             )
             return
-            
-        # 순위 업데이트
-        rankings = await update_rankings()
-        
-        if rankings is None:
-            await context.bot.send_message(
-                chat_id=chat_id,
-                text="순위 업데이트 중 오류가 발생했습니다.",
-                parse_mode='Markdown'
-            )
+        campaign = await get_campaign(update, context, name)
+        if campaign is None:
+            return
+        if not await wait_for_rankings(update, context, campaign):
             return
 
-        message = "🏆 Net Purchase Ranking (Top 10)\n\n"
-        for i, ranking in enumerate(rankings, 1):
-            message += f"{i}. `{ranking['address'][:6]}...{ranking['address'][-4:]}`: {ranking['net_purchase']:,.2f}\n"
-    
-        message += f"\n🛒 [BUY MOODENG](https://swapscanner.io/pro/swap?from=0x0000000000000000000000000000000000000000&to=0xedcad4bd04f59e8fcc7c5fc7547e5112ae9923df&chartReady=true)"
-        message += f"\n💡 Net purchase amount is calculated as the total purchase volume minus the sell volume through swaps from block {START_BLOCK}."
-        message += f"\n💡 API 네트워크 상황에 따라 정확하지 않을 수 있으니 참고만 해주세요. 최종 순위는 트랜잭션 추가 검토 후 정확하게 집계하겠습니다."
-        message += f"\n💡 Please note that it may not be accurate depending on the API network situation. The final ranking will be accurately tallied after additional transaction review."
-        
-        await context.bot.send_message(
-            chat_id=chat_id,
-            text=message,
+        # 지갑 -> 순위 색인에서 바로 조회 (전체 순위를 훑거나 다시 정렬하지 않음)
+        address = addresses[0]
+        message = render_cache.get(
+            campaign.name, campaign.engine.version, ('rank', address),
+            lambda: render_rank(campaign, address, campaign.engine.rank(address))
+        )
+        outbox.submit(
+            chat_id,
+            message,
             parse_mode='Markdown'
         )
     except Exception as e:
-        print(f"Error in rankings_command: {e}")
-        await context.bot.send_message(
-            chat_id=chat_id,
-            text="순위 정보를 가져오는 중 오류가 발생했습니다.",
+        print(f"Error in rank_command: {e}")
+        outbox.submit(
+            chat_id,
+            "순위 정보를 가져오는 중 오류가 발생했습니다.",
             parse_mode='Markdown'
         )
-        
-def get_moodeng_price():
-    url = "https://api.swapscanner.io/v1/tokens/prices"
-    moodeng_address = "0xedcad4bd04f59e8fcc7c5fc7547e5112ae9923df"
-    kaia_address = "0x0000000000000000000000000000000000000000"
-    
+
+async def volume_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     try:
-        response = requests.get(url)
-        response.raise_for_status()
-        data = response.json()
+        chat_id = update.effective_chat.id
+
+        # /volume [기간] [캠페인 이름] (기본: 최근 24시간)
+        label, seconds, args = split_period(context.args or [])
+        name, _, _ = split_args(args)
+        campaign = await get_campaign(update, context, name)
+        if campaign is None:
+            return
+        if not await wait_for_rankings(update, context, campaign):
+            return
+
+        # 블록 구간별 집계만 합쳐서 만듦 (전송 데이터를 다시 훑지 않음)
+        from_block, to_block = await period_blocks(campaign, seconds)
+        message = render_cache.get(
+            campaign.name, campaign.engine.version, ('volume', label, from_block, to_block),
+            lambda: render_volume(campaign, label, from_block, to_block)
+        )
+        outbox.submit(
+            chat_id,
+            message,
+            parse_mode='Markdown'
+        )
+    except Exception as e:
+        print(f"Error in volume_command: {e}")
+        outbox.submit(
+            chat_id,
+            "거래량 정보를 가져오는 중 오류가 발생했습니다.",
+            parse_mode='Markdown'
+        )
+
+async def flows_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    try:
+        chat_id = update.effective_chat.id
+
+        # /flows [기간] [캠페인 이름] (기본: 최근 24시간)
+        label, seconds, args = split_period(context.args or [])
+        name, _, _ = split_args(args)
+        campaign = await get_campaign(update, context, name)
+        if campaign is None:
+            return
+        if not await wait_for_rankings(update, context, campaign):
+            return
+
+        from_block, to_block = await period_blocks(campaign, seconds)
+        message = render_cache.get(
+            campaign.name, campaign.engine.version, ('flows', label, from_block, to_block),
+            lambda: render_flows(campaign, label, from_block, to_block)
+        )
+        outbox.submit(
+            chat_id,
+            message,
+            parse_mode='Markdown'
+        )
+    except Exception as e:
+        print(f"Error in flows_command: {e}")
+        outbox.submit(
+            chat_id,
+            "거래 흐름 정보를 가져오는 중 오류가 발생했습니다.",
+            parse_mode='Markdown'
+        )
+
+def render_volume(campaign, label, from_block, to_block):
+    """기간 매수/매도량과 매수 지갑 수, 하루 이하 기간은 시간별 거래량도 함께 보여줌"""
+    rollups = campaign.engine.rollups
+    summary = rollups.summary(from_block, to_block)
+    lines = [
+        f"📊 {campaign.title} Volume ({label})",
+        "",
+        f"🟢 Buy: {summary['buy']:,.2f} ({summary['buys']} trades)",
+        f"🔴 Sell: {summary['sell']:,.2f} ({summary['sells']} trades)",
+        f"💰 Net: {summary['net']:,.2f}",
+        f"👛 Unique buyers: {summary['buyers']}"
+    ]
+    hour_blocks = int(3600 / BLOCK_TIME)
+    if len(block_clock):
+        hour_blocks = max(to_block - block_clock.block_at(block_clock.timestamp(to_block) - 3600), 1)
+    if to_block - from_block < 24 * hour_blocks and summary['buys'] + summary['sells']:
+        lines += ["", "Hourly:"]
+        for block, buy, sell in rollups.series(from_block, to_block, hour_blocks):
+            hours_ago = (to_block - block) // hour_blocks + 1
+            lines.append(f"`-{hours_ago}h` 🟢 {format_market_cap(buy)} 🔴 {format_market_cap(sell)}")
+    lines += ["", f"💡 {describe_blocks(from_block, to_block)}."]
+    return "\n".join(lines)
+
+def render_flows(campaign, label, from_block, to_block):
+    """기간 동안 스왑 주소(라우터/풀)별 매수/매도량"""
+    flows = campaign.engine.rollups.flows(from_block, to_block)
+    if not flows:
+        return f"{campaign.title}: no swaps in the last {label}."
+    lines = [f"🔀 {campaign.title} Swap Flows ({label})", ""]
+    for address, buy, sell in flows[:10]:
+        short_address = f"{address[:6]}...{address[-4:]}"
+        router = campaign.router_registry.label(address)
+        name = short_address if router == address else f"{router} {short_address}"
+        lines.append(f"`{name}`: 🟢 {format_market_cap(buy)} 🔴 {format_market_cap(sell)} 💰 {buy - sell:,.2f}")
+    lines += ["", f"💡 {describe_blocks(from_block, to_block)}."]
+    return "\n".join(lines)
+
+def render_rank(campaign, address, result):
+    """지갑 하나의 순위와 매수/매도/순매수량 메시지를 만듦"""
+    if result is None:
+        return (f"`{address}`\n"
+                f"{campaign.title} 이벤트 기간에 스왑 매수/매도 기록이 없습니다.\n"
+                f"No swap purchases or sales found in the {campaign.title} event.")
+    position, entry = result
+    return "\n".join([
+        f"🏆 {campaign.title} Net Purchase Rank",
+        "",
+        f"`{address}`",
+        f"🏅 Rank: #{position} / {campaign.engine.participants()}",
+        f"🟢 Buy: {entry['buy']:,.2f}",
+        f"🔴 Sell: {entry['sell']:,.2f}",
+        f"💰 Net: {entry['net_purchase']:,.2f}"
+    ])
+
+def render_rankings(campaign, rankings, first_rank=1, limit=10):
+    """순위 목록으로 /rankings 메시지를 만듦. first_rank는 목록 첫 항목의 순위"""
+    if first_rank == 1:
+        title = f"🏆 {campaign.title} Net Purchase Ranking (Top {limit})"
+    else:
+        title = f"🏆 {campaign.title} Net Purchase Ranking (#{first_rank}-{first_rank + limit - 1})"
+    if not rankings and first_rank > 1:
+        return f"{campaign.title} ranking has only {campaign.engine.participants()} wallets."
+    lines = [title, ""]
+    for i, ranking in enumerate(rankings, first_rank):
+        lines.append(f"{i}. `{ranking['address'][:6]}...{ranking['address'][-4:]}`: {ranking['net_purchase']:,.2f}")
+    lines.append("")
+
+    if campaign.buy_url:
+        lines.append(f"🛒 [BUY {campaign.title}]({campaign.buy_url})")
+    if campaign.end_block is None:
+        lines.append(f"💡 Net purchase amount is calculated as the total purchase volume minus the sell volume through swaps from block {campaign.start_block}.")
+    else:
+        lines.append(f"💡 Net purchase amount is calculated as the total purchase volume minus the sell volume through swaps from block {campaign.start_block} to {campaign.end_block}.")
+    lines.append("💡 API 네트워크 상황에 따라 정확하지 않을 수 있으니 참고만 해주세요. 최종 순위는 트랜잭션 추가 검토 후 정확하게 집계하겠습니다.")
+    lines.append("💡 Please note that it may not be accurate depending on the API network situation. The final ranking will be accurately tallied after additional transaction review.")
+    return "\n".join(lines)
+
+async def get_moodeng_price():
+    try:
+        data = await price_service.get_prices()
+    except PriceError as e:
+        return f"가격 정보를 가져오는 데 실패했습니다: {str(e)}"
+
+    # 가격 데이터가 새로 받아졌을 때만 메시지를 다시 만듦
+    return render_cache.get('price', price_service.fetched_at, MOODENG_ADDRESS, lambda: render_price(data))
+
+def render_price(data):
+    moodeng_address = MOODENG_ADDRESS
+    kaia_address = "0x0000000000000000000000000000000000000000"
+
+    if moodeng_address in data:
+        md_price = float(data[moodeng_address])
+        kaia_price = float(data[kaia_address])
+        md_kaia_price = md_price/kaia_price
+        market_cap = md_price * 1_000_000_000
+        formatted_market_cap = format_market_cap(market_cap)
         
-        if moodeng_address in data:
-            md_price = float(data[moodeng_address])
-            kaia_price = float(data[kaia_address])
-            md_kaia_price = md_price/kaia_price
-            market_cap = md_price * 1_000_000_000
-            formatted_market_cap = format_market_cap(market_cap)
-            
-            message = f"""
+        message = f"""
 [MOODENG](https://moodengkaia.com)
 [CA](https://kaiascope.com/token/{moodeng_address}) : `{moodeng_address}`
 💵 Price: ${md_price:.8f}
@@ -318,11 +526,9 @@ def get_moodeng_price():
 📊 MOODENG/KAIA: {md_kaia_price:.8f}
 🛒 [BUY MOODENG](https://swapscanner.io/pro/swap?from=0x0000000000000000000000000000000000000000&to=0xedcad4bd04f59e8fcc7c5fc7547e5112ae9923df&chartReady=true)
 """
-            return message
-        else:
-            return "MOODENG 가격 정보를 찾을 수 없습니다."
-    except requests.RequestException as e:
-        return f"가격 정보를 가져오는 데 실패했습니다: {str(e)}"
+        return message
+    else:
+        return "MOODENG 가격 정보를 찾을 수 없습니다."
 
 def format_market_cap(value):
     if value >= 1_000_000:
@@ -333,22 +539,83 @@ def format_market_cap(value):
         return f"{value:.2f}"
 
 async def proc_price(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    price_message = get_moodeng_price()
-    await context.bot.send_message(
-        chat_id=update.effective_chat.id,
-        text=price_message,
+    price_message = await get_moodeng_price()
+    outbox.submit(
+        update.effective_chat.id,
+        price_message,
         parse_mode='Markdown'
     )
 
+async def index_block_times():
+    """캠페인 구간에 하루(86400블록)마다 블록 시각 기준점을 채우고 저장 (이미 있는 곳은 조회하지 않음)"""
+    try:
+        head = await block_clock.update_head(kaia_rpc)
+        for campaign in campaigns.values():
+            await block_clock.ensure(kaia_rpc, campaign.start_block, campaign.end_block or head, spacing=86400)
+    except RpcError as e:
+        print(f"Error indexing block times: {e}")
+    block_clock.save()
+
+def wait_for_shutdown():
+    """SIGINT/SIGTERM을 받으면 완료되는 이벤트 (신호 처리를 지원하지 않는 환경에서는 Ctrl+C로 종료)"""
+    stop_event = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(sig, stop_event.set)
+        except (NotImplementedError, RuntimeError):
+            pass
+    return stop_event
+
 async def main():
-    moodeng_kaia_bot = TelegramBot("kaia_bot", token, chat_id)
+    # 캠페인 설정을 읽어 스토어를 엶. 순위 엔진은 첫 수집 작업이 작업 스레드에서 복원
+    # 캠페인 구간은 블록(start_block/end_block) 대신 시각(start_time/end_time)으로도 설정 가능
+    campaigns.update(await load_campaigns(
+        CAMPAIGNS_JSON, http_client, bucket=api_bucket,
+        clock=block_clock, rpc_url=KAIA_RPC_URL,
+        concurrency=FETCH_CONCURRENCY,
+        interval=INGESTION_INTERVAL,
+        fresh_for=RANKINGS_FRESHNESS,
+        snapshot_interval=SNAPSHOT_INTERVAL
+    ))
+
+    # 모든 캠페인의 새 전송 데이터 수집과 순위 갱신을 하나의 백그라운드 작업에서 실행
+    ingestion_scheduler = IngestionScheduler(
+        [campaign.worker for campaign in campaigns.values()],
+        interval=INGESTION_INTERVAL
+    )
+
+    request = FakeTelegram() if FAKE_TELEGRAM else None
+    bot_token = token or ('123456:FAKE' if FAKE_TELEGRAM else None)
+    moodeng_kaia_bot = TelegramBot("kaia_bot", bot_token, chat_id, http=http_client, outbox=outbox, request=request)
+    if WEBHOOK_URL:
+        moodeng_kaia_bot.use_webhook(
+            WEBHOOK_URL, secret_token=WEBHOOK_SECRET, host=WEBHOOK_HOST, port=WEBHOOK_PORT,
+            max_connections=WEBHOOK_MAX_CONNECTIONS
+        )
     moodeng_kaia_bot.add_handler("price", proc_price)
     moodeng_kaia_bot.add_handler("rankings", rankings_command)
+    moodeng_kaia_bot.add_handler("rank", rank_command)
+    moodeng_kaia_bot.add_handler("volume", volume_command)
+    moodeng_kaia_bot.add_handler("flows", flows_command)
 
+    metrics_server = MetricsServer(port=METRICS_PORT)
+    await metrics_server.start()
     await moodeng_kaia_bot.start()
+    ingestion_scheduler.start()
+    # 기준점 채우기는 RPC 요청이 많아 백그라운드에서 실행 (그동안 /volume은 평균 블록 시간으로 추정)
+    indexing = asyncio.create_task(index_block_times())
 
-    while True:
-        await asyncio.sleep(1)
+    try:
+        await wait_for_shutdown().wait()
+    finally:
+        indexing.cancel()
+        await ingestion_scheduler.stop()
+        for campaign in campaigns.values():
+            campaign.close()
+        block_clock.save()
+        await metrics_server.stop()
+        await moodeng_kaia_bot.stop()
 
 if __name__ == '__main__':
     asyncio.run(main())
\ No newline at end of file
@@ -0,0 +1,52 @@
+class PageLocator:
+    """블록 넘버가 위치한 페이지를 갤럽(1, 2, 4, 8...) + 이분 탐색으로 찾음
+
+    API 페이지는 최신 블록부터 내림차순이고, 새 전송이 생길수록 기존 전송은 뒤 페이지로 밀린다.
+    그래서 예전에 본 페이지별 블록 범위(ranges)는 "그 페이지의 마지막 블록이 이보다 크다"는
+    방향으로만 계속 참이고, 오래된 범위를 쓰면 실제보다 앞 페이지를 고르게 될 뿐 전송을 놓치지 않는다.
+    탐색하며 받은 페이지 내용은 fetcher.cache에 넣어두어 이후 수집에서 다시 요청하지 않는다.
+    """
+
+    def __init__(self, fetcher):
+        self.fetcher = fetcher
+        # 페이지 -> (첫 블록, 마지막 블록). 빈 페이지는 None
+        self.ranges = {}
+        self.probes = 0
+
+    async def probe(self, page):
+        """페이지의 (첫 블록, 마지막 블록). 이미 알고 있으면 요청하지 않음"""
+        if page in self.ranges:
+            return self.ranges[page]
+        if page in self.fetcher.cache:
+            transfers = self.fetcher.cache[page]
+        else:
+            self.probes += 1
+            transfers = await self.fetcher.fetch(page)
+            self.fetcher.cache[page] = transfers
+        if transfers:
+            self.ranges[page] = (int(transfers[0]['blockNumber']), int(transfers[-1]['blockNumber']))
+        else:
+            self.ranges[page] = None
+        return self.ranges[page]
+
+    async def _reaches(self, page, block):
+        """page에 block 이하의 블록이 있거나 page가 비어 있으면 True"""
+        block_range = await self.probe(page)
+        return block_range is None or block_range[1] <= block
+
+    async def find_page(self, block):
+        """block 이하 블록이 처음 나타나는 페이지. 그 앞 페이지들은 모두 block보다 새로운 블록만 있음"""
+        low, high = 0, 1  # low: block보다 새로운 블록만 있는 페이지 (0은 가상의 페이지)
+        while not await self._reaches(high, block):
+            low, high = high, high * 2
+        while high - low > 1:
+            mid = (low + high) // 2
+            if await self._reaches(mid, block):
+                high = mid
+            else:
+                low = mid
+        return high
+
+    def clear_pages(self):
+        """수집이 끝난 뒤 남은 페이지 내용 정리 (블록 범위는 다음 탐색의 힌트로 유지)"""
+        self.fetcher.cache.clear()
@@ -0,0 +1,88 @@
+import asyncio
+import time
+
+
+class PriceError(Exception):
+    """가격 API 요청 실패"""
+
+
+class PriceService:
+    """가격 API 응답을 짧게 캐시하고, 동시에 들어온 요청은 업스트림 요청 하나로 합침
+
+    - ttl 이내: 캐시된 가격을 그대로 반환
+    - stale_ttl 이내: 캐시된 가격을 반환하면서 백그라운드에서 갱신 (stale-while-revalidate)
+    - 그 외: 갱신이 끝날 때까지 대기 (진행 중인 요청이 있으면 그 결과를 공유)
+    """
+
+    def __init__(self, http, url, ttl=10, stale_ttl=60):
+        self.http = http
+        self.url = url
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.prices = None
+        self.fetched_at = None
+        self._refresh_task = None
+        self.stats = {
+            'hits': 0,
+            'stale_hits': 0,
+            'misses': 0,
+            'coalesced': 0,
+            'upstream_requests': 0,
+            'upstream_errors': 0,
+            'upstream_latency_total': 0.0,
+            'upstream_latency_last': 0.0
+        }
+
+    async def _fetch(self):
+        self.stats['upstream_requests'] += 1
+        started = time.monotonic()
+        try:
+            status, data = await self.http.get_json(self.url)
+        finally:
+            latency = time.monotonic() - started
+            self.stats['upstream_latency_total'] += latency
+            self.stats['upstream_latency_last'] = latency
+        if status != 200 or data is None:
+            self.stats['upstream_errors'] += 1
+            raise PriceError(f"HTTP {status}")
+        self.prices = data
+        self.fetched_at = time.monotonic()
+        return data
+
+    def _refresh(self):
+        """진행 중인 갱신이 있으면 그 작업을, 없으면 새 작업을 반환 (single-flight)"""
+        if self._refresh_task is None or self._refresh_task.done():
+            self._refresh_task = asyncio.ensure_future(self._fetch())
+            # 백그라운드 갱신의 예외가 처리되지 않은 채 남지 않도록 회수
+            self._refresh_task.add_done_callback(lambda t: t.cancelled() or t.exception())
+        return self._refresh_task
+
+    async def get_prices(self):
+        age = None if self.fetched_at is None else time.monotonic() - self.fetched_at
+        if age is not None and age < self.ttl:
+            self.stats['hits'] += 1
+            return self.prices
+        if age is not None and age < self.stale_ttl:
+            self.stats['stale_hits'] += 1
+            self._refresh()
+            return self.prices
+
+        self.stats['misses'] += 1
+        if self._refresh_task is not None and not self._refresh_task.done():
+            self.stats['coalesced'] += 1
+        try:
+            return await asyncio.shield(self._refresh())
+        except PriceError:
+            # 갱신에 실패해도 이전 가격이 있으면 그대로 사용
+            if self.prices is not None:
+                return self.prices
+            raise
+
+    def metrics(self):
+        """캐시 적중률과 업스트림 평균 지연 시간을 포함한 통계"""
+        stats = dict(self.stats)
+        lookups = stats['hits'] + stats['stale_hits'] + stats['misses']
+        stats['hit_rate'] = (stats['hits'] + stats['stale_hits']) / lookups if lookups else 0.0
+        requests = stats['upstream_requests']
+        stats['upstream_latency_avg'] = stats['upstream_latency_total'] / requests if requests else 0.0
+        return stats
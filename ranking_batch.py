@@ -0,0 +1,168 @@
+try:
+    import numpy as np
+except ImportError:  # numpy가 없으면 RankingEngine은 트랜잭션 단위 루프만 사용
+    np = None
+
+from transfer_table import HASH_SIZE, TYPE_CODES
+from tx_flows import TOLERANCE
+
+UNKNOWN, BUY, SELL, SKIP = (TYPE_CODES[name] for name in ('unknown', 'buy', 'sell', 'skip'))
+
+
+def _column(values, dtype):
+    return np.frombuffer(values, dtype=dtype) if len(values) else np.zeros(0, dtype=dtype)
+
+
+def _first_max(group, values, order):
+    """group별로 values가 가장 큰 원소의 인덱스 (같으면 order가 작은 것). 반환: (group 목록, 인덱스 목록)"""
+    if not len(group):
+        return group, group
+    best = np.lexsort((order, -values, group))
+    first = np.ones(len(best), dtype=bool)
+    first[1:] = group[best][1:] != group[best][:-1]
+    return group[best][first], best[first]
+
+
+def reconstruct_table(table, swap_addresses):
+    """tx_flows.reconstruct()를 테이블 전체 트랜잭션에 벡터 연산으로 적용
+
+    트랜잭션은 parent hash로 묶고, 스왑 주소가 아닌 지갑별 순유입량(받은 양 - 보낸 양)으로 거래를 만든다.
+    반환: (거래 배열 딕셔너리, 행별 거래 유형 코드). 거래 배열은 트랜잭션의 첫 행 순서로 정렬되어 있으며
+    wallet/side/amount/router(지갑 id)/row(트랜잭션의 첫 행) 열을 가진다.
+    합계는 행 순서대로 더해지므로 트랜잭션 단위 루프와 같은 부동소수점 결과가 나온다.
+    """
+    n_rows = len(table)
+    n_wallets = max(len(table.wallets), 1)
+    amount = _column(table.amount, np.float64)
+    from_id = _column(table.from_id, np.uint32).astype(np.int64)
+    to_id = _column(table.to_id, np.uint32).astype(np.int64)
+    rows = np.arange(n_rows, dtype=np.int64)
+
+    # 트랜잭션 id (parent hash별)와 트랜잭션의 첫 행
+    hashes = _column(bytes(table.parent_hash), f'V{HASH_SIZE}')
+    _, tx_first, tx = np.unique(hashes, return_index=True, return_inverse=True)
+    tx = tx.reshape(-1)
+
+    is_swap = np.zeros(n_wallets, dtype=bool)
+    swap_ids = [table.wallets.get(address) for address in swap_addresses]
+    is_swap[[wallet_id for wallet_id in swap_ids if wallet_id is not None]] = True
+    from_swap = is_swap[from_id]
+    to_swap = is_swap[to_id]
+    has_swap = np.zeros(len(tx_first), dtype=bool)
+    has_swap[tx[from_swap | to_swap]] = True
+
+    # (트랜잭션, 지갑)별 받은 양과 보낸 양. 지갑 순서는 트랜잭션 안에서 처음 나온 순서 (보낸 쪽이 먼저)
+    sender = ~from_swap
+    receiver = ~to_swap
+    n_sent = int(sender.sum())
+    entry_keys = np.concatenate((tx[sender] * n_wallets + from_id[sender], tx[receiver] * n_wallets + to_id[receiver]))
+    entry_order = np.concatenate((rows[sender] * 2, rows[receiver] * 2 + 1))
+    keys, inverse = np.unique(entry_keys, return_inverse=True)
+    inverse = inverse.reshape(-1)
+    outflow = np.bincount(inverse[:n_sent], weights=amount[sender], minlength=len(keys))
+    inflow = np.bincount(inverse[n_sent:], weights=amount[receiver], minlength=len(keys))
+    key_order = np.full(len(keys), 2 * n_rows, dtype=np.int64)
+    np.minimum.at(key_order, inverse, entry_order)
+
+    key_tx = keys // n_wallets
+    net = inflow - outflow
+    traded = has_swap[key_tx] & (np.abs(net) > TOLERANCE * np.maximum(inflow, outflow))
+    side = np.zeros(len(keys), dtype=np.int8)
+    side[traded] = np.where(net[traded] > 0, BUY, SELL)
+
+    # 트랜잭션별 스왑 주소: 매수는 외부 지갑으로 가장 많이 내보낸, 매도는 가장 많이 받은 주소 (같으면 먼저 나온 주소)
+    fallback = np.full(len(tx_first), -1, dtype=np.int64)
+    first_swap_row = np.full(len(tx_first), n_rows, dtype=np.int64)
+    swap_rows = rows[from_swap | to_swap]
+    np.minimum.at(first_swap_row, tx[swap_rows], swap_rows)
+    found = first_swap_row < n_rows
+    found_rows = first_swap_row[found]
+    fallback[found] = np.where(from_swap[found_rows], from_id[found_rows], to_id[found_rows])
+
+    def routers(mask, router_id):
+        router = fallback.copy()
+        flow_keys, flow_inverse = np.unique(tx[mask] * n_wallets + router_id[mask], return_inverse=True)
+        flow_inverse = flow_inverse.reshape(-1)
+        totals = np.bincount(flow_inverse, weights=amount[mask], minlength=len(flow_keys))
+        first = np.full(len(flow_keys), n_rows, dtype=np.int64)
+        np.minimum.at(first, flow_inverse, rows[mask])
+        flow_tx, best = _first_max(flow_keys // n_wallets, totals, first)
+        router[flow_tx] = flow_keys[best] % n_wallets
+        return router
+
+    buy_router = routers(from_swap & ~to_swap, from_id)
+    sell_router = routers(to_swap & ~from_swap, to_id)
+
+    # 거래 목록: 트랜잭션의 첫 행 순서, 트랜잭션 안에서는 지갑이 처음 나온 순서
+    trade_keys = np.flatnonzero(traded)
+    trade_keys = trade_keys[np.lexsort((key_order[trade_keys], tx_first[key_tx[trade_keys]]))]
+    trade_tx = key_tx[trade_keys]
+    trade_side = side[trade_keys]
+    trades = {
+        'wallet': keys[trade_keys] % n_wallets,
+        'side': trade_side,
+        'amount': np.abs(net[trade_keys]),
+        'router': np.where(trade_side == BUY, buy_router[trade_tx], sell_router[trade_tx]),
+        'row': tx_first[trade_tx]
+    }
+
+    # 행별 유형: 받은 지갑이 매수했으면 buy, 보낸 지갑이 매도했으면 sell, 스왑 트랜잭션의 나머지는 skip
+    codes = np.where(has_swap[tx], SKIP, UNKNOWN).astype(np.int8)
+    to_side = np.zeros(n_rows, dtype=np.int8)
+    to_side[receiver] = side[inverse[n_sent:]]
+    from_side = np.zeros(n_rows, dtype=np.int8)
+    from_side[sender] = side[inverse[:n_sent]]
+    both = from_swap & to_swap
+    codes[~both & (to_side == BUY)] = BUY
+    codes[~both & (to_side != BUY) & (from_side == SELL)] = SELL
+    return trades, codes
+
+
+def aggregate_wallets(table, trades):
+    """지갑별 매수/매도 합계, 거래 수, 처음 거래한 트랜잭션의 첫 행. 합계는 트랜잭션 순서대로 더해짐"""
+    n_wallets = len(table.wallets)
+    wallet = trades['wallet']
+    buy = trades['side'] == BUY
+    sell = ~buy
+    buy_total = np.bincount(wallet[buy], weights=trades['amount'][buy], minlength=n_wallets)
+    sell_total = np.bincount(wallet[sell], weights=trades['amount'][sell], minlength=n_wallets)
+    buy_count = np.bincount(wallet[buy], minlength=n_wallets)
+    sell_count = np.bincount(wallet[sell], minlength=n_wallets)
+    first_row = np.full(n_wallets, len(table), dtype=np.int64)
+    np.minimum.at(first_row, wallet, trades['row'])
+    return buy_total, sell_total, buy_count, sell_count, first_row
+
+
+def rank_order(net, first_row, wallet_ids, address_rank, top_n=None):
+    """순매수량 내림차순, 같으면 먼저 거래한 지갑, 그다음 주소 순. top_n이 있으면 argpartition으로 후보를 줄임"""
+    if top_n is not None and top_n < len(wallet_ids):
+        if top_n <= 0:
+            return wallet_ids[:0]
+        negated = -net[wallet_ids]
+        kth = negated[np.argpartition(negated, top_n - 1)[top_n - 1]]
+        wallet_ids = wallet_ids[negated <= kth]
+    order = np.lexsort((address_rank[wallet_ids], first_row[wallet_ids], -net[wallet_ids]))
+    return wallet_ids[order][:top_n]
+
+
+def compute_rankings(table, swap_addresses, top_n=None):
+    """RankingEngine과 같은 (트랜잭션 단위) 순위 목록을 벡터 연산으로 계산"""
+    trades, _ = reconstruct_table(table, swap_addresses)
+    buy_total, sell_total, buy_count, sell_count, first_row = aggregate_wallets(table, trades)
+    net = buy_total - sell_total
+    participants = np.flatnonzero((buy_count > 0) | (sell_count > 0))
+    addresses = table.wallets.addresses
+    address_rank = np.empty(len(addresses), dtype=np.int64)
+    address_rank[sorted(range(len(addresses)), key=addresses.__getitem__)] = np.arange(len(addresses))
+
+    rankings = []
+    for wallet_id in rank_order(net, first_row, participants, address_rank, top_n):
+        buy = float(buy_total[wallet_id]) if buy_count[wallet_id] else 0
+        sell = float(sell_total[wallet_id]) if sell_count[wallet_id] else 0
+        rankings.append({
+            'address': addresses[wallet_id],
+            'net_purchase': buy - sell,
+            'buy': buy,
+            'sell': sell
+        })
+    return rankings
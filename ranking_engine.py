@@ -0,0 +1,425 @@
+from array import array
+from bisect import bisect_right
+from sortedcontainers import SortedList
+from atomic_io import atomic_write_json, read_json
+from transfer_table import TransferTable, HASH_SIZE, TYPE_NAMES
+from rollups import VolumeRollups
+from tx_flows import group_transactions, reconstruct
+from ranking_batch import np, BUY, reconstruct_table, aggregate_wallets
+
+# 집계 방식. 스냅샷에 기록해 방식이 다른 예전 스냅샷(행 단위 분류)은 쓰지 않음
+GROUPING = 'transaction'
+
+# 마지막으로 추가된 이 행 수 안에 전송이 들어온 트랜잭션은 아직 열린 것으로 보고,
+# 같은 parent hash의 전송이 나중에 더 들어오면 다시 묶어서 집계 (블록 순서와 상관없이 도착 순서 기준.
+# 최신순 백필이 여러 번에 나눠 반영될 때 경계에 걸린 트랜잭션도 포함)
+RECENT_ROWS = 20000
+
+
+class RankingEngine:
+    """지갑별 매수/매도 누적값을 유지하며 새 전송 데이터만 반영하는 순위 엔진
+
+    같은 parent hash의 전송을 하나의 트랜잭션으로 묶고, 스왑 주소가 아닌 지갑별 순유입량으로
+    매수/매도를 계산한다 (tx_flows 참고). 트랜잭션은 추가된 순서(첫 전송의 seq)대로 반영한다.
+    """
+
+    def __init__(self, swap_addresses, start_block):
+        self.swap_addresses = frozenset(swap_addresses)
+        self.start_block = start_block
+        self.wallet_stats = {}
+        # 마지막으로 반영한 전송 데이터 위치 (블록 넘버, 스토어 seq)
+        self.last_block = None
+        self.last_seq = 0
+        # 마지막으로 되돌린 스토어 삭제 기록 id
+        self.last_removal = 0
+        # 순위가 바뀔 때마다 증가
+        self.version = 0
+        # (-순매수량, 처음 집계된 트랜잭션의 첫 전송 seq, 주소) 순으로 정렬된 순위표
+        self._leaderboard = SortedList()
+        self._keys = {}
+        # 반영한 전송 데이터 이력 (열 단위 메모리 테이블)
+        self.table = TransferTable()
+        # 블록 구간별 거래량 집계 (순위와 같은 트랜잭션 단위 거래로 함께 갱신)
+        self.rollups = VolumeRollups()
+        # 열린 트랜잭션: parent hash -> (블록, 반영한 전송 seq 목록)
+        self._recent = {}
+
+    def _update_wallet(self, address, seq, buy=0, sell=0):
+        stats = self.wallet_stats.get(address)
+        if stats is None:
+            stats = self.wallet_stats[address] = {'buy': 0, 'sell': 0, 'order': seq}
+        else:
+            self._leaderboard.remove(self._keys[address])
+        stats['buy'] += buy
+        stats['sell'] += sell
+        key = (-(stats['buy'] - stats['sell']), stats['order'], address)
+        self._keys[address] = key
+        self._leaderboard.add(key)
+
+    def _roll(self, block, trades, sign=1):
+        for wallet, side, amount, router in trades:
+            self.rollups.add(block, side, wallet, router, amount, sign)
+
+    def _forget_old(self, keep=()):
+        """마지막 전송이 RECENT_ROWS보다 오래전에 들어온 트랜잭션은 닫음 (keep에 있는 트랜잭션 제외)"""
+        horizon = self.last_seq - RECENT_ROWS
+        self._recent = {
+            parent_hash: entry for parent_hash, entry in self._recent.items()
+            if entry[1] and entry[1][-1] > horizon or parent_hash in keep
+        }
+
+    def _set_types(self, rows, types, changes):
+        """이력 테이블의 거래 유형과 다른 행을 테이블에 반영하고 changes에 기록
+
+        changes: seq -> (스토어에 저장된 유형, (parent_hash, from, to, log_index, 새 유형)).
+        한 번의 갱신 안에서 유형이 바뀌었다가 되돌아온 행(다시 묶인 트랜잭션)은 _changed()에서 빠진다.
+        """
+        for row, tx_type in zip(rows, types):
+            if row['transaction_type'] != tx_type:
+                self.table.set_type(self.table.row_of(row['seq']), tx_type)
+                stored = changes[row['seq']][0] if row['seq'] in changes else row['transaction_type']
+                changes[row['seq']] = (stored, (
+                    row['parent_hash'], row['from_address'], row['to_address'], row.get('log_index') or 0, tx_type
+                ))
+
+    @staticmethod
+    def _changed(changes):
+        """스토어에 저장된 유형과 달라진 행의 (parent_hash, from_address, to_address, log_index, transaction_type) 목록"""
+        return [entry for stored, entry in changes.values() if entry[4] != stored]
+
+    def _append(self, transfers):
+        """high-water mark 이후의 전송 데이터를 이력 테이블에 추가하면서 그대로 넘김"""
+        for tx_data in transfers:
+            if tx_data['seq'] <= self.last_seq:
+                continue
+            self.table.append(tx_data)
+            self.last_seq = tx_data['seq']
+            if self.last_block is None or tx_data['block_number'] > self.last_block:
+                self.last_block = tx_data['block_number']
+            yield tx_data
+
+    def apply(self, transfers, bulk=False):
+        """high-water mark 이후의 전송 데이터만 트랜잭션별로 묶어 반영. 거래 유형이 바뀐 행 목록을 반환
+
+        bulk가 True이면 (빈 엔진에 전체 이력을 넣을 때) 지갑 통계를 모두 더한 뒤 순위표를 한 번에 만든다.
+        """
+        changes = {}
+        regroup = {}  # 이전 호출에서 반영한 트랜잭션에 전송이 더 들어온 경우: parent hash -> 이전 seq 목록
+        applied = len(self.table)
+        swap_addresses = self.swap_addresses
+        wallet_stats = self.wallet_stats
+        rollups = self.rollups
+        for rows in group_transactions(self._append(transfers)):
+            first = rows[0]
+            parent_hash = first['parent_hash']
+            block = first['block_number']
+            recent = self._recent.get(parent_hash)
+            if recent is not None:
+                regroup.setdefault(parent_hash, recent[1])
+                self._recent[parent_hash] = (recent[0], recent[1] + [row['seq'] for row in rows])
+                continue
+
+            trades, types = reconstruct(rows, swap_addresses)
+            for wallet, side, amount, router in trades:
+                if bulk:
+                    stats = wallet_stats.get(wallet)
+                    if stats is None:
+                        stats = wallet_stats[wallet] = {'buy': 0, 'sell': 0, 'order': first['seq']}
+                    stats[side] += amount
+                else:
+                    self._update_wallet(wallet, first['seq'], **{side: amount})
+                rollups.add(block, side, wallet, router, amount)
+            self._set_types(rows, types, changes)
+            self._recent[parent_hash] = (block, [row['seq'] for row in rows])
+            if len(self._recent) > 2 * RECENT_ROWS:
+                self._forget_old(keep=regroup)
+
+        if bulk:
+            for address, stats in self.wallet_stats.items():
+                self._keys[address] = (-(stats['buy'] - stats['sell']), stats['order'], address)
+            self._leaderboard.update(self._keys.values())
+        if regroup:
+            self._regroup(regroup, changes)
+        if len(self.table) != applied:
+            self._forget_old()
+            self.version += 1
+        return self._changed(changes)
+
+    def apply_bulk(self, transfers):
+        """빈 엔진에 전체 이력을 numpy 벡터 연산으로 한 번에 반영. 결과는 apply()와 같음
+
+        전체 이력을 테이블에 넣은 뒤 트랜잭션별 순유입량을 한 번에 계산하고 순위표도 한 번에 만든다.
+        numpy가 없으면 트랜잭션 단위 루프로 더한 뒤 순위표만 한 번에 만들고,
+        이미 반영된 데이터가 있으면 apply()로 처리한다.
+        """
+        if self.last_seq or len(self.table):
+            return self.apply(transfers)
+        if np is None:
+            return self.apply(transfers, bulk=True)
+
+        for _ in self._append(transfers):
+            pass
+        if not len(self.table):
+            return []
+        table = self.table
+        addresses = table.wallets.addresses
+        trades, codes = reconstruct_table(table, self.swap_addresses)
+        buy_total, sell_total, buy_count, sell_count, first_row = aggregate_wallets(table, trades)
+
+        # 처음 거래한 순서대로 지갑 통계 생성 (동점 정렬 순서 유지)
+        wallet_ids = np.flatnonzero((buy_count > 0) | (sell_count > 0))
+        wallet_ids = wallet_ids[np.argsort(first_row[wallet_ids], kind='stable')]
+        for wallet_id in wallet_ids.tolist():
+            address = addresses[wallet_id]
+            stats = self.wallet_stats[address] = {
+                'buy': float(buy_total[wallet_id]) if buy_count[wallet_id] else 0,
+                'sell': float(sell_total[wallet_id]) if sell_count[wallet_id] else 0,
+                'order': table.seq[first_row[wallet_id]]
+            }
+            self._keys[address] = (-(stats['buy'] - stats['sell']), stats['order'], address)
+        self._leaderboard.update(self._keys.values())
+
+        blocks = np.frombuffer(table.block_number, dtype=np.int64)[trades['row']]
+        for block, side, wallet, router, amount in zip(
+                blocks.tolist(), trades['side'].tolist(), trades['wallet'].tolist(),
+                trades['router'].tolist(), trades['amount'].tolist()):
+            self.rollups.add(block, 'buy' if side == BUY else 'sell', addresses[wallet], addresses[router], amount)
+
+        # 저장된 유형과 다른 행만 반환하고 테이블의 유형 열은 한 번에 교체
+        stored = np.frombuffer(table.tx_type, dtype=np.int8)
+        changed_types = [
+            (table.hash_at(row), addresses[table.from_id[row]], addresses[table.to_id[row]], table.log_index[row],
+             TYPE_NAMES[code])
+            for row, code in zip(np.flatnonzero(codes != stored).tolist(), codes[codes != stored].tolist())
+        ]
+        table.tx_type = array('b', codes.tobytes())
+
+        # 최근에 들어온 트랜잭션은 나중에 전송이 더 들어올 때 다시 묶을 수 있도록 기록
+        hashes = np.frombuffer(bytes(table.parent_hash), dtype=f'V{HASH_SIZE}')
+        tail = bisect_right(table.seq, self.last_seq - RECENT_ROWS)
+        for row in np.flatnonzero(np.isin(hashes, hashes[tail:])).tolist():
+            entry = self._recent.setdefault(table.hash_at(row), (table.block_number[row], []))
+            entry[1].append(table.seq[row])
+
+        self.version += 1
+        return changed_types
+
+    def _regroup(self, previous, changes):
+        """이미 반영한 트랜잭션에 전송이 더해졌을 때 이전 묶음의 거래를 되돌리고 전체 전송으로 다시 계산"""
+        wallets = set()
+        for parent_hash, old_seqs in previous.items():
+            block, seqs = self._recent[parent_hash]
+            old_trades, _ = reconstruct(self._rows_by_seq(old_seqs), self.swap_addresses)
+            rows = self._rows_by_seq(seqs)
+            trades, types = reconstruct(rows, self.swap_addresses)
+            self._roll(block, old_trades, sign=-1)
+            self._roll(block, trades)
+            wallets.update(trade[0] for trade in old_trades + trades)
+            self._set_types(rows, types, changes)
+        self._reaggregate({self.table.wallets.get(wallet) for wallet in wallets})
+
+    def set_swap_addresses(self, swap_addresses):
+        """스왑 주소 목록을 바꾸고, 바뀐 주소가 포함된 트랜잭션의 지갑만 다시 집계. 거래 유형이 바뀐 행 목록을 반환"""
+        old_addresses = self.swap_addresses
+        new_addresses = frozenset(swap_addresses)
+        changed_ids = set()
+        for address in old_addresses ^ new_addresses:
+            wallet_id = self.table.wallets.get(address)
+            if wallet_id is not None:
+                changed_ids.add(wallet_id)
+        self.swap_addresses = new_addresses
+        if not changed_ids:
+            return []
+
+        # 바뀐 주소가 포함된 트랜잭션의 거래를 이전/새 기준으로 다시 계산
+        changes = {}
+        affected_ids = set(changed_ids)
+        for rows in self._groups(self._hashes_touching(changed_ids)):
+            block = rows[0]['block_number']
+            old_trades, _ = reconstruct(rows, old_addresses)
+            trades, types = reconstruct(rows, new_addresses)
+            self._roll(block, old_trades, sign=-1)
+            self._roll(block, trades)
+            affected_ids.update(self.table.wallets.get(trade[0]) for trade in old_trades + trades)
+            self._set_types(rows, types, changes)
+
+        self._reaggregate(affected_ids)
+        self.version += 1
+        return self._changed(changes)
+
+    def revert(self, removals):
+        """스토어에서 삭제된 전송 데이터(삭제 기록 id, seq)를 이력에서 빼고 해당 트랜잭션의 지갑만 다시 집계
+
+        결과는 삭제된 행이 처음부터 없었던 것처럼 전체를 다시 집계한 것과 같다.
+        삭제 후 거래 유형이 바뀐 행 목록을 반환한다.
+        """
+        rows = set()
+        for removal_id, seq in removals:
+            self.last_removal = max(self.last_removal, removal_id)
+            row = self.table.row_of(seq)
+            if row is not None:
+                rows.add(row)
+        if not rows:
+            return []
+
+        # 삭제된 행이 속한 트랜잭션의 거래를 되돌리고, 남은 전송으로 다시 계산
+        hashes = {self.table.hash_bytes(row) for row in rows}
+        affected_ids = set()
+        for group in self._groups(hashes):
+            trades, _ = reconstruct(group, self.swap_addresses)
+            self._roll(group[0]['block_number'], trades, sign=-1)
+            affected_ids.update(self.table.wallets.get(trade[0]) for trade in trades)
+
+        removed_seqs = {self.table.seq[row] for row in rows}
+        self.table.remove_rows(rows)
+        for parent_hash, (block, seqs) in list(self._recent.items()):
+            if any(seq in removed_seqs for seq in seqs):
+                self._recent[parent_hash] = (block, [seq for seq in seqs if seq not in removed_seqs])
+
+        changes = {}
+        for group in self._groups(hashes):
+            trades, types = reconstruct(group, self.swap_addresses)
+            self._roll(group[0]['block_number'], trades)
+            affected_ids.update(self.table.wallets.get(trade[0]) for trade in trades)
+            self._set_types(group, types, changes)
+
+        self._reaggregate(affected_ids)
+        self.version += 1
+        return self._changed(changes)
+
+    def _rows_by_seq(self, seqs):
+        rows = []
+        for seq in seqs:
+            row = self.table.row_of(seq)
+            if row is not None:
+                rows.append(self.table.row(row))
+        return rows
+
+    def _hashes_touching(self, wallet_ids):
+        """wallet_ids 지갑이 보내거나 받은 전송이 있는 트랜잭션의 parent hash 집합 (지갑별 트랜잭션 색인 사용)"""
+        return self.table.txs_of(wallet_ids)
+
+    def _groups(self, hashes):
+        """parent hash 집합에 속한 이력 테이블의 전송을 트랜잭션별로 묶어, 첫 전송 순서대로 반환"""
+        table = self.table
+        groups = []
+        for parent_hash in hashes:
+            rows = table.rows_of(parent_hash)
+            if rows:
+                groups.append([table.row(row) for row in rows])
+        groups.sort(key=lambda rows: rows[0]['seq'])
+        return groups
+
+    def _reaggregate(self, affected_ids):
+        """affected_ids 지갑의 통계를 지우고, 그 지갑이 포함된 트랜잭션을 이력 테이블에서 다시 묶어 순서대로 다시 집계
+
+        트랜잭션의 스왑 여부와 순유입량은 트랜잭션의 모든 전송으로 계산하므로 대상 지갑이 없는 전송도 함께 묶는다.
+        """
+        affected_ids.discard(None)
+        addresses = self.table.wallets.addresses
+        affected = {addresses[wallet_id] for wallet_id in affected_ids}
+        for address in affected:
+            if address in self.wallet_stats:
+                self._leaderboard.remove(self._keys.pop(address))
+                del self.wallet_stats[address]
+
+        for rows in self._groups(self._hashes_touching(affected_ids)):
+            trades, _ = reconstruct(rows, self.swap_addresses)
+            for wallet, side, amount, _ in trades:
+                if wallet in affected:
+                    self._update_wallet(wallet, rows[0]['seq'], **{side: amount})
+
+    def load_history(self, transfers):
+        """스냅샷에 이미 반영된 전송 데이터(seq <= last_seq)를 순위 집계 없이 이력 테이블과 거래량 집계에만 추가"""
+        def restored():
+            for tx_data in transfers:
+                if tx_data['seq'] > self.last_seq:
+                    break
+                self.table.append(tx_data)
+                yield tx_data
+
+        for rows in group_transactions(restored()):
+            trades, _ = reconstruct(rows, self.swap_addresses)
+            self._roll(rows[0]['block_number'], trades)
+            # 최근에 들어온 트랜잭션은 나중에 전송이 더 들어올 때 다시 묶을 수 있도록 기록
+            if rows[-1]['seq'] > self.last_seq - RECENT_ROWS:
+                self._recent[rows[0]['parent_hash']] = (rows[0]['block_number'], [row['seq'] for row in rows])
+
+    def _entry(self, address):
+        stats = self.wallet_stats[address]
+        return {
+            'address': address,
+            'net_purchase': stats['buy'] - stats['sell'],
+            'buy': stats['buy'],
+            'sell': stats['sell']
+        }
+
+    def top(self, n=10):
+        """상위 n개 순위"""
+        return self.page(0, n)
+
+    def page(self, start, n):
+        """start번째(0부터)부터 n개 순위. 정렬된 순위표에서 바로 잘라내므로 다시 정렬하지 않음"""
+        return [self._entry(key[2]) for key in self._leaderboard.islice(start, start + n)]
+
+    def rank(self, address):
+        """지갑의 (순위(1부터), 통계). 매수/매도로 집계된 적 없는 지갑은 None"""
+        key = self._keys.get(address)
+        if key is None:
+            return None
+        return self._leaderboard.index(key) + 1, self._entry(address)
+
+    def participants(self):
+        """순위표에 있는 지갑 수"""
+        return len(self._leaderboard)
+
+    def rankings(self):
+        """전체 순위"""
+        return [self._entry(key[2]) for key in self._leaderboard]
+
+    def to_state(self):
+        """스냅샷으로 저장할 엔진 상태"""
+        return {
+            'start_block': self.start_block,
+            'swap_addresses': sorted(self.swap_addresses),
+            'last_block': self.last_block,
+            'last_seq': self.last_seq,
+            'last_removal': self.last_removal,
+            'version': self.version,
+            'grouping': GROUPING,
+            'wallet_stats': self.wallet_stats
+        }
+
+    def save(self, path):
+        atomic_write_json(path, self.to_state())
+
+    @classmethod
+    def load(cls, path, swap_addresses, start_block, max_seq=None, last_removal=0):
+        """스냅샷에서 엔진 상태 복원. 설정이 다르거나 스토어보다 앞선 스냅샷은 버리고 새로 시작
+
+        복원된 엔진은 last_seq 이후의 스토어 데이터(저널 꼬리)만 다시 반영하면 된다.
+        스냅샷 이후 스토어에서 삭제된 행이 있으면 (last_removal이 다르면) 스냅샷을 쓰지 않는다.
+        """
+        engine = cls(swap_addresses, start_block)
+        engine.last_removal = last_removal
+        state = read_json(path)
+        if not state:
+            return engine
+        if (state.get('start_block') != start_block
+                or sorted(state.get('swap_addresses', [])) != sorted(engine.swap_addresses)
+                or (max_seq is not None and state['last_seq'] > max_seq)
+                or state.get('last_removal', 0) != last_removal
+                or state.get('grouping') != GROUPING):
+            print(f"Ignoring stale ranking snapshot {path}")
+            return engine
+
+        engine.last_block = state['last_block']
+        engine.last_seq = state['last_seq']
+        engine.version = state['version']
+        engine.wallet_stats = state['wallet_stats']
+        for address, stats in engine.wallet_stats.items():
+            key = (-(stats['buy'] - stats['sell']), stats['order'], address)
+            engine._keys[address] = key
+        engine._leaderboard.update(engine._keys.values())
+        return engine
+
@@ -0,0 +1,41 @@
+from collections import OrderedDict
+import metrics
+
+RENDER_CACHE_LOOKUPS = metrics.counter(
+    'render_cache_lookups_total', 'Rendered message cache lookups', ('name', 'result')
+)
+
+
+class RenderCache:
+    """렌더링한 메시지를 (이름, 버전, 키)로 캐시
+
+    이름(캠페인, price 등)마다 가장 최근 버전의 메시지만 보관하며, 버전이 바뀌면
+    그 이름의 메시지를 모두 버린다. 버전이 같으면 dict 조회 한 번으로 메시지를 반환한다.
+    버전이 오래 바뀌지 않아도 (끝난 캠페인 등) 키가 계속 늘지 않도록 이름마다 최근에 쓴
+    max_entries개만 남긴다 (LRU).
+    """
+
+    def __init__(self, max_entries=256):
+        self.max_entries = max_entries
+        # 이름 -> (버전, OrderedDict{키: 메시지}) (오래 안 쓴 키가 앞)
+        self._entries = {}
+
+    def get(self, name, version, key, render):
+        """캐시된 메시지를 반환하고, 없으면 render()로 만들어 저장"""
+        entry = self._entries.get(name)
+        if entry is None or entry[0] != version:
+            if entry is not None:
+                RENDER_CACHE_LOOKUPS.inc(name=name, result='invalidated')
+            entry = self._entries[name] = (version, OrderedDict())
+        messages = entry[1]
+        message = messages.get(key)
+        if message is None:
+            RENDER_CACHE_LOOKUPS.inc(name=name, result='miss')
+            message = messages[key] = render()
+            if len(messages) > self.max_entries:
+                messages.popitem(last=False)
+                RENDER_CACHE_LOOKUPS.inc(name=name, result='evicted')
+        else:
+            RENDER_CACHE_LOOKUPS.inc(name=name, result='hit')
+            messages.move_to_end(key)
+        return message
@@ -0,0 +1,108 @@
+from collections import Counter
+
+# 집계 구간 크기 (블록). Kaia 블록 시간이 약 1초라 300블록은 약 5분
+BUCKET_BLOCKS = 300
+
+
+class _Bucket:
+    __slots__ = ('buy', 'sell', 'buys', 'sells', 'buyers', 'routers')
+
+    def __init__(self):
+        self.buy = 0
+        self.sell = 0
+        self.buys = 0
+        self.sells = 0
+        self.buyers = Counter()  # 매수 지갑 -> 구간 안의 매수 횟수 (되돌릴 때 0이 되면 제거)
+        self.routers = {}  # 스왑 주소 -> [매수량, 매도량, 거래 수]
+
+
+class VolumeRollups:
+    """블록 구간별 매수/매도 거래량, 매수 지갑, 스왑 주소별 거래량 집계
+
+    전송 데이터가 반영되거나 되돌려질 때마다 해당 구간만 갱신하므로,
+    기간 조회는 원본 전송 데이터가 아니라 구간 집계만 합친다.
+    """
+
+    def __init__(self, bucket_blocks=BUCKET_BLOCKS):
+        self.bucket_blocks = bucket_blocks
+        self._buckets = {}
+
+    def __len__(self):
+        return len(self._buckets)
+
+    def add(self, block_number, side, wallet, router, amount, sign=1):
+        """트랜잭션에서 복원한 거래 한 건(side: buy/sell)을 반영 (sign=-1이면 되돌림)"""
+        bucket_id = block_number // self.bucket_blocks
+        bucket = self._buckets.get(bucket_id)
+        if bucket is None:
+            bucket = self._buckets[bucket_id] = _Bucket()
+        volumes = bucket.routers.setdefault(router, [0, 0, 0])
+        volumes[2] += sign
+        if side == 'buy':
+            bucket.buy += sign * amount
+            bucket.buys += sign
+            bucket.buyers[wallet] += sign
+            if bucket.buyers[wallet] <= 0:
+                del bucket.buyers[wallet]
+            volumes[0] += sign * amount
+        else:
+            bucket.sell += sign * amount
+            bucket.sells += sign
+            volumes[1] += sign * amount
+        if volumes[2] <= 0:
+            del bucket.routers[router]
+
+        if bucket.buys <= 0 and bucket.sells <= 0:
+            del self._buckets[bucket_id]
+
+    def _range(self, from_block, to_block):
+        first = from_block // self.bucket_blocks
+        last = to_block // self.bucket_blocks
+        if last - first + 1 <= len(self._buckets):
+            for bucket_id in range(first, last + 1):
+                bucket = self._buckets.get(bucket_id)
+                if bucket is not None:
+                    yield bucket
+        else:
+            for bucket_id, bucket in self._buckets.items():
+                if first <= bucket_id <= last:
+                    yield bucket
+
+    def summary(self, from_block, to_block):
+        """from_block~to_block 구간(집계 구간 단위로 올림)의 매수/매도량, 거래 수, 매수 지갑 수"""
+        result = {'buy': 0, 'sell': 0, 'buys': 0, 'sells': 0}
+        buyers = set()
+        for bucket in self._range(from_block, to_block):
+            result['buy'] += bucket.buy
+            result['sell'] += bucket.sell
+            result['buys'] += bucket.buys
+            result['sells'] += bucket.sells
+            buyers.update(bucket.buyers)
+        result['buyers'] = len(buyers)
+        result['net'] = result['buy'] - result['sell']
+        return result
+
+    def flows(self, from_block, to_block):
+        """스왑 주소별 (주소, 매수량, 매도량) 목록. 거래량이 큰 순서"""
+        totals = {}
+        for bucket in self._range(from_block, to_block):
+            for router, (buy, sell, _) in bucket.routers.items():
+                total = totals.setdefault(router, [0, 0])
+                total[0] += buy
+                total[1] += sell
+        flows = [(router, buy, sell) for router, (buy, sell) in totals.items()]
+        flows.sort(key=lambda flow: flow[1] + flow[2], reverse=True)
+        return flows
+
+    def series(self, from_block, to_block, step_blocks):
+        """step_blocks마다 (구간 시작 블록, 매수량, 매도량) 목록. 예) 블록 시간 1초면 3600블록이 1시간"""
+        step = max(step_blocks // self.bucket_blocks, 1) * self.bucket_blocks
+        points = {}
+        for bucket_id, bucket in self._buckets.items():
+            block = bucket_id * self.bucket_blocks
+            if from_block // self.bucket_blocks <= bucket_id <= to_block // self.bucket_blocks:
+                start = from_block + (max(block - from_block, 0) // step) * step
+                point = points.setdefault(start, [0, 0])
+                point[0] += bucket.buy
+                point[1] += bucket.sell
+        return [(block, buy, sell) for block, (buy, sell) in sorted(points.items())]
@@ -0,0 +1,51 @@
+import json
+import os
+
+
+class RouterRegistry:
+    """스왑 라우터/풀 주소 목록. 설정 파일이 바뀌면 재시작 없이 다시 읽음
+
+    설정 파일 형식: {"주소": "라벨", ...}
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.labels = {}
+        self.addresses = frozenset()
+        self.mtime = None
+        self.reload_if_changed()
+
+    def __contains__(self, address):
+        return address in self.addresses
+
+    def label(self, address):
+        return self.labels.get(address) or address
+
+    def reload_if_changed(self):
+        """파일이 바뀌었으면 다시 읽고 (추가된 주소, 제거된 주소)를 반환. 바뀐 것이 없으면 None"""
+        try:
+            mtime = os.stat(self.path).st_mtime_ns
+        except FileNotFoundError:
+            print(f"Router registry {self.path} not found")
+            return None
+        if mtime == self.mtime:
+            return None
+
+        try:
+            with open(self.path, 'r') as f:
+                labels = {address.lower(): label for address, label in json.load(f).items()}
+        except (json.JSONDecodeError, AttributeError) as e:
+            # 잘못된 설정은 무시하고 기존 목록 유지 (파일이 다시 바뀌면 재시도)
+            print(f"Error reading {self.path}: {e}")
+            self.mtime = mtime
+            return None
+
+        self.mtime = mtime
+        addresses = frozenset(labels)
+        added = addresses - self.addresses
+        removed = self.addresses - addresses
+        self.labels = labels
+        self.addresses = addresses
+        if not added and not removed:
+            return None
+        return added, removed
@@ -0,0 +1,293 @@
+import asyncio
+import heapq
+import itertools
+import time
+from telegram.error import BadRequest, ChatMigrated, Forbidden, NetworkError, RetryAfter
+from fetcher import TokenBucket
+import metrics
+
+# 우선순위 레인 (숫자가 작을수록 먼저 보냄)
+REPLY, BROADCAST = 0, 1
+LANES = ('reply', 'broadcast')
+
+# 텔레그램 메시지 최대 길이 (묶어 보낼 때 넘지 않도록)
+MAX_MESSAGE_LENGTH = 4096
+
+QUEUE_DEPTH = metrics.gauge('telegram_send_queue_depth', 'Messages waiting in the outbound queue', ('lane',))
+MESSAGES_SENT = metrics.counter(
+    'telegram_messages_total', 'Outbound Telegram send attempts by outcome', ('lane', 'outcome')
+)
+SEND_WAIT_SECONDS = metrics.histogram(
+    'telegram_send_wait_seconds', 'Time from enqueue to successful send', ('lane',)
+)
+
+
+def _retry_after_seconds(error):
+    delay = error.retry_after
+    return delay.total_seconds() if hasattr(delay, 'total_seconds') else float(delay)
+
+
+class _Message:
+    def __init__(self, lane, seq, chat_id, kwargs, batch):
+        self.lane = lane
+        self.seq = seq
+        self.chat_id = chat_id
+        self.kwargs = kwargs
+        self.batch = batch
+        future = asyncio.get_running_loop().create_future()
+        # 결과를 기다리지 않고 보낸 메시지의 실패가 처리되지 않은 예외로 남지 않도록 회수
+        future.add_done_callback(lambda f: f.cancelled() or f.exception())
+        self.futures = [future]
+        self.enqueued = time.monotonic()
+        self.attempts = 0
+
+    def __lt__(self, other):
+        return (self.lane, self.seq) < (other.lane, other.seq)
+
+    def can_merge(self, other):
+        """같은 레인의 묶음 메시지이고 형식이 같으며 합쳐도 길이 제한을 넘지 않으면 True"""
+        if not (self.batch and other.batch and self.lane == other.lane):
+            return False
+        if self.kwargs.keys() != other.kwargs.keys() or self.kwargs.get('parse_mode') != other.kwargs.get('parse_mode'):
+            return False
+        if set(self.kwargs) - {'text', 'parse_mode'}:
+            return False
+        return len(self.kwargs['text']) + 2 + len(other.kwargs['text']) <= MAX_MESSAGE_LENGTH
+
+    def merge(self, other):
+        self.kwargs = dict(self.kwargs, text=self.kwargs['text'] + "\n\n" + other.kwargs['text'])
+        self.futures.extend(other.futures)
+
+
+class _Chat:
+    def __init__(self, bucket):
+        self.bucket = bucket
+        self.pending = []  # (레인, 순번) 순서의 메시지 힙
+        self.blocked_until = 0.0  # retry_after 또는 재시도 대기가 끝나는 시각
+        self.entry = None  # 스케줄 힙에 들어 있는 이 채팅의 최신 항목 (오래된 항목은 무시)
+        self.ready = False  # entry가 바로 보낼 수 있는 힙(_ready)에 있으면 True
+        self.in_flight = False
+
+
+class SendQueue:
+    """텔레그램 발신 메시지를 모아 속도 제한 안에서 보내는 비동기 디스패처
+
+    - 전체 토큰 버킷(초당 global_rate)과 채팅별 토큰 버킷(그룹은 분당 group_per_minute,
+      개인 채팅은 초당 private_rate)을 모두 통과한 메시지만 보낸다.
+    - 레인 순서대로 보내므로 명령어 응답(REPLY)이 공지(BROADCAST)보다 먼저 나간다.
+    - 한 채팅에는 한 번에 하나씩 보내 순서를 지키고, RetryAfter를 받으면 그 채팅은
+      서버가 알려준 시간 동안 멈춘다. 네트워크 오류는 지수 백오프로 재시도한다.
+    - batch=True로 넣은 같은 채팅의 공지는 길이 제한 안에서 한 메시지로 묶는다.
+    """
+
+    def __init__(self, global_rate=30, group_per_minute=20, group_burst=3, private_rate=1.0,
+                 max_retries=5, base_backoff=1.0, max_backoff=60.0, concurrency=30):
+        self.send_message = None
+        self.global_bucket = TokenBucket(global_rate, 1)
+        self.group_per_minute = group_per_minute
+        self.group_burst = group_burst
+        self.private_rate = private_rate
+        self.max_retries = max_retries
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+        self.concurrency = concurrency
+        self._chats = {}
+        self._ready = []  # (레인, 순번, 채팅 id)
+        self._delayed = []  # (보낼 수 있는 시각, 순번, 채팅 id)
+        self._seq = itertools.count()
+        self._wakeup = asyncio.Event()
+        self._slots = None
+        self._deliveries = set()
+        self._task = None
+        self.depth = [0] * len(LANES)
+
+    def _bucket_for(self, chat_id):
+        # 그룹/채널 id는 음수
+        if isinstance(chat_id, int) and chat_id < 0:
+            # 버스트를 허용해도 어떤 1분 동안에도 group_per_minute개를 넘지 않도록 충전 속도를 줄임
+            rate = (self.group_per_minute - self.group_burst) / 60
+            return TokenBucket(rate, self.group_burst)
+        return TokenBucket(self.private_rate, 1)
+
+    def _chat(self, chat_id):
+        chat = self._chats.get(chat_id)
+        if chat is None:
+            chat = self._chats[chat_id] = _Chat(self._bucket_for(chat_id))
+        return chat
+
+    def _schedule(self, chat_id, chat, at=None):
+        """채팅의 다음 메시지를 스케줄 힙에 넣음. at이 있으면 그 시각까지 대기"""
+        if not chat.pending or chat.in_flight:
+            chat.entry = None
+            return
+        if at is None:
+            head = chat.pending[0]
+            entry = (head.lane, head.seq, chat_id)
+            heapq.heappush(self._ready, entry)
+        else:
+            entry = (at, next(self._seq), chat_id)
+            heapq.heappush(self._delayed, entry)
+        chat.entry = entry
+        chat.ready = at is None
+        self._wakeup.set()
+
+    def _set_depth(self, lane, delta):
+        self.depth[lane] += delta
+        QUEUE_DEPTH.set(self.depth[lane], lane=LANES[lane])
+
+    def submit(self, chat_id, text, parse_mode=None, lane=REPLY, batch=False, **kwargs):
+        """메시지를 큐에 넣고 전송 결과(telegram Message)를 받을 Future를 반환
+
+        명령어 핸들러는 결과를 기다리지 않고 바로 반환해 다음 업데이트 처리를 막지 않는다.
+        """
+        message = _Message(lane, next(self._seq), chat_id, dict(kwargs, text=text, parse_mode=parse_mode), batch)
+        chat = self._chat(chat_id)
+        heapq.heappush(chat.pending, message)
+        self._set_depth(lane, 1)
+        # 대기 중인 채팅이 아니고, 새 메시지가 지금 스케줄된 것보다 앞서면 다시 스케줄
+        if not chat.in_flight and (chat.entry is None or (chat.ready and chat.pending[0] is message)):
+            self._schedule(chat_id, chat)
+        return message.futures[0]
+
+    async def send(self, chat_id, text, parse_mode=None, lane=REPLY, batch=False, **kwargs):
+        """메시지를 큐에 넣고 실제로 전송될 때까지 기다림"""
+        return await self.submit(chat_id, text, parse_mode=parse_mode, lane=lane, batch=batch, **kwargs)
+
+    def _next_message(self, chat):
+        message = heapq.heappop(chat.pending)
+        while chat.pending and message.can_merge(chat.pending[0]):
+            other = heapq.heappop(chat.pending)
+            self._set_depth(other.lane, -1)
+            message.merge(other)
+        return message
+
+    async def _run(self):
+        while True:
+            now = time.monotonic()
+            while self._delayed and self._delayed[0][0] <= now:
+                entry = heapq.heappop(self._delayed)
+                chat = self._chats.get(entry[2])
+                if chat is not None and chat.entry is entry:
+                    self._schedule(entry[2], chat)
+
+            if not self._ready:
+                timeout = self._delayed[0][0] - now if self._delayed else None
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout)
+                except asyncio.TimeoutError:
+                    pass
+                self._prune()
+                continue
+
+            entry = heapq.heappop(self._ready)
+            chat_id = entry[2]
+            chat = self._chats.get(chat_id)
+            if chat is None or chat.entry is not entry:
+                continue  # 더 앞선 메시지로 다시 스케줄된 오래된 항목
+            wait = max(chat.blocked_until - now, chat.bucket.wait_time())
+            if wait > 0:
+                self._schedule(chat_id, chat, at=now + wait)
+                continue
+
+            # 전체 한도와 동시 전송 수 안에서 보냄
+            await self.global_bucket.acquire()
+            await self._slots.acquire()
+            chat.bucket.try_acquire()
+            chat.in_flight = True
+            chat.entry = None
+            message = self._next_message(chat)
+            task = asyncio.ensure_future(self._deliver(chat, message))
+            self._deliveries.add(task)
+            task.add_done_callback(self._deliveries.discard)
+
+    async def _deliver(self, chat, message):
+        retry_at = None
+        try:
+            message.attempts += 1
+            result = await self.send_message(chat_id=message.chat_id, **message.kwargs)
+        except RetryAfter as e:
+            # 서버가 알려준 시간 동안 이 채팅으로는 보내지 않음 (시도 횟수에 포함하지 않음)
+            message.attempts -= 1
+            MESSAGES_SENT.inc(lane=LANES[message.lane], outcome='retry_after')
+            retry_at = time.monotonic() + _retry_after_seconds(e)
+            heapq.heappush(chat.pending, message)
+        except (BadRequest, Forbidden, ChatMigrated) as e:
+            self._fail(message, e)
+        except NetworkError as e:
+            if message.attempts > self.max_retries:
+                self._fail(message, e)
+            else:
+                MESSAGES_SENT.inc(lane=LANES[message.lane], outcome='retry')
+                delay = min(self.max_backoff, self.base_backoff * 2 ** (message.attempts - 1))
+                retry_at = time.monotonic() + delay
+                heapq.heappush(chat.pending, message)
+        except Exception as e:
+            self._fail(message, e)
+        else:
+            MESSAGES_SENT.inc(lane=LANES[message.lane], outcome='ok')
+            SEND_WAIT_SECONDS.observe(time.monotonic() - message.enqueued, lane=LANES[message.lane])
+            self._set_depth(message.lane, -1)
+            for future in message.futures:
+                if not future.done():
+                    future.set_result(result)
+        finally:
+            self._slots.release()
+            chat.in_flight = False
+            if retry_at is not None:
+                chat.blocked_until = retry_at
+                self._schedule(message.chat_id, chat, at=retry_at)
+            else:
+                self._schedule(message.chat_id, chat)
+
+    def _fail(self, message, error):
+        print(f"Error sending message to {message.chat_id}: {error}")
+        MESSAGES_SENT.inc(lane=LANES[message.lane], outcome='error')
+        self._set_depth(message.lane, -1)
+        for future in message.futures:
+            if not future.done():
+                future.set_exception(error)
+
+    def _prune(self, max_idle=1000):
+        """보낼 메시지가 없고 토큰이 다 찬 채팅은 잊음 (채팅 수만큼 메모리가 늘지 않도록)"""
+        if len(self._chats) <= max_idle:
+            return
+        now = time.monotonic()
+        for chat_id, chat in list(self._chats.items()):
+            if (not chat.pending and not chat.in_flight and chat.blocked_until <= now
+                    and chat.bucket.wait_time() == 0 and chat.bucket.tokens >= chat.bucket.capacity):
+                del self._chats[chat_id]
+
+    def pending(self):
+        return sum(self.depth)
+
+    def start(self, send_message):
+        """send_message(chat_id=..., text=..., ...) 코루틴으로 전송 시작"""
+        self.send_message = send_message
+        if self._task is None or self._task.done():
+            self._slots = asyncio.Semaphore(self.concurrency)
+            self._task = asyncio.create_task(self._run())
+        return self._task
+
+    async def stop(self, timeout=5.0):
+        """남은 메시지를 timeout초까지 보내고 종료. 보내지 못한 메시지의 Future는 취소"""
+        deadline = time.monotonic() + timeout
+        while self.pending() and time.monotonic() < deadline:
+            await asyncio.sleep(0.05)
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        for task in list(self._deliveries):
+            task.cancel()
+        for chat in self._chats.values():
+            for message in chat.pending:
+                for future in message.futures:
+                    future.cancel()
+            chat.pending.clear()
+        self.depth = [0] * len(LANES)
+        for lane in LANES:
+            QUEUE_DEPTH.set(0, lane=lane)
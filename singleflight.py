@@ -0,0 +1,35 @@
+import asyncio
+import time
+
+
+class SingleFlight:
+    """키별로 동시에 하나의 작업만 실행하고, 같은 키를 기다리는 호출자는 그 결과를 공유
+
+    fresh_for초 이내에 끝난 작업의 결과는 다시 실행하지 않고 그대로 반환한다.
+    """
+
+    def __init__(self, fresh_for=0):
+        self.fresh_for = fresh_for
+        self._in_flight = {}
+        self._results = {}
+
+    def _on_done(self, key, task):
+        if self._in_flight.get(key) is task:
+            del self._in_flight[key]
+        if not task.cancelled() and task.exception() is None and task.result() is not None:
+            self._results[key] = (time.monotonic(), task.result())
+
+    async def do(self, key, func, fresh_for=None):
+        """func()를 실행하거나, 진행 중이거나 최근에 끝난 같은 키의 결과를 반환"""
+        fresh_for = self.fresh_for if fresh_for is None else fresh_for
+        cached = self._results.get(key)
+        if cached is not None and time.monotonic() - cached[0] < fresh_for:
+            return cached[1]
+
+        task = self._in_flight.get(key)
+        if task is None or task.done():
+            task = asyncio.ensure_future(func())
+            self._in_flight[key] = task
+            task.add_done_callback(lambda t: self._on_done(key, t))
+        # 한 호출자가 취소되어도 다른 호출자가 기다리는 작업은 계속 진행
+        return await asyncio.shield(task)
@@ -0,0 +1,120 @@
+import asyncio
+from bisect import bisect_right
+
+import pytest
+
+from block_clock import BlockClock, parse_time
+
+
+class FakeRpc:
+    """블록 시각 목록(times[블록])을 가진 체인. 조회한 블록을 기록"""
+
+    def __init__(self, times):
+        self.times = times
+        self.fetched = []
+
+    async def block_number(self):
+        return len(self.times) - 1
+
+    async def block_timestamp(self, block):
+        self.fetched.append(block)
+        return self.times[block]
+
+
+def uneven_chain(blocks, start=1_700_000_000):
+    # 블록 시간이 1초 근처에서 흔들리고 가끔 같은 시각의 블록이 이어짐
+    times, now = [], start
+    for block in range(blocks):
+        times.append(now)
+        now += (0, 1, 1, 2, 1)[block % 5]
+    return times
+
+
+def test_interpolates_between_anchors():
+    clock = BlockClock()
+    clock.add(100, 1000)
+    clock.add(300, 1400)
+    assert clock.timestamp(200) == 1200
+    assert clock.block_at(1200) == 200
+    assert clock.block_at(1201) == 200  # 블록 사이 시각은 이전 블록으로 내림
+    assert clock.timestamp(300) == 1400
+
+
+def test_out_of_range_uses_block_time():
+    clock = BlockClock(block_time=2.0)
+    assert clock.timestamp(100) is None
+    assert clock.block_at(1000) is None
+
+    clock.add(100, 1000)
+    clock.add(200, 1300)
+    assert clock.timestamp(50) == 900
+    assert clock.timestamp(250) == 1400
+    assert clock.block_at(800) == 0
+    assert clock.block_at(1500) == 300
+
+
+def test_add_keeps_anchors_sorted_and_unique():
+    clock = BlockClock()
+    for block, timestamp in [(300, 30), (100, 10), (200, 20), (100, 99)]:
+        clock.add(block, timestamp)
+    assert list(clock.blocks) == [100, 200, 300]
+    assert list(clock.times) == [10, 20, 30]
+
+
+def test_save_and_load_round_trip(tmp_path):
+    path = str(tmp_path / 'block_times.bin')
+    clock = BlockClock(path)
+    clock.add(100, 1000)
+    clock.add(200, 1100)
+    clock.save()
+
+    loaded = BlockClock(path)
+    assert len(loaded) == 2
+    assert loaded.timestamp(150) == 1050
+
+
+def test_corrupt_index_starts_empty(tmp_path):
+    path = tmp_path / 'block_times.bin'
+    path.write_bytes(b'\x00' * 15)
+    assert len(BlockClock(str(path))) == 0
+
+
+@pytest.mark.parametrize('offset', [0, 1, 777, 4321, 9998])
+def test_resolve_finds_last_block_at_or_before_time(offset):
+    rpc = FakeRpc(uneven_chain(10_000))
+    clock = BlockClock()
+    timestamp = rpc.times[0] + offset
+    block = asyncio.run(clock.resolve(rpc, timestamp))
+    assert block == bisect_right(rpc.times, timestamp) - 1
+    assert len(rpc.fetched) <= 20
+
+
+def test_resolve_time_before_chain_or_in_future():
+    rpc = FakeRpc(uneven_chain(1000))
+    clock = BlockClock()
+    assert asyncio.run(clock.resolve(rpc, rpc.times[0] - 10)) is None
+    assert asyncio.run(clock.resolve(rpc, rpc.times[-1] + 10)) is None
+
+
+def test_update_head_keeps_one_anchor_per_spacing():
+    times = uneven_chain(1000)
+    rpc = FakeRpc(times[:10])
+    clock = BlockClock(spacing=100)
+    asyncio.run(clock.update_head(rpc))
+    for head in (50, 90, 120, 150, 180):
+        rpc.times = times[:head + 1]
+        asyncio.run(clock.update_head(rpc))
+    # 9는 그대로 두고, 50과 90은 새 최신 블록으로 바뀌고, 120부터 다시 간격이 벌어짐
+    assert list(clock.blocks) == [9, 90, 180]
+
+
+def test_ensure_fetches_only_gaps():
+    rpc = FakeRpc(uneven_chain(5000))
+    clock = BlockClock(spacing=1000)
+    assert asyncio.run(clock.ensure(rpc, 0, 4000)) == 5
+    assert asyncio.run(clock.ensure(rpc, 0, 4000)) == 0
+    assert asyncio.run(clock.ensure(rpc, 0, 4000, spacing=500)) == 4
+
+
+def test_parse_time_defaults_to_utc():
+    assert parse_time('2024-10-20T12:00:00') == parse_time('2024-10-20T21:00:00+09:00')
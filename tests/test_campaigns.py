@@ -0,0 +1,81 @@
+import asyncio
+import json
+import os
+import time
+
+import campaigns
+from campaigns import Campaign
+
+POOL = '0xpool'
+
+
+def transfer(index, wallet, buy=True, amount=10.0):
+    return {
+        'parent_hash': f"0x{index:064x}", 'block_number': 1000 + index, 'amount': amount, 'log_index': 0,
+        'from_address': POOL if buy else wallet, 'to_address': wallet if buy else POOL
+    }
+
+
+def make_campaign(tmp_path):
+    routers = tmp_path / 'routers.json'
+    routers.write_text(json.dumps({POOL: 'Pool'}))
+    return Campaign('test', '0xtoken', 1000, str(tmp_path / 'test_{}'), http=None, routers=str(routers))
+
+
+def test_engine_is_restored_off_the_event_loop(tmp_path, monkeypatch):
+    campaign = make_campaign(tmp_path)
+    campaign.store.upsert_transfers([transfer(1, '0xa'), transfer(2, '0xb', amount=30.0), transfer(3, '0xa')])
+    build = campaign._build_engine
+
+    def slow_build():
+        time.sleep(0.2)
+        return build()
+
+    monkeypatch.setattr(campaign, '_build_engine', slow_build)
+
+    async def main():
+        ticks = 0
+
+        async def ticker():
+            nonlocal ticks
+            while True:
+                ticks += 1
+                await asyncio.sleep(0.01)
+
+        task = asyncio.ensure_future(ticker())
+        rankings = await campaign.update_rankings()
+        task.cancel()
+        return rankings, ticks
+
+    rankings, ticks = asyncio.run(main())
+    assert ticks >= 10  # 엔진을 만드는 동안에도 이벤트 루프가 계속 돌았음
+    assert [(entry['address'], entry['buy']) for entry in rankings] == [('0xb', 30.0), ('0xa', 20.0)]
+    assert [t['transaction_type'] for t in campaign.store.iter_new_transfers(0)] == ['buy'] * 3
+
+
+def test_new_transfers_are_applied_in_chunks_and_restored(tmp_path, monkeypatch):
+    monkeypatch.setattr(campaigns, 'APPLY_CHUNK', 2)
+    campaign = make_campaign(tmp_path)
+    campaign.store.upsert_transfers([transfer(1, '0xa')])
+    asyncio.run(campaign.update_rankings())
+
+    campaign.store.upsert_transfers([transfer(i, '0xa' if i % 2 else '0xb', buy=i % 3 != 0) for i in range(2, 9)])
+    rankings = asyncio.run(campaign.update_rankings())
+    assert campaign.engine.last_seq == campaign.store.last_seq()
+    campaign.close()
+
+    # 다시 열면 스냅샷과 이력으로 같은 순위를 복원
+    restored = make_campaign(tmp_path)
+    assert asyncio.run(restored.update_rankings()) == rankings
+    restored.close()
+
+
+def test_close_before_restore_keeps_the_snapshot(tmp_path):
+    campaign = make_campaign(tmp_path)
+    campaign.store.upsert_transfers([transfer(1, '0xa')])
+    asyncio.run(campaign.update_rankings())
+    campaign.close()
+    snapshot = os.path.getmtime(campaign.ranking_state_json)
+
+    make_campaign(tmp_path).close()
+    assert os.path.getmtime(campaign.ranking_state_json) == snapshot
@@ -0,0 +1,102 @@
+import pytest
+
+from cooldowns import Cooldowns, MemoryStore, Policy, SqliteStore
+
+USER, CHAT = 7, -100
+
+
+def test_sliding_window_counts_recent_uses():
+    cooldowns = Cooldowns(default=[Policy(limit=2, window=60)])
+    assert cooldowns.check('top', USER, CHAT, now=0) == 0
+    assert cooldowns.check('top', USER, CHAT, now=10) == 0
+    # 60초 안에 2번 썼으므로 가장 오래된 사용(0초)이 창을 벗어날 때까지 기다림
+    assert cooldowns.check('top', USER, CHAT, now=20) == 40
+    assert cooldowns.check('top', USER, CHAT, now=60) == 0
+    assert cooldowns.check('top', USER, CHAT, now=61) == 9
+
+
+def test_bucket_refills_over_window():
+    cooldowns = Cooldowns(default=[Policy(limit=2, window=60, mode='bucket')])
+    assert cooldowns.check('top', USER, CHAT, now=0) == 0
+    assert cooldowns.check('top', USER, CHAT, now=0) == 0
+    # 30초마다 토큰 하나가 참
+    assert cooldowns.check('top', USER, CHAT, now=10) == pytest.approx(20)
+    assert cooldowns.check('top', USER, CHAT, now=30) == 0
+    assert cooldowns.check('top', USER, CHAT, now=30) == pytest.approx(30)
+
+
+def test_sliding_and_bucket_differ_after_burst():
+    # 같은 한도라도 sliding은 창 전체를 기다리고 bucket은 토큰 하나만큼만 기다림
+    sliding = Cooldowns(default=[Policy(limit=3, window=60)])
+    bucket = Cooldowns(default=[Policy(limit=3, window=60, mode='bucket')])
+    for cooldowns in (sliding, bucket):
+        for _ in range(3):
+            assert cooldowns.check('top', USER, CHAT, now=0) == 0
+    assert sliding.check('top', USER, CHAT, now=20) == 40
+    assert bucket.check('top', USER, CHAT, now=20) == 0
+
+
+def test_scopes_and_all_policies_must_pass():
+    cooldowns = Cooldowns(policies={'top': [Policy(limit=1, window=60, per='user'),
+                                            Policy(limit=2, window=60, per='chat')]})
+    assert cooldowns.check('top', 1, CHAT, now=0) == 0
+    assert cooldowns.check('top', 1, CHAT, now=1) == 59  # 사용자 한도
+    assert cooldowns.check('top', 2, CHAT, now=1) == 0
+    assert cooldowns.check('top', 3, CHAT, now=2) == 58  # 채팅 한도
+    # 거절된 요청은 기록되지 않으므로 사용자 3은 다른 채팅에서 쓸 수 있음
+    assert cooldowns.check('top', 3, CHAT - 1, now=2) == 0
+
+
+def test_unknown_scope_or_mode_is_rejected():
+    with pytest.raises(ValueError):
+        Policy(per='team')
+    with pytest.raises(ValueError):
+        Policy(mode='fixed')
+
+
+def test_memory_store_evicts_expired_entries():
+    store = MemoryStore()
+    cooldowns = Cooldowns(default=[Policy(limit=1, window=60)], store=store)
+    for user_id in range(100):
+        cooldowns.check('top', user_id, CHAT, now=user_id)
+    # 검사할 때마다 만료된 항목(사용 후 60초)을 지움
+    assert len(store) == 60
+
+    cooldowns.check('top', 1000, CHAT, now=130)
+    assert len(store) == 100 - 71 + 1
+    assert store.get('top:user:sliding:71', 130) is not None
+
+
+def test_memory_store_drops_stale_heap_entries():
+    store = MemoryStore()
+    for now in range(5000):
+        store.set('key', [now], now + 60)
+    # 같은 키를 계속 갱신해도 만료 힙이 항목 수에 비례하는 크기로 유지됨
+    assert len(store) == 1
+    assert len(store._expiry) <= 2 * len(store) + 1024 + 1
+
+    store.evict(100)
+    assert store.get('key', 100) == [4999]
+    store.evict(5059)
+    assert len(store) == 0
+
+
+def test_sqlite_store_survives_restart_and_evicts(tmp_path):
+    path = str(tmp_path / 'cooldowns.db')
+    policy = Policy(limit=1, window=60, mode='bucket')
+    cooldowns = Cooldowns(default=[policy], store=SqliteStore(path))
+    assert cooldowns.check('top', USER, CHAT, now=0) == 0
+    cooldowns.close()
+
+    # 재시작 후에도 한도가 이어짐
+    cooldowns = Cooldowns(default=[policy], store=SqliteStore(path, evict_every=2))
+    assert cooldowns.check('top', USER, CHAT, now=30) == pytest.approx(30)
+    assert cooldowns.check('top', USER + 1, CHAT, now=30) == 0
+    assert cooldowns.check('top', USER + 2, CHAT, now=30) == 0
+    assert len(cooldowns.store) == 3
+
+    # evict_every번 쓴 뒤 만료된 항목(USER, 60초에 만료)을 지움
+    cooldowns.check('top', USER + 3, CHAT, now=70)
+    assert len(cooldowns.store) == 3
+    assert cooldowns.check('top', USER, CHAT, now=70) == 0
+    cooldowns.close()
@@ -0,0 +1,149 @@
+import asyncio
+import random
+import time
+
+import pytest
+
+from fetcher import FetchError, PageFetcher, TokenBucket
+
+
+class Clock:
+    def __init__(self):
+        self.now = 100.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(time, 'monotonic', clock)
+    return clock
+
+
+@pytest.fixture
+def sleeps(monkeypatch):
+    """asyncio.sleep 대신 요청한 대기 시간만 기록 (지터는 최대값으로 고정)"""
+    delays = []
+    real_sleep = asyncio.sleep
+
+    async def sleep(delay):
+        delays.append(delay)
+        await real_sleep(0)
+
+    monkeypatch.setattr(asyncio, 'sleep', sleep)
+    monkeypatch.setattr(random, 'uniform', lambda low, high: high)
+    return delays
+
+
+def test_bucket_refills_at_rate(clock):
+    bucket = TokenBucket(2, capacity=3)
+    assert [bucket.try_acquire() for _ in range(4)] == [True, True, True, False]
+    assert bucket.wait_time() == pytest.approx(0.5)
+
+    clock.now += 0.25
+    assert bucket.wait_time() == pytest.approx(0.25)
+    assert not bucket.try_acquire()
+
+    # 오래 쉬어도 capacity까지만 참
+    clock.now += 60
+    assert [bucket.try_acquire() for _ in range(4)] == [True, True, True, False]
+
+
+def test_bucket_slows_down_and_recovers(clock):
+    bucket = TokenBucket(4)
+    bucket.slow_down()
+    bucket.slow_down()
+    assert bucket.rate == 1
+    for _ in range(100):
+        bucket.speed_up(step=0.5)
+    assert bucket.rate == 4
+
+    for _ in range(100):
+        bucket.slow_down()
+    assert bucket.rate == pytest.approx(0.1)
+
+
+def responder(statuses, page_size=3):
+    """statuses의 응답 코드를 차례로 돌려주고, 다 쓰면 200과 블록 내림차순 페이지를 돌려줌"""
+    statuses = list(statuses)
+    requests = []
+
+    async def fetch_page(page):
+        requests.append(page)
+        if statuses:
+            return statuses.pop(0), []
+        newest = 1000 - (page - 1) * page_size
+        return 200, [{'blockNumber': str(block)} for block in range(newest, newest - page_size, -1)]
+
+    return fetch_page, requests
+
+
+@pytest.mark.parametrize('status', [429, 500, 503, None])
+def test_retryable_status_backs_off_exponentially(sleeps, status):
+    fetch_page, requests = responder([status] * 3)
+    fetcher = PageFetcher(fetch_page, rate=1000, base_backoff=1.0, max_backoff=3.0)
+    transfers = asyncio.run(fetcher.fetch(1))
+
+    assert [t['blockNumber'] for t in transfers] == ['1000', '999', '998']
+    assert requests == [1] * 4
+    assert sleeps == [1.0, 2.0, 3.0]  # 두 배씩 늘리되 max_backoff에서 멈춤
+    assert fetcher.page_size == 3
+
+
+def test_rate_limited_response_slows_the_bucket(sleeps):
+    fetch_page, _ = responder([429, 429])
+    fetcher = PageFetcher(fetch_page, rate=1000, base_backoff=0)
+    asyncio.run(fetcher.fetch(1))
+    # 429마다 절반으로 줄이고, 성공하면 조금 회복
+    assert fetcher.bucket.rate == pytest.approx(250.1)
+
+
+def test_server_errors_do_not_slow_the_bucket(sleeps):
+    fetch_page, _ = responder([500, 502])
+    fetcher = PageFetcher(fetch_page, rate=1000, base_backoff=0)
+    asyncio.run(fetcher.fetch(1))
+    assert fetcher.bucket.rate == 1000
+
+
+def test_gives_up_after_max_retries(sleeps):
+    fetch_page, requests = responder([503] * 10)
+    fetcher = PageFetcher(fetch_page, rate=1000, max_retries=2, base_backoff=0)
+    with pytest.raises(FetchError):
+        asyncio.run(fetcher.fetch(1))
+    assert len(requests) == 3
+
+
+def test_client_error_is_not_retried(sleeps):
+    fetch_page, requests = responder([404])
+    fetcher = PageFetcher(fetch_page, rate=1000)
+    assert asyncio.run(fetcher.fetch(1)) is None
+    assert requests == [1]
+    assert sleeps == []
+
+
+def test_pages_come_back_in_order_and_stop_at_block():
+    fetch_page, requests = responder([])
+    fetcher = PageFetcher(fetch_page, concurrency=4, rate=1000)
+
+    async def collect():
+        return [page async for page, _ in fetcher.fetch_pages(stop_block=990)]
+
+    # 4페이지(989..987)에서 990 이하 블록이 처음 나오므로 거기까지만 반환
+    assert asyncio.run(collect()) == [1, 2, 3, 4]
+    assert max(requests) <= 4 + fetcher.concurrency
+
+
+def test_pages_use_cache_before_requesting():
+    fetch_page, requests = responder([])
+    fetcher = PageFetcher(fetch_page, concurrency=1, rate=1000)
+    fetcher.cache[1] = [{'blockNumber': '2000'}] * 3
+
+    async def collect():
+        return [transfers async for _, transfers in fetcher.fetch_pages(stop_block=995)]
+
+    pages = asyncio.run(collect())
+    assert pages[0][0]['blockNumber'] == '2000'
+    assert 1 not in requests
+    assert fetcher.cache == {}
@@ -0,0 +1,30 @@
+import asyncio
+
+from aiohttp import web
+
+import http_client
+from http_client import HttpClient
+
+
+def test_non_json_200_is_an_upstream_error():
+    async def main():
+        async def handler(request):
+            return web.Response(text='<html>maintenance</html>', content_type='text/html')
+
+        app = web.Application()
+        app.router.add_get('/prices', handler)
+        runner = web.AppRunner(app)
+        await runner.setup()
+        site = web.TCPSite(runner, '127.0.0.1', 0)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+        http = HttpClient()
+        try:
+            before = http_client.UPSTREAM_RESPONSES.value(host='127.0.0.1', status='invalid_json')
+            assert await http.get_json(f"http://127.0.0.1:{port}/prices") == (None, None)
+            assert http_client.UPSTREAM_RESPONSES.value(host='127.0.0.1', status='invalid_json') == before + 1
+        finally:
+            await http.close()
+            await runner.cleanup()
+
+    asyncio.run(main())
@@ -0,0 +1,251 @@
+import asyncio
+from datetime import datetime, timedelta
+
+import pytest
+
+from fetcher import PageFetcher
+from ingestion import SYNC_INCOMPLETE, IngestionWorker, sync_transfers
+from transfer_store import TransferStore, open_store, transfer_from_api
+
+START_BLOCK = 1000
+PAGE_SIZE = 5
+
+
+def api_transfer(block, index, amount=1):
+    return {
+        'blockNumber': str(block),
+        'parentHash': f"0x{block:032x}{index:032x}",
+        'fromAddress': f"0x{index % 7:040x}",
+        'toAddress': f"0x{index % 5 + 100:040x}",
+        'amount': str(amount * 10**18),
+        'decimals': 18,
+        'logIndex': index
+    }
+
+
+class FakeUpstream:
+    """최신순 전송 목록을 PAGE_SIZE씩 나눠 주는 API. failures로 페이지별 응답 코드를 바꿀 수 있음"""
+
+    def __init__(self, transfers):
+        self.transfers = sorted(transfers, key=lambda t: int(t['blockNumber']), reverse=True)
+        self.failures = {}
+        self.on_fetch = None
+        self.requests = []
+
+    def add(self, transfers):
+        self.transfers = sorted(self.transfers + transfers, key=lambda t: int(t['blockNumber']), reverse=True)
+
+    async def fetch_page(self, page):
+        self.requests.append(page)
+        if self.on_fetch is not None:
+            self.on_fetch(page)
+        status = self.failures.get(page, 200)
+        if status != 200:
+            return status, []
+        start = (page - 1) * PAGE_SIZE
+        return 200, [dict(transfer) for transfer in self.transfers[start:start + PAGE_SIZE]]
+
+
+def blocks(first, last, per_block=3):
+    return [api_transfer(block, block * 10 + i) for block in range(first, last + 1) for i in range(per_block)]
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = TransferStore(str(tmp_path / 'transfers.db'))
+    yield store
+    store.close()
+
+
+def sync(upstream, store, confirmations=3):
+    fetcher = PageFetcher(upstream.fetch_page, concurrency=2, rate=10_000, base_backoff=0)
+    return asyncio.run(sync_transfers(fetcher, store, START_BLOCK, confirmations=confirmations))
+
+
+def stored_keys(store):
+    return sorted((t['parent_hash'], t['log_index']) for t in store.iter_new_transfers(0))
+
+
+def upstream_keys(upstream):
+    return sorted((t['parentHash'], t['logIndex']) for t in upstream.transfers
+                  if int(t['blockNumber']) > START_BLOCK)
+
+
+def test_backfill_then_sync_picks_up_new_transfers(store):
+    upstream = FakeUpstream(blocks(START_BLOCK - 2, START_BLOCK + 10))
+    assert sync(upstream, store) == 30
+    upstream.add(blocks(START_BLOCK + 11, START_BLOCK + 12))
+    assert sync(upstream, store) == 6
+    assert stored_keys(store) == upstream_keys(upstream)
+    assert store.last_removal() == 0
+    assert store.get_meta('sync_cursor')['block'] == START_BLOCK + 12
+
+
+@pytest.mark.parametrize('failure', [404, 'empty_first'])
+def test_truncated_read_keeps_rows_and_cursor(store, failure):
+    upstream = FakeUpstream(blocks(START_BLOCK - 2, START_BLOCK + 10))
+    sync(upstream, store)
+    cursor = store.get_meta('sync_cursor')
+    count = store.count()
+
+    # 구간(커서 - 10블록)이 여러 페이지에 걸치는데 중간 페이지가 4xx이거나 첫 페이지가 비어 있음
+    if failure == 404:
+        upstream.failures[2] = 404
+    else:
+        upstream.transfers, hidden = [], upstream.transfers
+    sync(upstream, store, confirmations=10)
+
+    assert store.count() == count
+    assert store.last_removal() == 0
+    assert store.get_meta('sync_cursor') == cursor
+
+    # API가 돌아오면 그대로 이어서 동기화
+    upstream.failures.clear()
+    if failure != 404:
+        upstream.transfers = hidden
+    upstream.add(blocks(START_BLOCK + 11, START_BLOCK + 11))
+    assert sync(upstream, store, confirmations=10) == 3
+    assert stored_keys(store) == upstream_keys(upstream)
+    assert store.last_removal() == 0
+
+
+def test_truncated_backfill_leaves_no_cursor(store):
+    upstream = FakeUpstream(blocks(START_BLOCK - 2, START_BLOCK + 10))
+    upstream.failures[3] = 404
+    sync(upstream, store)
+    assert store.get_meta('sync_cursor') is None
+
+    upstream.failures.clear()
+    sync(upstream, store)
+    assert stored_keys(store) == upstream_keys(upstream)
+    assert store.get_meta('sync_cursor')['block'] == START_BLOCK + 10
+
+
+def test_truncated_backfill_resumes_after_restart(tmp_path):
+    path = str(tmp_path / 'transfers.db')
+    upstream = FakeUpstream(blocks(START_BLOCK - 2, START_BLOCK + 10))
+    upstream.failures[3] = 404
+    store = open_store(path)
+    sync(upstream, store)
+    assert store.count() == 10
+    store.close()
+
+    # 재시작해도 백필이 끝나지 않은 스토어에 커서를 만들지 않고, 다음 수집에서 나머지를 채움
+    store = open_store(path)
+    assert store.get_meta('sync_cursor') is None
+    upstream.failures.clear()
+    sync(upstream, store)
+    assert stored_keys(store) == upstream_keys(upstream)
+    assert store.get_meta('sync_cursor')['block'] == START_BLOCK + 10
+    store.close()
+
+
+@pytest.mark.parametrize('count', [4, PAGE_SIZE, PAGE_SIZE + 2])
+def test_short_history_is_complete(store, count):
+    # 이력 전체가 start_block 이후이고 마지막 페이지가 짧거나 (정확히 한 페이지면) 다음 페이지가 비어 있음
+    upstream = FakeUpstream([api_transfer(START_BLOCK + 1 + i, i) for i in range(count)])
+    incomplete = SYNC_INCOMPLETE.value()
+    assert sync(upstream, store) == count
+    assert store.get_meta('sync_cursor')['block'] == START_BLOCK + count
+
+    upstream.requests.clear()
+    upstream.add([api_transfer(START_BLOCK + 100, 100)])
+    assert sync(upstream, store) == 1
+    assert stored_keys(store) == upstream_keys(upstream)
+    assert SYNC_INCOMPLETE.value() == incomplete
+    assert max(upstream.requests) <= 2
+
+
+def test_known_page_size_stops_at_short_page(store):
+    upstream = FakeUpstream([api_transfer(START_BLOCK + 1 + i, i) for i in range(3)])
+    fetcher = PageFetcher(upstream.fetch_page, concurrency=1, rate=10_000, base_backoff=0)
+    fetcher.page_size = PAGE_SIZE
+    assert asyncio.run(sync_transfers(fetcher, store, START_BLOCK)) == 3
+    assert upstream.requests == [1, 1]  # 첫 페이지와 저장 전 확인 요청만
+    assert store.get_meta('sync_cursor')['block'] == START_BLOCK + 3
+
+
+def test_empty_history_creates_no_cursor(store):
+    upstream = FakeUpstream([])
+    incomplete = SYNC_INCOMPLETE.value()
+    assert sync(upstream, store) == 0
+    assert store.get_meta('sync_cursor') is None
+    assert SYNC_INCOMPLETE.value() == incomplete
+
+
+def test_page_shift_during_read(store):
+    upstream = FakeUpstream(blocks(START_BLOCK - 2, START_BLOCK + 10))
+    sync(upstream, store)
+
+    # 2페이지를 읽은 직후 새 전송이 생겨 뒤 페이지 행이 밀림
+    def shift(page):
+        if page == 2 and upstream.on_fetch is not None:
+            upstream.on_fetch = None
+            upstream.add(blocks(START_BLOCK + 11, START_BLOCK + 11, per_block=2))
+
+    upstream.on_fetch = shift
+    sync(upstream, store, confirmations=10)
+    assert upstream.on_fetch is None
+    assert store.last_removal() == 0
+
+    sync(upstream, store, confirmations=10)
+    assert stored_keys(store) == upstream_keys(upstream)
+    assert store.last_removal() == 0
+
+
+def test_reorg_removes_and_replaces_transfers(store):
+    upstream = FakeUpstream(blocks(START_BLOCK - 2, START_BLOCK + 10))
+    sync(upstream, store)
+    seqs = {(t['parent_hash'], t['log_index']): t['seq'] for t in store.iter_new_transfers(0)}
+
+    # 최근 블록의 전송 하나가 사라지고, 하나는 금액이 바뀜
+    gone = upstream.transfers.pop(1)
+    changed = upstream.transfers[2]
+    changed['amount'] = str(5 * 10**18)
+    sync(upstream, store)
+
+    removed = {seq for _, seq in store.removed_since(0)}
+    assert removed == {seqs[(gone['parentHash'], gone['logIndex'])],
+                       seqs[(changed['parentHash'], changed['logIndex'])]}
+    assert stored_keys(store) == upstream_keys(upstream)
+    amounts = {t['parent_hash']: t['amount'] for t in store.iter_new_transfers(0)}
+    assert amounts[changed['parentHash']] == 5
+
+
+def test_stale_snapshot_is_returned_without_waiting_for_refresh():
+    async def main():
+        release = asyncio.Event()
+        calls = []
+
+        async def save_transfers():
+            calls.append(1)
+            await release.wait()  # API가 느리거나 멈춘 상태
+            return 1
+
+        async def update_rankings():
+            return [{'address': '0x1'}]
+
+        worker = IngestionWorker(save_transfers, update_rankings, interval=30, fresh_for=60)
+        stale = await worker.prime()
+        stale['last_updated'] = datetime.now() - timedelta(seconds=120)
+
+        # 오래된 snapshot은 바로 반환하고, 갱신은 백그라운드에서 하나만 시작
+        assert await asyncio.wait_for(worker.get_snapshot(), 0.1) is stale
+        assert await asyncio.wait_for(worker.get_snapshot(), 0.1) is stale
+        await asyncio.sleep(0)
+        assert len(calls) == 1
+
+        release.set()
+        await worker._background
+        assert (await worker.get_snapshot()) is not stale
+
+    asyncio.run(main())
+
+
+def test_transaction_types_are_set_per_log_index(store):
+    # 같은 거래 안에서 (from, to)가 같은 전송이 두 번 있어도 유형은 행마다 따로 저장
+    legs = [transfer_from_api(api_transfer(START_BLOCK + 1, 0)) for _ in range(2)]
+    legs[0]['log_index'], legs[1]['log_index'] = 0, 1
+    store.upsert_transfers(legs)
+    store.set_transaction_types([(legs[0]['parent_hash'], legs[0]['from_address'], legs[0]['to_address'], 1, 'sell')])
+    assert [t['transaction_type'] for t in store.iter_new_transfers(0)] == [None, 'sell']
@@ -0,0 +1,91 @@
+import asyncio
+import math
+
+import pytest
+
+from fetcher import PageFetcher
+from page_locator import PageLocator
+
+PAGE_SIZE = 5
+
+
+class BlockPages:
+    """블록마다 전송 하나가 있는 이력을 최신순 PAGE_SIZE씩 나눠 주는 API"""
+
+    def __init__(self, newest, oldest=1):
+        self.newest = newest
+        self.oldest = oldest
+        self.requests = []
+
+    async def fetch_page(self, page):
+        self.requests.append(page)
+        top = self.newest - (page - 1) * PAGE_SIZE
+        return 200, [{'blockNumber': str(block)} for block in range(top, max(self.oldest - 1, top - PAGE_SIZE), -1)]
+
+    def expected_page(self, block):
+        """block 이하 블록이 처음 나오는 페이지 (전체를 훑어서 구한 정답)"""
+        block = max(block, self.oldest - 1)
+        return max(1, math.ceil((self.newest + 1 - block) / PAGE_SIZE))
+
+
+def locator_for(upstream):
+    return PageLocator(PageFetcher(upstream.fetch_page, concurrency=1, rate=10_000, base_backoff=0))
+
+
+@pytest.mark.parametrize('block', [1000, 996, 995, 950, 777, 501, 5, 1])
+def test_find_page_matches_linear_scan(block):
+    upstream = BlockPages(1000)
+    locator = locator_for(upstream)
+    assert asyncio.run(locator.find_page(block)) == upstream.expected_page(block)
+    # 200페이지 이력에서 갤럽 + 이분 탐색은 대략 2 * log2(200)번 안에 끝남
+    assert locator.probes <= 2 * math.ceil(math.log2(200)) + 1
+
+
+def test_block_newer_than_history_is_first_page():
+    upstream = BlockPages(1000)
+    locator = locator_for(upstream)
+    assert asyncio.run(locator.find_page(5000)) == 1
+    assert upstream.requests == [1]
+
+
+def test_block_older_than_history_ends_at_empty_page():
+    # 가장 오래된 블록보다 이전을 찾으면 이력 끝 다음의 빈 페이지를 반환
+    upstream = BlockPages(1000, oldest=901)
+    locator = locator_for(upstream)
+    page = asyncio.run(locator.find_page(10))
+    assert page == 21
+    assert locator.ranges[page] is None
+    assert locator.ranges[page - 1] == (905, 901)
+
+
+def test_probed_pages_are_cached_and_known_ranges_are_reused():
+    upstream = BlockPages(1000)
+    locator = locator_for(upstream)
+    asyncio.run(locator.find_page(700))
+    assert set(locator.fetcher.cache) == set(locator.ranges)
+
+    # 같은 범위를 다시 찾을 때는 요청하지 않음
+    requests = len(upstream.requests)
+    assert asyncio.run(locator.find_page(700)) == upstream.expected_page(700)
+    assert len(upstream.requests) == requests
+
+    locator.clear_pages()
+    assert locator.fetcher.cache == {}
+    assert locator.ranges
+
+
+@pytest.mark.parametrize('new_blocks', [3, PAGE_SIZE, 4 * PAGE_SIZE + 2])
+def test_stale_ranges_never_skip_past_the_block(new_blocks):
+    upstream = BlockPages(1000)
+    locator = locator_for(upstream)
+    asyncio.run(locator.find_page(700))
+    locator.clear_pages()
+
+    # 새 전송이 생겨 기존 전송이 뒤 페이지로 밀렸지만 예전 범위는 그대로 남아 있음
+    upstream.newest += new_blocks
+    for block in (900, 700, 650):
+        page = asyncio.run(locator.find_page(block))
+        expected = upstream.expected_page(block)
+        # 오래된 범위를 써도 실제보다 앞 페이지를 고를 뿐, 찾는 블록을 지나치지는 않음
+        assert page <= expected
+        assert expected - page <= math.ceil(new_blocks / PAGE_SIZE)
@@ -0,0 +1,164 @@
+import random
+
+import pytest
+
+from ranking_batch import compute_rankings
+from ranking_engine import RankingEngine
+from rollups import VolumeRollups
+from tx_flows import reconstruct
+
+SWAPS = ['0xpool0', '0xpool1', '0xpool2', '0xagg']
+WALLETS = [f"0xwallet{i}" for i in range(20)]
+
+
+def make_transfers(rng, n_tx, descending=False):
+    """멀티홉 스왑(애그리게이터 경유)과 단순 전송이 섞인 전송 목록. descending이면 최신 블록부터 (백필 순서)"""
+    txs = []
+    block = 1000
+    for t in range(n_tx):
+        block += rng.choice([0, 0, 1, 2, 30])
+        wallet = rng.choice(WALLETS)
+        kind = rng.random()
+        if kind < 0.35:
+            path = [rng.choice(SWAPS[:3]), '0xagg', wallet]
+        elif kind < 0.65:
+            path = [wallet, '0xagg', rng.choice(SWAPS[:3])]
+        elif kind < 0.85:
+            path = [rng.choice(SWAPS[:3]), wallet]
+        else:
+            path = [wallet, rng.choice(WALLETS)]
+        amount = float(rng.randint(1, 1000))
+        txs.append([
+            {'block_number': block, 'parent_hash': f"0x{t:064x}", 'from_address': a, 'to_address': b,
+             'amount': amount, 'log_index': i, 'transaction_type': None}
+            for i, (a, b) in enumerate(zip(path, path[1:]))
+        ])
+    if descending:
+        txs.reverse()
+    rows = [row for tx in txs for row in tx]
+    for seq, row in enumerate(rows, 1):
+        row['seq'] = seq
+    return rows
+
+
+def expected(rows, swap_addresses):
+    """전체 이력을 parent hash별로 묶어 처음부터 다시 계산한 (지갑 통계, 거래량 집계)"""
+    groups = {}
+    for row in sorted(rows, key=lambda row: row['seq']):
+        groups.setdefault(row['parent_hash'], []).append(row)
+    stats = {}
+    rollups = VolumeRollups()
+    for group in groups.values():
+        trades, _ = reconstruct(group, swap_addresses)
+        for wallet, side, amount, router in trades:
+            stats.setdefault(wallet, {'buy': 0, 'sell': 0, 'order': group[0]['seq']})[side] += amount
+            rollups.add(group[0]['block_number'], side, wallet, router, amount)
+    return stats, rollups
+
+
+def state(stats, rollups):
+    stats = {address: (round(s['buy'], 6), round(s['sell'], 6), s['order']) for address, s in stats.items()}
+    buckets = {
+        bucket_id: (round(b.buy, 6), round(b.sell, 6), b.buys, b.sells, dict(b.buyers),
+                    {router: tuple(round(v, 6) for v in volumes) for router, volumes in b.routers.items()})
+        for bucket_id, b in rollups._buckets.items()
+    }
+    return stats, buckets
+
+
+def assert_matches(engine, rows):
+    assert state(engine.wallet_stats, engine.rollups) == state(*expected(rows, engine.swap_addresses))
+    stats = engine.wallet_stats
+    ranked = sorted(stats, key=lambda a: (-(stats[a]['buy'] - stats[a]['sell']), stats[a]['order'], a))
+    assert [entry['address'] for entry in engine.rankings()] == ranked
+
+
+def apply_in_batches(engine, rng, rows):
+    changed = []
+    i = 0
+    while i < len(rows):
+        j = i + rng.randint(1, 40)
+        changed += engine.apply([dict(row) for row in rows[i:j]])
+        i = j
+    return changed
+
+
+@pytest.mark.parametrize('descending', [False, True])
+@pytest.mark.parametrize('seed', range(5))
+def test_incremental_matches_full_recompute(seed, descending):
+    rng = random.Random(seed)
+    rows = make_transfers(rng, 300, descending)
+    swaps = set(rng.sample(SWAPS, rng.randint(1, 4)))
+
+    bulk = RankingEngine(swaps, 0)
+    bulk.apply_bulk(dict(row) for row in rows)
+    assert_matches(bulk, rows)
+
+    # 한 트랜잭션의 전송이 여러 번의 apply()에 나뉘어 들어와도 같은 결과
+    engine = RankingEngine(swaps, 0)
+    apply_in_batches(engine, rng, rows)
+    assert_matches(engine, rows)
+
+    new_swaps = set(rng.sample(SWAPS, rng.randint(1, 4)))
+    engine.set_swap_addresses(new_swaps)
+    assert_matches(engine, rows)
+
+    removed = {row['seq'] for row in rng.sample(rows, 20)}
+    engine.revert([(i + 1, seq) for i, seq in enumerate(sorted(removed))])
+    assert_matches(engine, [row for row in rows if row['seq'] not in removed])
+
+
+def test_aggregator_leg_is_not_credited():
+    tx_hash = '0x' + '01' * 32
+    rows = [
+        {'seq': 1, 'block_number': 10, 'parent_hash': tx_hash, 'from_address': '0xpool0', 'to_address': '0xagg',
+         'amount': 50.0, 'log_index': 0, 'transaction_type': None},
+        {'seq': 2, 'block_number': 10, 'parent_hash': tx_hash, 'from_address': '0xagg', 'to_address': '0xwallet0',
+         'amount': 50.0, 'log_index': 1, 'transaction_type': None},
+        {'seq': 3, 'block_number': 10, 'parent_hash': tx_hash, 'from_address': '0xwallet0', 'to_address': '0xwallet1',
+         'amount': 0.0, 'log_index': 2, 'transaction_type': 'skip'},
+    ]
+    engine = RankingEngine(['0xpool0'], 0)
+    assert engine.apply([rows[0]]) == [(tx_hash, '0xpool0', '0xagg', 0, 'buy')]
+
+    # 나머지 전송이 들어오면 다시 묶어 애그리게이터 대신 지갑이 매수. 유형이 실제로 바뀐 행만 반환
+    assert engine.apply(rows[1:]) == [
+        (tx_hash, '0xpool0', '0xagg', 0, 'skip'), (tx_hash, '0xagg', '0xwallet0', 1, 'buy')
+    ]
+    assert engine.rankings() == [{'address': '0xwallet0', 'net_purchase': 50.0, 'buy': 50.0, 'sell': 0}]
+
+
+def test_stored_types_are_not_reported_again():
+    rng = random.Random(1)
+    rows = make_transfers(rng, 200)
+    engine = RankingEngine(SWAPS[:3], 0)
+    changed = apply_in_batches(engine, rng, rows)
+    types = {}
+    for parent_hash, _, _, log_index, tx_type in changed:
+        types[(parent_hash, log_index)] = tx_type
+    for row in rows:
+        row['transaction_type'] = types.get((row['parent_hash'], row['log_index']))
+
+    # 저장된 유형 그대로 다시 반영하면 바뀐 행이 없음
+    again = RankingEngine(SWAPS[:3], 0)
+    assert again.apply_bulk(dict(row) for row in rows) == []
+
+
+@pytest.mark.parametrize('seed', range(5))
+def test_vectorized_bulk_matches_transaction_loop(seed):
+    rng = random.Random(seed)
+    rows = make_transfers(rng, 300, descending=seed % 2 == 1)
+    swaps = set(rng.sample(SWAPS, rng.randint(1, 4)))
+
+    vectorized = RankingEngine(swaps, 0)
+    vectorized_types = vectorized.apply_bulk(dict(row) for row in rows)
+    loop = RankingEngine(swaps, 0)
+    loop_types = loop.apply((dict(row) for row in rows), bulk=True)
+
+    assert vectorized.wallet_stats == loop.wallet_stats
+    assert vectorized.rankings() == loop.rankings()
+    assert state(vectorized.wallet_stats, vectorized.rollups) == state(loop.wallet_stats, loop.rollups)
+    assert sorted(vectorized_types) == sorted(loop_types)
+    assert list(vectorized.table.tx_type) == list(loop.table.tx_type)
+    assert compute_rankings(vectorized.table, swaps) == vectorized.rankings()
+    assert compute_rankings(vectorized.table, swaps, top_n=5) == vectorized.top(5)
@@ -0,0 +1,31 @@
+from render_cache import RenderCache
+
+
+def test_same_version_reuses_message():
+    cache = RenderCache()
+    calls = []
+
+    def render():
+        calls.append(1)
+        return 'message'
+
+    assert cache.get('moodeng', 1, 'top', render) == 'message'
+    assert cache.get('moodeng', 1, 'top', render) == 'message'
+    assert len(calls) == 1
+
+    # 버전이 바뀌면 다시 만듦
+    cache.get('moodeng', 2, 'top', render)
+    assert len(calls) == 2
+
+
+def test_entries_per_name_are_bounded():
+    cache = RenderCache(max_entries=3)
+    for key in range(3):
+        cache.get('moodeng', 1, key, lambda key=key: f"message {key}")
+    cache.get('moodeng', 1, 0, lambda: 'rendered again')  # 0을 최근에 쓴 키로 만듦
+    cache.get('moodeng', 1, 3, lambda: 'message 3')
+
+    # 가장 오래 안 쓴 키(1)만 버려짐
+    assert cache.get('moodeng', 1, 0, lambda: 'rendered again') == 'message 0'
+    assert cache.get('moodeng', 1, 1, lambda: 'rendered again') == 'rendered again'
+    assert len(cache._entries['moodeng'][1]) == 3
@@ -0,0 +1,138 @@
+import asyncio
+import time
+from datetime import timedelta
+
+import pytest
+from telegram.error import BadRequest, NetworkError, RetryAfter
+
+from send_queue import BROADCAST, MAX_MESSAGE_LENGTH, REPLY, SendQueue
+
+CHAT = 42
+GROUP = -100
+
+
+class FakeBot:
+    """보낸 메시지를 기록하는 send_message. errors에 넣은 예외를 차례로 한 번씩 던짐"""
+
+    def __init__(self):
+        self.sent = []
+        self.errors = []
+        self.calls = 0
+
+    async def send_message(self, chat_id, text, **kwargs):
+        self.calls += 1
+        if self.errors:
+            raise self.errors.pop(0)
+        self.sent.append((chat_id, text, time.monotonic()))
+        return f"message {len(self.sent)}"
+
+
+def fast_queue(**kwargs):
+    # 속도 제한이 테스트 시간을 잡아먹지 않도록 한도를 넉넉하게
+    options = dict(global_rate=10_000, private_rate=10_000, group_per_minute=600_000, base_backoff=0.01)
+    options.update(kwargs)
+    return SendQueue(**options)
+
+
+def run(queue, bot, submit):
+    """submit(queue)로 메시지를 넣은 뒤 전송을 시작하고, 모든 Future의 결과를 반환"""
+    async def main():
+        futures = submit(queue)
+        queue.start(bot.send_message)
+        try:
+            return await asyncio.wait_for(asyncio.gather(*futures, return_exceptions=True), 5)
+        finally:
+            await queue.stop(timeout=0)
+
+    return asyncio.run(main())
+
+
+def test_replies_go_before_queued_broadcasts():
+    queue, bot = fast_queue(), FakeBot()
+    run(queue, bot, lambda q: [
+        q.submit(CHAT, 'notice 1', lane=BROADCAST),
+        q.submit(CHAT, 'notice 2', lane=BROADCAST),
+        q.submit(CHAT, 'reply', lane=REPLY)
+    ])
+    # 같은 레인 안에서는 넣은 순서를 지킴
+    assert [text for _, text, _ in bot.sent] == ['reply', 'notice 1', 'notice 2']
+    assert queue.pending() == 0
+
+
+def test_batched_broadcasts_are_merged():
+    queue, bot = fast_queue(), FakeBot()
+    results = run(queue, bot, lambda q: [
+        q.submit(CHAT, 'a', lane=BROADCAST, batch=True),
+        q.submit(CHAT, 'b', lane=BROADCAST, batch=True),
+        q.submit(CHAT, 'c', lane=BROADCAST, batch=True, parse_mode='HTML'),  # 형식이 달라 따로 보냄
+        q.submit(CHAT, 'd', lane=BROADCAST)  # batch가 아니라 따로 보냄
+    ])
+    assert [text for _, text, _ in bot.sent] == ["a\n\nb", 'c', 'd']
+    # 묶인 메시지의 Future는 같은 전송 결과를 받음
+    assert results == ['message 1', 'message 1', 'message 2', 'message 3']
+    assert queue.depth == [0, 0]
+
+
+def test_batch_respects_message_length():
+    queue, bot = fast_queue(), FakeBot()
+    long_text = 'x' * (MAX_MESSAGE_LENGTH - 10)
+    run(queue, bot, lambda q: [
+        q.submit(CHAT, long_text, lane=BROADCAST, batch=True),
+        q.submit(CHAT, 'y' * 10, lane=BROADCAST, batch=True)
+    ])
+    assert [len(text) for _, text, _ in bot.sent] == [MAX_MESSAGE_LENGTH - 10, 10]
+
+
+def test_retry_after_pauses_the_chat_without_using_a_retry():
+    queue, bot = fast_queue(max_retries=0), FakeBot()
+    bot.errors = [RetryAfter(timedelta(seconds=0.2))]
+    started = time.monotonic()
+    results = run(queue, bot, lambda q: [q.submit(CHAT, 'first'), q.submit(CHAT, 'second')])
+
+    # 재시도 한도가 0이어도 RetryAfter는 실패로 치지 않고, 알려준 시간이 지난 뒤 순서대로 보냄
+    assert results == ['message 1', 'message 2']
+    assert [text for _, text, _ in bot.sent] == ['first', 'second']
+    assert bot.sent[0][2] - started >= 0.2
+
+
+def test_retry_after_does_not_block_other_chats():
+    queue, bot = fast_queue(), FakeBot()
+    bot.errors = [RetryAfter(timedelta(seconds=0.3))]
+    run(queue, bot, lambda q: [q.submit(CHAT, 'blocked'), q.submit(GROUP, 'other chat')])
+    assert [text for _, text, _ in bot.sent] == ['other chat', 'blocked']
+
+
+def test_network_errors_are_retried_then_fail():
+    queue, bot = fast_queue(max_retries=2), FakeBot()
+    bot.errors = [NetworkError('down')] * 3
+    results = run(queue, bot, lambda q: [q.submit(CHAT, 'lost'), q.submit(CHAT, 'next')])
+
+    # 첫 시도 + 재시도 2번 후 실패시키고 다음 메시지로 넘어감
+    assert isinstance(results[0], NetworkError)
+    assert results[1] == 'message 1'
+    assert bot.calls == 4
+
+
+def test_bad_request_fails_without_retry():
+    queue, bot = fast_queue(), FakeBot()
+    bot.errors = [BadRequest('chat not found')]
+    results = run(queue, bot, lambda q: [q.submit(CHAT, 'bad')])
+    assert isinstance(results[0], BadRequest)
+    assert bot.calls == 1
+    assert queue.pending() == 0
+
+
+@pytest.mark.parametrize('chat_id, expected', [(GROUP, 3), (CHAT, 1)])
+def test_chat_bucket_limits_burst(chat_id, expected):
+    # 그룹은 group_burst개까지, 개인 채팅은 1개까지 바로 보내고 나머지는 충전을 기다림
+    queue, bot = fast_queue(group_per_minute=60, group_burst=3, private_rate=1.0), FakeBot()
+
+    async def main():
+        queue.start(bot.send_message)
+        for i in range(5):
+            queue.submit(chat_id, f"message {i}")
+        await asyncio.sleep(0.2)
+        await queue.stop(timeout=0)
+
+    asyncio.run(main())
+    assert len(bot.sent) == expected
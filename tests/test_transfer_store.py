@@ -0,0 +1,50 @@
+import json
+
+from transfer_store import TransferStore, open_store
+
+
+def transfer(index, amount=1.0, tx_type=None):
+    return {
+        'parent_hash': f"0x{index:064x}", 'from_address': '0xpool', 'to_address': '0xwallet',
+        'amount': amount, 'block_number': 100 + index, 'transaction_type': tx_type, 'log_index': 0
+    }
+
+
+def test_upsert_counts_only_new_rows(tmp_path):
+    store = TransferStore(str(tmp_path / 'transfers.db'))
+    assert store.upsert_transfers([transfer(1)]) == 1
+    assert store.upsert_transfers([transfer(1)]) == 0
+    assert store.upsert_transfers([transfer(1, amount=2.0), transfer(2)]) == 1
+
+    # 이미 있던 행을 다시 upsert해도 seq는 그대로이고, 새 행만 다음 seq를 받음
+    assert store.last_seq() == 2
+    assert store.count() == 2
+    assert [(t['seq'], t['amount']) for t in store.iter_new_transfers(0)] == [(1, 2.0), (2, 1.0)]
+    store.close()
+
+
+def test_upsert_keeps_stored_type_and_last_duplicate(tmp_path):
+    store = TransferStore(str(tmp_path / 'transfers.db'))
+    store.upsert_transfers([transfer(1, tx_type='buy')])
+    assert store.upsert_transfers([transfer(1, amount=3.0), transfer(2), transfer(2, amount=5.0)]) == 1
+    rows = list(store.iter_new_transfers(0))
+    assert [(t['amount'], t['transaction_type']) for t in rows] == [(3.0, 'buy'), (5.0, None)]
+    store.close()
+
+
+def test_open_store_seeds_cursor_only_after_legacy_import(tmp_path):
+    legacy = tmp_path / 'transfers.json'
+    legacy.write_text(json.dumps({f"key{i}": transfer(i) for i in range(3)}))
+
+    store = open_store(str(tmp_path / 'imported.db'), str(legacy))
+    assert store.count() == 3
+    assert store.get_meta('sync_cursor') == {'block': 102}
+    store.close()
+
+    # 가져온 파일 없이 행만 있는 스토어(중간에 멈춘 백필)는 커서를 만들지 않음
+    store = open_store(str(tmp_path / 'partial.db'))
+    store.upsert_transfers([transfer(1)])
+    store.close()
+    store = open_store(str(tmp_path / 'partial.db'), str(tmp_path / 'missing.json'))
+    assert store.get_meta('sync_cursor') is None
+    store.close()
@@ -0,0 +1,46 @@
+import random
+
+import pytest
+
+from transfer_table import REMOVE_IN_PLACE, TransferTable
+
+
+def make_table(rng, n_rows):
+    table = TransferTable()
+    for seq in range(1, n_rows + 1):
+        table.append({
+            'seq': seq * 2, 'block_number': seq, 'amount': 1.0, 'log_index': seq % 3,
+            'parent_hash': f"0x{rng.randrange(n_rows // 3):064x}",
+            'from_address': f"0xwallet{rng.randrange(10)}", 'to_address': f"0xwallet{rng.randrange(10)}"
+        })
+    return table
+
+
+def scanned(table):
+    """테이블 전체를 훑어 만든 (트랜잭션별 행 번호, 지갑별 트랜잭션 집합)"""
+    tx_rows = {}
+    wallet_txs = {}
+    for row in range(len(table)):
+        parent_hash = table.hash_bytes(row)
+        tx_rows.setdefault(parent_hash, []).append(row)
+        for wallet_id in (table.from_id[row], table.to_id[row]):
+            wallet_txs.setdefault(wallet_id, set()).add(parent_hash)
+    return tx_rows, wallet_txs
+
+
+@pytest.mark.parametrize('removed', [1, REMOVE_IN_PLACE, REMOVE_IN_PLACE + 1, 200])
+def test_indexes_follow_removed_rows(removed):
+    rng = random.Random(removed)
+    table = make_table(rng, 300)
+    rows = rng.sample(range(len(table)), removed)
+    kept = [table.row(row) for row in range(len(table)) if row not in rows]
+    table.remove_rows(rows)
+
+    assert [table.row(row) for row in range(len(table))] == kept
+    tx_rows, wallet_txs = scanned(table)
+    assert {parent_hash: table.rows_of(parent_hash) for parent_hash in table.tx_seqs} == tx_rows
+    for wallet_id, hashes in wallet_txs.items():
+        assert table.txs_of([wallet_id]) == hashes
+    assert table.txs_of(range(10)) == set(tx_rows)
+    assert table.row_of(kept[0]['seq']) == 0
+    assert table.row_of(kept[0]['seq'] + 1) is None
@@ -0,0 +1,38 @@
+import asyncio
+
+from aiohttp.test_utils import make_mocked_request
+
+from webhook_server import SECRET_HEADER, WEBHOOK_UPDATES, WebhookServer
+
+
+class FakeApplication:
+    bot = None
+
+    def __init__(self):
+        self.update_queue = asyncio.Queue()
+
+
+def post(server, body):
+    async def read():
+        return body
+
+    request = make_mocked_request('POST', server.path, headers={SECRET_HEADER: server.secret_token})
+    request.read = read
+    return asyncio.run(server._handle(request))
+
+
+def test_non_object_body_is_rejected():
+    application = FakeApplication()
+    server = WebhookServer(application, 'https://example.com/telegram')
+    before = WEBHOOK_UPDATES.value(result='invalid')
+    for body in (b'[]', b'1', b'"update"', b'null', b'{'):
+        assert post(server, body).status == 400
+    assert WEBHOOK_UPDATES.value(result='invalid') == before + 5
+    assert application.update_queue.empty()
+
+
+def test_update_is_queued():
+    application = FakeApplication()
+    server = WebhookServer(application, 'https://example.com/telegram')
+    assert post(server, b'{"update_id": 7}').status == 200
+    assert application.update_queue.get_nowait().update_id == 7
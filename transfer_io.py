@@ -0,0 +1,122 @@
+"""전송 데이터 파일을 한 건씩 읽고 쓰기
+
+- .ndjson / .jsonl: 한 줄에 전송 한 건 (공백 없는 JSON)
+- .ndjson.gz / .jsonl.gz: 위 형식을 gzip으로 압축한 보관용 파일
+- .json: 예전 moodeng_transfers_*.json ({키: 전송} 객체, 읽기 전용). 증분 파서로 읽어 파일 전체를 올리지 않음
+
+어느 형식이든 메모리에는 읽는 중인 청크와 전송 한 건만 올라가므로 기록이 길어져도 사용량이 늘지 않는다.
+"""
+import gzip
+import json
+import re
+from atomic_io import atomic_open
+
+NDJSON_SUFFIXES = ('.ndjson', '.jsonl')
+WHITESPACE = ' \t\r\n'
+DELIMITER = re.compile(r'[,\]}\s]')
+
+
+class _JsonReader:
+    """텍스트 스트림에서 JSON 토큰을 청크 단위로 읽는 증분 파서"""
+
+    def __init__(self, f, chunk_size):
+        self.f = f
+        self.chunk_size = chunk_size
+        self.decoder = json.JSONDecoder()
+        self.buffer = ''
+        self.pos = 0
+        self.eof = False
+
+    def _read_more(self):
+        chunk = self.f.read(self.chunk_size)
+        if not chunk:
+            self.eof = True
+            return False
+        self.buffer = self.buffer[self.pos:] + chunk
+        self.pos = 0
+        return True
+
+    def peek(self):
+        """공백을 건너뛴 다음 문자. 파일 끝이면 None"""
+        while True:
+            while self.pos < len(self.buffer) and self.buffer[self.pos] in WHITESPACE:
+                self.pos += 1
+            if self.pos < len(self.buffer):
+                return self.buffer[self.pos]
+            if not self._read_more():
+                return None
+
+    def expect(self, chars):
+        char = self.peek()
+        if char is None or char not in chars:
+            raise json.JSONDecodeError(f"Expecting one of {chars!r}", self.buffer, self.pos)
+        self.pos += 1
+        return char
+
+    def value(self):
+        if self.peek() not in ('{', '[', '"'):
+            # 숫자나 true/false/null은 뒤에 구분자가 보여야 잘리지 않은 값
+            while not DELIMITER.search(self.buffer, self.pos) and self._read_more():
+                pass
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buffer, self.pos)
+            except json.JSONDecodeError:
+                # 값이 청크 경계에서 잘렸으면 더 읽고 다시 시도
+                if not self._read_more():
+                    raise
+                continue
+            self.pos = end
+            return value
+
+
+def iter_json_values(f, chunk_size=1 << 16):
+    """최상위가 객체면 값들을, 배열이면 원소들을 하나씩 반환"""
+    reader = _JsonReader(f, chunk_size)
+    opening = reader.expect('{[')
+    closing = '}' if opening == '{' else ']'
+    if reader.peek() == closing:
+        return
+    while True:
+        if opening == '{':
+            reader.value()  # 키는 버림
+            reader.expect(':')
+        yield reader.value()
+        if reader.expect(',' + closing) == closing:
+            return
+
+
+def _open_text(path):
+    if path.endswith('.gz'):
+        return gzip.open(path, 'rt', encoding='utf-8')
+    return open(path, 'r', encoding='utf-8')
+
+
+def _is_ndjson(path):
+    return path.removesuffix('.gz').endswith(NDJSON_SUFFIXES)
+
+
+def read_transfers(path):
+    """파일의 전송 데이터를 한 건씩 반환 (형식은 확장자로 판단)"""
+    with _open_text(path) as f:
+        if _is_ndjson(path):
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+        else:
+            yield from iter_json_values(f)
+
+
+def write_transfers(path, transfers, columns=None):
+    """전송 데이터를 NDJSON으로 씀 (.gz로 끝나면 압축). 쓴 건수를 반환"""
+    if not _is_ndjson(path):
+        raise ValueError(f"export path must end with {' or '.join(NDJSON_SUFFIXES)} (optionally .gz): {path}")
+    count = 0
+    with atomic_open(path, compress=path.endswith('.gz')) as f:
+        for transfer in transfers:
+            if columns is not None:
+                transfer = {column: transfer.get(column) for column in columns}
+            f.write(json.dumps(transfer, separators=(',', ':')))
+            f.write('\n')
+            count += 1
+    return count
@@ -0,0 +1,252 @@
+import sqlite3
+import json
+import os
+import sys
+import metrics
+from transfer_io import read_transfers, write_transfers
+
+STORE_IO_SECONDS = metrics.histogram('store_io_seconds', 'Transfer store and file I/O time', ('operation',))
+
+# 전송 데이터 테이블 스키마
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS transfers (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    parent_hash TEXT NOT NULL,
+    from_address TEXT NOT NULL,
+    to_address TEXT NOT NULL,
+    amount REAL NOT NULL,
+    block_number INTEGER NOT NULL,
+    transaction_type TEXT,
+    log_index INTEGER NOT NULL DEFAULT 0,
+    UNIQUE (parent_hash, from_address, to_address, log_index)
+);
+CREATE INDEX IF NOT EXISTS idx_transfers_block ON transfers (block_number);
+CREATE INDEX IF NOT EXISTS idx_transfers_from ON transfers (from_address);
+CREATE INDEX IF NOT EXISTS idx_transfers_to ON transfers (to_address);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+CREATE TABLE IF NOT EXISTS removed_transfers (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    seq INTEGER NOT NULL
+);
+"""
+
+# log_index가 없던 예전 테이블을 새 스키마로 옮김 (기존 rowid를 seq로 유지)
+# seq는 AUTOINCREMENT라 행을 삭제해도 다시 쓰이지 않으므로 순위 엔진의 high-water mark로 계속 쓸 수 있다.
+MIGRATE_LOG_INDEX = """
+ALTER TABLE transfers RENAME TO transfers_old;
+DROP INDEX IF EXISTS idx_transfers_block;
+DROP INDEX IF EXISTS idx_transfers_from;
+DROP INDEX IF EXISTS idx_transfers_to;
+{schema}
+INSERT INTO transfers (seq, parent_hash, from_address, to_address, amount, block_number, transaction_type)
+SELECT rowid, parent_hash, from_address, to_address, amount, block_number, transaction_type FROM transfers_old;
+DROP TABLE transfers_old;
+"""
+
+# 고유 키가 없을 때만 추가. ON CONFLICT/OR IGNORE는 기존 행이어도 seq(sqlite_sequence)를 증가시키므로 쓰지 않음
+INSERT_SQL = """
+INSERT INTO transfers (parent_hash, from_address, to_address, amount, block_number, transaction_type, log_index)
+SELECT :parent_hash, :from_address, :to_address, :amount, :block_number, :transaction_type, :log_index
+WHERE NOT EXISTS (
+    SELECT 1 FROM transfers
+    WHERE parent_hash = :parent_hash AND from_address = :from_address
+      AND to_address = :to_address AND log_index = :log_index
+)
+"""
+
+UPDATE_SQL = """
+UPDATE transfers SET
+    amount = :amount,
+    block_number = :block_number,
+    transaction_type = COALESCE(:transaction_type, transaction_type)
+WHERE parent_hash = :parent_hash AND from_address = :from_address
+  AND to_address = :to_address AND log_index = :log_index
+"""
+
+COLUMNS = ('parent_hash', 'from_address', 'to_address', 'amount', 'block_number', 'transaction_type', 'log_index')
+
+
+def transfer_from_api(transfer):
+    """klaytnscope API 응답의 전송 데이터 한 건을 스토어 행으로 변환
+
+    응답에 logIndex가 없으면 log_index는 None이며, 수집할 때 같은 거래 안의 순번으로 채운다.
+    """
+    log_index = transfer.get('logIndex')
+    return {
+        'from_address': transfer['fromAddress'].lower(),
+        'to_address': transfer['toAddress'].lower(),
+        'amount': int(transfer['amount']) / 10**int(transfer['decimals']),
+        'block_number': int(transfer['blockNumber']),
+        'parent_hash': transfer['parentHash'],  # parent hash도 저장
+        'log_index': None if log_index is None else int(log_index)
+    }
+
+
+class TransferStore:
+    """전송 데이터를 SQLite(WAL)에 저장. (parent_hash, from, to, log_index) 조합이 고유 키
+
+    업스트림에서 사라진 행(리오그)은 삭제하면서 removed_transfers에 seq를 기록해
+    순위 엔진이 이미 반영한 값을 되돌릴 수 있게 한다.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.conn = sqlite3.connect(path)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(SCHEMA)
+        columns = [row['name'] for row in self.conn.execute("PRAGMA table_info(transfers)")]
+        if 'seq' not in columns:
+            self.conn.executescript("BEGIN;" + MIGRATE_LOG_INDEX.format(schema=SCHEMA) + "COMMIT;")
+
+    def close(self):
+        self.conn.close()
+
+    def get_meta(self, key, default=None):
+        row = self.conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return json.loads(row[0]) if row else default
+
+    def set_meta(self, key, value):
+        with self.conn:
+            self.conn.execute(
+                "INSERT INTO meta (key, value) VALUES (?, ?) "
+                "ON CONFLICT (key) DO UPDATE SET value = excluded.value",
+                (key, json.dumps(value))
+            )
+
+    def upsert_transfers(self, transfers, batch_size=500):
+        """전송 목록을 배치 단위로 upsert. 새로 추가된 행 수를 반환 (이미 있던 행은 값만 갱신하고 세지 않음)"""
+        inserted = 0
+        batch = []
+
+        def write(batch):
+            changes = self.conn.total_changes
+            self.conn.executemany(INSERT_SQL, batch)
+            added = self.conn.total_changes - changes
+            # 같은 배치에 같은 키가 여러 번 있으면 마지막 값이 남도록 추가한 행도 다시 갱신
+            self.conn.executemany(UPDATE_SQL, batch)
+            return added
+
+        with STORE_IO_SECONDS.time(operation='upsert'), self.conn:
+            for transfer in transfers:
+                row = {column: transfer.get(column) for column in COLUMNS}
+                row['log_index'] = row['log_index'] or 0
+                batch.append(row)
+                if len(batch) >= batch_size:
+                    inserted += write(batch)
+                    batch = []
+            if batch:
+                inserted += write(batch)
+        return inserted
+
+    def last_seq(self):
+        """지금까지 할당된 가장 큰 seq. 새 행이 추가될 때만 증가하며 행을 삭제해도 줄어들지 않음"""
+        row = self.conn.execute("SELECT seq FROM sqlite_sequence WHERE name = 'transfers'").fetchone()
+        return row[0] if row else 0
+
+    def count(self):
+        return self.conn.execute("SELECT COUNT(*) FROM transfers").fetchone()[0]
+
+    def max_block(self):
+        """저장된 가장 최신 블록 넘버. 비어있으면 None"""
+        return self.conn.execute("SELECT MAX(block_number) FROM transfers").fetchone()[0]
+
+    def window_transfers(self, after_block, max_block=None):
+        """after_block보다 새로운 (max_block 이하) 전송 데이터를 seq를 포함한 딕셔너리 목록으로 반환"""
+        query = "SELECT * FROM transfers WHERE block_number > ?"
+        params = [after_block]
+        if max_block is not None:
+            query += " AND block_number <= ?"
+            params.append(max_block)
+        return [dict(row) for row in self.conn.execute(query, params)]
+
+    def remove_transfers(self, seqs):
+        """seq 목록의 행을 삭제하고 삭제 기록을 남김"""
+        seqs = list(seqs)
+        with STORE_IO_SECONDS.time(operation='remove'), self.conn:
+            self.conn.executemany("DELETE FROM transfers WHERE seq = ?", ((seq,) for seq in seqs))
+            self.conn.executemany("INSERT INTO removed_transfers (seq) VALUES (?)", ((seq,) for seq in seqs))
+        return len(seqs)
+
+    def last_removal(self):
+        """마지막 삭제 기록 id. 삭제가 없었으면 0"""
+        return self.conn.execute("SELECT COALESCE(MAX(id), 0) FROM removed_transfers").fetchone()[0]
+
+    def removed_since(self, after_id=0):
+        """after_id 이후의 (삭제 기록 id, 삭제된 seq) 목록"""
+        cursor = self.conn.execute("SELECT id, seq FROM removed_transfers WHERE id > ? ORDER BY id", (after_id,))
+        return [tuple(row) for row in cursor]
+
+    def iter_new_transfers(self, after_seq=0, limit=None):
+        """after_seq 이후에 추가된 전송 데이터를 추가된 순서대로 반환 (limit이 있으면 그 건수까지만)"""
+        cursor = self.conn.execute(
+            "SELECT * FROM transfers WHERE seq > ? ORDER BY seq LIMIT ?",
+            (after_seq, -1 if limit is None else limit)
+        )
+        for row in cursor:
+            yield dict(row)
+
+    def set_transaction_types(self, types):
+        """(parent_hash, from_address, to_address, log_index, transaction_type) 목록으로 거래 유형 갱신"""
+        with STORE_IO_SECONDS.time(operation='set_transaction_types'), self.conn:
+            self.conn.executemany(
+                "UPDATE transfers SET transaction_type = ? "
+                "WHERE parent_hash = ? AND from_address = ? AND to_address = ? AND log_index = ?",
+                ((tx_type, parent_hash, from_address, to_address, log_index)
+                 for parent_hash, from_address, to_address, log_index, tx_type in types)
+            )
+
+    def import_file(self, path):
+        """NDJSON(.gz) 또는 기존 moodeng_transfers_*.json 파일을 한 건씩 읽어 가져오기. 새로 추가된 행 수를 반환"""
+        with STORE_IO_SECONDS.time(operation='import'):
+            return self.upsert_transfers(read_transfers(path))
+
+    def export_file(self, path):
+        """추가된 순서대로 NDJSON으로 내보내기 (.gz로 끝나면 압축). 내보낸 건수를 반환"""
+        with STORE_IO_SECONDS.time(operation='export'):
+            return write_transfers(path, self.iter_new_transfers(), columns=COLUMNS)
+
+
+def open_store(db_path, legacy_json=None):
+    """스토어를 열고, DB가 비어있으면 기존 JSON 파일을 가져온다
+
+    동기화 위치(sync_cursor)는 기존 JSON 파일을 방금 가져왔을 때만 채운다. 커서 없이 행만 있는 스토어는
+    백필이 중간에 멈춘 상태이므로 다음 수집에서 start_block까지 다시 백필해야 한다.
+    """
+    store = TransferStore(db_path)
+    imported = 0
+    if legacy_json and store.last_seq() == 0 and os.path.exists(legacy_json):
+        try:
+            imported = store.import_file(legacy_json)
+            print(f"Imported {imported} transfers from {legacy_json}")
+        except json.JSONDecodeError:
+            print(f"Error reading {legacy_json}, starting with empty store")
+
+    if store.get_meta('sync_cursor') is None:
+        if store.get_meta('synced_block') is not None:
+            # 예전 형식의 동기화 위치는 끝까지 수집했을 때만 기록되었으므로 그대로 커서로 옮김
+            store.set_meta('sync_cursor', {'block': store.get_meta('synced_block')})
+        elif imported and store.max_block() is not None:
+            # 기존 JSON 파일은 끝까지 수집된 상태로 저장되었으므로 가장 최신 블록까지 동기화된 것으로 봄
+            store.set_meta('sync_cursor', {'block': store.max_block()})
+    return store
+
+
+if __name__ == '__main__':
+    # 사용법: python transfer_store.py <db 경로> <가져올 파일>...
+    #         python transfer_store.py <db 경로> --export <내보낼 파일.ndjson[.gz]>
+    if len(sys.argv) < 3:
+        print("usage: python transfer_store.py DB_PATH FILE [FILE ...]")
+        print("       python transfer_store.py DB_PATH --export OUT.ndjson[.gz]")
+        sys.exit(1)
+    store = TransferStore(sys.argv[1])
+    if sys.argv[2] == '--export':
+        print(f"{sys.argv[3]}: {store.export_file(sys.argv[3])} transfers")
+    else:
+        for path in sys.argv[2:]:
+            print(f"{path}: {store.import_file(path)} new transfers")
+    store.close()
@@ -0,0 +1,168 @@
+from array import array
+from bisect import bisect_left
+
+HASH_SIZE = 32
+
+# 거래 유형 코드 (TYPE_NAMES[code]). 0은 아직 분류되지 않은 행
+TYPE_NAMES = (None, 'unknown', 'buy', 'sell', 'skip')
+TYPE_CODES = {name: code for code, name in enumerate(TYPE_NAMES)}
+
+# remove_rows()에서 열을 다시 만들지 않고 행마다 잘라낼 최대 행 수
+REMOVE_IN_PLACE = 64
+
+
+class WalletIndex:
+    """지갑 주소를 정수 id로 변환 (같은 주소 문자열을 한 번만 보관)"""
+
+    def __init__(self):
+        self.ids = {}
+        self.addresses = []
+
+    def __len__(self):
+        return len(self.addresses)
+
+    def intern(self, address):
+        wallet_id = self.ids.get(address)
+        if wallet_id is None:
+            wallet_id = self.ids[address] = len(self.addresses)
+            self.addresses.append(address)
+        return wallet_id
+
+    def get(self, address):
+        return self.ids.get(address)
+
+
+class TransferTable:
+    """전송 데이터를 열 단위 배열로 보관하는 메모리 테이블
+
+    주소는 WalletIndex의 정수 id, 블록 넘버/금액/seq는 typed array,
+    parent hash는 32바이트 바이너리, 거래 유형은 1바이트 코드로 저장해 행마다 딕셔너리를 만들지 않는다.
+    행은 seq 오름차순으로 추가되며, 트랜잭션(parent hash)별 seq와 지갑별 seq 색인을 함께 유지해
+    한 트랜잭션이나 지갑의 행을 테이블 전체를 훑지 않고 찾는다 (행 번호는 seq를 이분 탐색해 구함).
+    """
+
+    def __init__(self, wallets=None):
+        self.wallets = wallets or WalletIndex()
+        self.seq = array('q')
+        self.block_number = array('q')
+        self.amount = array('d')
+        self.from_id = array('I')
+        self.to_id = array('I')
+        self.parent_hash = bytearray()
+        self.log_index = array('I')
+        self.tx_type = array('b')
+        # parent hash(32바이트) -> 그 트랜잭션 행의 seq. 전송이 하나뿐인 트랜잭션(대부분)은 정수, 여러 개면 목록
+        self.tx_seqs = {}
+        # 지갑 id -> 그 지갑이 보내거나 받은 행의 seq (추가만 하며, 삭제된 행의 seq는 찾을 때 건너뜀)
+        self.wallet_seqs = {}
+
+    def __len__(self):
+        return len(self.seq)
+
+    def append(self, transfer):
+        """전송 데이터 한 건을 추가하고 행 번호를 반환"""
+        seq = transfer.get('seq', len(self.seq) + 1)
+        from_id = self.wallets.intern(transfer['from_address'])
+        to_id = self.wallets.intern(transfer['to_address'])
+        parent_hash = bytes.fromhex(transfer['parent_hash'][2:]).rjust(HASH_SIZE, b'\0')
+        self.seq.append(seq)
+        self.block_number.append(transfer['block_number'])
+        self.amount.append(transfer['amount'])
+        self.from_id.append(from_id)
+        self.to_id.append(to_id)
+        self.parent_hash += parent_hash
+        self.log_index.append(transfer.get('log_index') or 0)
+        self.tx_type.append(TYPE_CODES.get(transfer.get('transaction_type'), 0))
+
+        seqs = self.tx_seqs.get(parent_hash)
+        if seqs is None:
+            self.tx_seqs[parent_hash] = seq
+        elif type(seqs) is int:
+            self.tx_seqs[parent_hash] = [seqs, seq]
+        else:
+            seqs.append(seq)
+        for wallet_id in (from_id, to_id):
+            seqs = self.wallet_seqs.get(wallet_id)
+            if seqs is None:
+                self.wallet_seqs[wallet_id] = array('q', (seq,))
+            else:
+                seqs.append(seq)
+        return len(self.seq) - 1
+
+    def remove_rows(self, rows):
+        """행 번호 집합에 해당하는 행을 삭제 (리오그로 사라진 전송 데이터용)
+
+        몇 행만 지우면 열마다 그 행만 잘라내고, 많이 지우면 남는 행으로 열을 다시 만든다.
+        """
+        rows = set(rows)
+        for row in rows:
+            parent_hash = self.hash_bytes(row)
+            seqs = [seq for seq in self._seqs_of(parent_hash) if seq != self.seq[row]]
+            if not seqs:
+                del self.tx_seqs[parent_hash]
+            else:
+                self.tx_seqs[parent_hash] = seqs[0] if len(seqs) == 1 else seqs
+
+        names = ('seq', 'block_number', 'amount', 'from_id', 'to_id', 'log_index', 'tx_type')
+        if len(rows) <= REMOVE_IN_PLACE:
+            for row in sorted(rows, reverse=True):
+                for name in names:
+                    del getattr(self, name)[row]
+                del self.parent_hash[row * HASH_SIZE:(row + 1) * HASH_SIZE]
+            return
+        keep = [row for row in range(len(self)) if row not in rows]
+        for name in names:
+            column = getattr(self, name)
+            setattr(self, name, array(column.typecode, (column[row] for row in keep)))
+        hashes = self.parent_hash
+        self.parent_hash = bytearray().join(hashes[row * HASH_SIZE:(row + 1) * HASH_SIZE] for row in keep)
+
+    def _seqs_of(self, parent_hash):
+        seqs = self.tx_seqs.get(parent_hash, ())
+        return (seqs,) if type(seqs) is int else seqs
+
+    def row_of(self, seq):
+        """seq 행의 행 번호. 없으면 None"""
+        row = bisect_left(self.seq, seq)
+        return row if row < len(self.seq) and self.seq[row] == seq else None
+
+    def rows_of(self, parent_hash):
+        """parent hash(32바이트) 트랜잭션의 행 번호 목록 (추가된 순서)"""
+        return [bisect_left(self.seq, seq) for seq in self._seqs_of(parent_hash)]
+
+    def txs_of(self, wallet_ids):
+        """wallet_ids 지갑이 보내거나 받은 전송이 있는 트랜잭션의 parent hash 집합"""
+        hashes = set()
+        for wallet_id in wallet_ids:
+            for seq in self.wallet_seqs.get(wallet_id, ()):
+                row = self.row_of(seq)
+                if row is not None:
+                    hashes.add(self.hash_bytes(row))
+        return hashes
+
+    def hash_bytes(self, row):
+        return bytes(self.parent_hash[row * HASH_SIZE:(row + 1) * HASH_SIZE])
+
+    def hash_at(self, row):
+        return '0x' + self.parent_hash[row * HASH_SIZE:(row + 1) * HASH_SIZE].hex()
+
+    def set_type(self, row, tx_type):
+        self.tx_type[row] = TYPE_CODES[tx_type]
+
+    def row(self, row):
+        """행 하나를 기존 딕셔너리 형태로 변환"""
+        addresses = self.wallets.addresses
+        return {
+            'seq': self.seq[row],
+            'parent_hash': self.hash_at(row),
+            'from_address': addresses[self.from_id[row]],
+            'to_address': addresses[self.to_id[row]],
+            'amount': self.amount[row],
+            'block_number': self.block_number[row],
+            'log_index': self.log_index[row],
+            'transaction_type': TYPE_NAMES[self.tx_type[row]]
+        }
+
+    def __iter__(self):
+        for row in range(len(self)):
+            yield self.row(row)
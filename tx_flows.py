@@ -0,0 +1,104 @@
+"""같은 parent hash(트랜잭션)의 전송을 묶어 지갑별 순유입량으로 매수/매도를 복원
+
+멀티홉 스왑(라우터 -> 풀 -> 풀 -> 사용자)은 전송 여러 건으로 저장되고, 스왑 주소 목록에 없는
+애그리게이터를 거치면 행 단위 분류로는 애그리게이터가 매수/매도한 것처럼 보인다.
+트랜잭션 단위로 스왑 주소가 아닌 지갑마다 받은 양 - 보낸 양을 구하면, 토큰을 받아 그대로 넘긴
+중간 주소는 0이 되어 빠지고 실제로 토큰을 사고판 지갑만 남는다.
+"""
+
+# 받은 양과 보낸 양이 이 비율 이내로 같으면 그대로 넘긴 것으로 보고 거래에서 뺌 (부동소수점 오차)
+TOLERANCE = 1e-9
+
+
+def group_transactions(rows):
+    """행을 트랜잭션별 목록으로 묶어 반환 (트랜잭션 안의 행 순서 유지)
+
+    같은 트랜잭션의 전송은 같은 블록에 있으므로 블록이 바뀔 때 묶음을 내보낸다.
+    메모리에는 한 블록의 전송만 올라간다.
+    """
+    groups = {}
+    block = None
+    for row in rows:
+        if row['block_number'] != block and groups:
+            yield from groups.values()
+            groups = {}
+        block = row['block_number']
+        groups.setdefault(row['parent_hash'], []).append(row)
+    yield from groups.values()
+
+
+def reconstruct(rows, swap_addresses):
+    """트랜잭션 하나의 전송 목록에서 (거래 목록, 행별 거래 유형)을 계산
+
+    거래는 (지갑, 'buy' 또는 'sell', 수량, 스왑 주소)이며, 스왑 주소는 매수면 토큰을 가장 많이 내보낸,
+    매도면 가장 많이 받은 스왑 주소다. 스왑 주소가 없는 트랜잭션(단순 전송)은 거래가 없다.
+    행별 거래 유형: 매수한 지갑이 받은 행은 buy, 매도한 지갑이 보낸 행은 sell,
+    스왑 트랜잭션의 나머지(중간 경로) 행은 skip, 스왑이 아닌 트랜잭션은 unknown.
+    """
+    if len(rows) == 1:
+        # 전송이 하나뿐인 트랜잭션(대부분)은 순유입량이 곧 전송량
+        row = rows[0]
+        from_swap = row['from_address'] in swap_addresses
+        to_swap = row['to_address'] in swap_addresses
+        if not from_swap and not to_swap:
+            return [], ['unknown']
+        if from_swap and to_swap or not row['amount']:
+            return [], ['skip']
+        if from_swap:
+            return [(row['to_address'], 'buy', row['amount'], row['from_address'])], ['buy']
+        return [(row['from_address'], 'sell', row['amount'], row['to_address'])], ['sell']
+
+    received = {}
+    sent = {}
+    router_out = {}
+    router_in = {}
+    routers = []
+    for row in rows:
+        from_address = row['from_address']
+        to_address = row['to_address']
+        amount = row['amount']
+        from_swap = from_address in swap_addresses
+        to_swap = to_address in swap_addresses
+        if from_swap:
+            routers.append(from_address)
+            if not to_swap:
+                router_out[from_address] = router_out.get(from_address, 0) + amount
+        else:
+            sent[from_address] = sent.get(from_address, 0) + amount
+            received.setdefault(from_address, 0)
+        if to_swap:
+            routers.append(to_address)
+            if not from_swap:
+                router_in[to_address] = router_in.get(to_address, 0) + amount
+        else:
+            received[to_address] = received.get(to_address, 0) + amount
+    if not routers:
+        return [], ['unknown'] * len(rows)
+
+    trades = []
+    sides = {}
+    for wallet, inflow in received.items():
+        outflow = sent.get(wallet, 0)
+        net = inflow - outflow
+        if abs(net) <= TOLERANCE * max(inflow, outflow):
+            continue
+        if net > 0:
+            side = 'buy'
+            router = max(router_out, key=router_out.get) if router_out else routers[0]
+        else:
+            side = 'sell'
+            router = max(router_in, key=router_in.get) if router_in else routers[0]
+        trades.append((wallet, side, abs(net), router))
+        sides[wallet] = side
+
+    types = []
+    for row in rows:
+        if row['from_address'] in swap_addresses and row['to_address'] in swap_addresses:
+            types.append('skip')
+        elif sides.get(row['to_address']) == 'buy':
+            types.append('buy')
+        elif sides.get(row['from_address']) == 'sell':
+            types.append('sell')
+        else:
+            types.append('skip')
+    return trades, types
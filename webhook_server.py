@@ -0,0 +1,72 @@
+import hmac
+import json
+import secrets
+from aiohttp import web
+from telegram import Update
+import metrics
+
+WEBHOOK_UPDATES = metrics.counter('webhook_updates_total', 'Webhook requests by result', ('result',))
+
+SECRET_HEADER = 'X-Telegram-Bot-Api-Secret-Token'
+
+
+class WebhookServer:
+    """텔레그램 웹훅을 받는 내장 aiohttp 서버. 받은 업데이트는 application.update_queue로 넘김
+
+    secret_token이 없으면 시작할 때마다 새로 만들어 set_webhook에 등록하고,
+    같은 값을 헤더로 보내지 않은 요청은 403으로 거절한다.
+    max_connections는 텔레그램이 이 서버에 동시에 여는 연결 수 (1~100).
+    """
+
+    def __init__(self, application, url, host='0.0.0.0', port=8443, path=None,
+                 secret_token=None, max_connections=40, drop_pending_updates=False):
+        self.application = application
+        self.url = url
+        self.host = host
+        self.port = port
+        self.path = path or '/telegram'
+        self.secret_token = secret_token or secrets.token_urlsafe(32)
+        self.max_connections = max_connections
+        self.drop_pending_updates = drop_pending_updates
+        self._runner = None
+
+    async def _handle(self, request):
+        if not hmac.compare_digest(request.headers.get(SECRET_HEADER, ''), self.secret_token):
+            WEBHOOK_UPDATES.inc(result='forbidden')
+            return web.Response(status=403)
+        try:
+            data = await request.json()
+            if not isinstance(data, dict):
+                # 배열/숫자 등 JSON 객체가 아닌 본문은 de_json에서 AttributeError가 나므로 먼저 거름
+                raise ValueError(f"expected a JSON object, got {type(data).__name__}")
+            update = Update.de_json(data, self.application.bot)
+        except (json.JSONDecodeError, ValueError, TypeError, KeyError) as e:
+            print(f"Invalid webhook update: {e}")
+            WEBHOOK_UPDATES.inc(result='invalid')
+            return web.Response(status=400)
+        # 처리는 application이 하고, 텔레그램에는 바로 200을 돌려줘 다음 업데이트가 밀리지 않게 함
+        await self.application.update_queue.put(update)
+        WEBHOOK_UPDATES.inc(result='ok')
+        return web.Response()
+
+    async def start(self, register=True):
+        """서버를 열고 register가 True이면 텔레그램에 웹훅 주소를 등록"""
+        app = web.Application()
+        app.router.add_post(self.path, self._handle)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, self.host, self.port).start()
+        if register:
+            await self.application.bot.set_webhook(
+                self.url,
+                max_connections=self.max_connections,
+                allowed_updates=Update.ALL_TYPES,
+                drop_pending_updates=self.drop_pending_updates,
+                secret_token=self.secret_token
+            )
+
+    async def stop(self):
+        """새 요청을 받지 않고 서버를 닫음. 웹훅 등록은 유지해 재시작 전까지의 업데이트는 텔레그램이 보관"""
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None